@@ -17,6 +17,11 @@ def pytest_configure(config):
     # being used
     warnings.filterwarnings("error", "", Warning, r"^(?!(|kombu|raven|sentry))")
 
+    # Benchmarks only run their function once, unless --benchmark-enable is
+    # passed. pytest-benchmark is only installed with the dev requirements.
+    if config.pluginmanager.hasplugin("benchmark"):
+        config.option.benchmark_disable = True
+
     # Create an empty webpack manifest file - otherwise tests will crash if it does not exist
     os.makedirs(dist_path, exist_ok=True)
 
@@ -1,3 +1,4 @@
+import io
 import zlib
 
 from sentry.utils import metrics
@@ -9,11 +10,68 @@ ATTACHMENT_DATA_CHUNK_KEY = "{key}:a:{id}:{chunk_index}"
 
 UNINITIALIZED_DATA = object()
 
+# Maximum size of the pieces in which attachment data is decompressed when
+# streaming it.
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Attachments larger than this are not prefetched by ``prefetch_data``, but
+# streamed one chunk at a time.
+PREFETCH_MAX_SIZE = 8 * 1024 * 1024
+
+# Maximum total size of the attachments prefetched by one ``prefetch_data``
+# call.
+PREFETCH_MAX_TOTAL_SIZE = 32 * 1024 * 1024
+
 
 class MissingAttachmentChunks(Exception):
     pass
 
 
+def _iter_decompressed(compressed, max_length=STREAM_CHUNK_SIZE):
+    decompressor = zlib.decompressobj()
+    chunk = decompressor.decompress(compressed, max_length)
+    while chunk:
+        yield chunk
+        chunk = decompressor.decompress(decompressor.unconsumed_tail, max_length)
+
+    if not decompressor.eof:
+        raise zlib.error("Error -5 while decompressing data: incomplete or truncated stream")
+
+
+class AttachmentFile(io.RawIOBase):
+    """
+    A read-only file-like object over an iterable of data chunks. Data is
+    copied from the chunks straight into the buffers that are read into, so
+    the chunks never have to be joined.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._current = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        b = memoryview(b).cast("B")
+        written = 0
+
+        while written < len(b):
+            if not self._current:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._current = memoryview(chunk).cast("B")
+                continue
+
+            size = min(len(b) - written, len(self._current))
+            b[written : written + size] = self._current[:size]
+            self._current = self._current[size:]
+            written += size
+
+        return written
+
+
 class CachedAttachment:
     def __init__(
         self,
@@ -48,6 +106,7 @@ class CachedAttachment:
         self._data = data
         self.chunks = chunks
         self._cache = cache
+        self._prefetched_chunks = None
 
     @classmethod
     def from_upload(cls, file, **kwargs):
@@ -63,6 +122,30 @@ class CachedAttachment:
         assert self._data is not UNINITIALIZED_DATA
         return self._data
 
+    def iter_chunks(self):
+        """
+        Yields the data of the attachment in chunks of at most
+        ``STREAM_CHUNK_SIZE`` bytes if it is fetched from the cache. Unlike
+        ``data``, the attachment is never held in memory entirely.
+
+        Raises ``MissingAttachmentChunks`` when reaching a chunk that is not
+        in the cache.
+        """
+        if self._data is UNINITIALIZED_DATA and self._cache is not None:
+            yield from self._cache.iter_data(self)
+            return
+
+        assert self._data is not UNINITIALIZED_DATA
+        if self._data:
+            yield self._data
+
+    def open(self):
+        """
+        Returns a file-like object over the data of the attachment, see
+        ``iter_chunks``.
+        """
+        return AttachmentFile(self.iter_chunks())
+
     def delete(self):
         for key in self.chunk_keys:
             self._cache.inner.delete(key)
@@ -132,6 +215,20 @@ class BaseAttachmentCache:
         key = ATTACHMENT_DATA_CHUNK_KEY.format(key=key, id=id, chunk_index=chunk_index)
         self.inner.set(key, zlib.compress(chunk_data), timeout, raw=True)
 
+    def set_chunks(self, key, id, chunks, timeout=None):
+        """
+        Sets multiple chunks of an attachment at once. ``chunks`` is an
+        iterable of ``(chunk_index, chunk_data)`` pairs.
+        """
+        items = [
+            (
+                ATTACHMENT_DATA_CHUNK_KEY.format(key=key, id=id, chunk_index=chunk_index),
+                zlib.compress(chunk_data),
+            )
+            for chunk_index, chunk_data in chunks
+        ]
+        self.inner.set_many(items, timeout, raw=True)
+
     def set_unchunked_data(self, key, id, data, timeout=None, metrics_tags=None):
         key = ATTACHMENT_UNCHUNKED_DATA_KEY.format(key=key, id=id)
         compressed = zlib.compress(data)
@@ -152,15 +249,59 @@ class BaseAttachmentCache:
             yield CachedAttachment(cache=self, **attachment)
 
     def get_data(self, attachment):
-        data = []
+        return b"".join(self.iter_data(attachment))
 
+    def iter_data(self, attachment):
+        prefetched = attachment._prefetched_chunks
         for key in attachment.chunk_keys:
-            raw_data = self.inner.get(key, raw=True)
+            if prefetched is not None:
+                raw_data = prefetched.get(key)
+            else:
+                raw_data = self.inner.get(key, raw=True)
             if raw_data is None:
                 raise MissingAttachmentChunks()
-            data.append(zlib.decompress(raw_data))
+            yield from _iter_decompressed(raw_data)
+
+    def prefetch_data(
+        self, attachments, max_size=PREFETCH_MAX_SIZE, max_total_size=PREFETCH_MAX_TOTAL_SIZE
+    ):
+        """
+        Fetches the chunks of multiple attachments with a single request to
+        the cache (one per node for Redis), instead of one request per chunk
+        once the attachments are read. The chunks are kept compressed in
+        memory until then.
+
+        Only attachments with a known size of at most ``max_size`` are
+        prefetched, up to ``max_total_size`` bytes in total. Other attachments
+        are still streamed one chunk at a time.
+        """
+        pending = []
+        total_size = 0
+        for attachment in attachments:
+            if (
+                attachment._data is not UNINITIALIZED_DATA
+                or attachment._cache is not self
+                or attachment._prefetched_chunks is not None
+            ):
+                continue
+            # A size of 0 means that the size is unknown.
+            if not 0 < attachment.size <= max_size:
+                continue
+            if total_size + attachment.size > max_total_size:
+                continue
+            total_size += attachment.size
+            pending.append(attachment)
+
+        keys = [key for attachment in pending for key in attachment.chunk_keys]
+        if not keys:
+            return
+
+        metrics.timing("attachments.prefetch.chunks", len(keys))
+        metrics.timing("attachments.prefetch.size", total_size)
+        results = self.inner.get_many(keys, raw=True)
 
-        return b"".join(data)
+        for attachment in pending:
+            attachment._prefetched_chunks = {key: results.get(key) for key in attachment.chunk_keys}
 
     def delete(self, key):
         for attachment in self.get(key):
@@ -1,11 +1,21 @@
 import logging
+from collections import defaultdict
 
 from django.db.models import F
 
+from sentry.db.models.query import bulk_increment
 from sentry.signals import buffer_incr_complete
 from sentry.tasks.process_buffer import process_incr
+from sentry.utils import metrics
+from sentry.utils.iterators import chunked
 from sentry.utils.services import Service
 
+# SQL expression to compute ``Group.score`` in a ``bulk_increment``, matching
+# what ``ScoreClause`` does for a single update.
+GROUP_SCORE_SQL = (
+    "log(t.times_seen + v.{times_seen}) * 600 + floor(extract(epoch from v.{last_seen}))"
+)
+
 
 class BufferMount(type):
     def __new__(cls, name, bases, attrs):
@@ -28,7 +38,10 @@ class Buffer(Service, metaclass=BufferMount):
     keep up with the updates.
     """
 
-    __all__ = ("incr", "process", "process_pending", "validate")
+    __all__ = ("incr", "flush_coalesced", "process", "process_pending", "validate")
+
+    # maximum number of rows updated with a single statement in ``process_batch``
+    bulk_update_size = 500
 
     def incr(self, model, columns, filters, extra=None, signal_only=None):
         """
@@ -48,6 +61,13 @@ class Buffer(Service, metaclass=BufferMount):
             }
         )
 
+    def flush_coalesced(self, force=True):
+        """
+        Writes out increments that a buffer may hold back in memory to merge
+        them with later increments for the same key. This is a no-op for
+        buffers that write every increment immediately.
+        """
+
     def process_pending(self, partition=None):
         return []
 
@@ -82,3 +102,82 @@ class Buffer(Service, metaclass=BufferMount):
             created=created,
             sender=model,
         )
+
+    def process_batch(self, items):
+        """
+        Processes many increments at once. ``items`` is a list of
+        ``(model, columns, filters, extra, signal_only)`` tuples, as they
+        would be passed to ``process``.
+
+        Increments for existing rows are grouped by model and columns and
+        applied with one bulk ``UPDATE`` per group, everything else goes
+        through ``process`` one by one. ``buffer_incr_complete`` is still sent
+        for every item.
+        """
+        from sentry.models import Group
+
+        batches = defaultdict(list)
+        fallback = []
+
+        for item in items:
+            model, columns, filters, extra, signal_only = item
+            extra = extra or {}
+            if signal_only:
+                fallback.append(item)
+                continue
+
+            computed = None
+            if model is Group and "last_seen" in extra and "times_seen" in columns:
+                computed = {"score": GROUP_SCORE_SQL}
+            elif model is Group and "last_seen" in extra:
+                # we can't compute the score in bulk, see ``process``
+                fallback.append(item)
+                continue
+
+            if not (columns or extra) or any(
+                hasattr(v, "resolve_expression") for v in extra.values()
+            ):
+                fallback.append(item)
+                continue
+
+            batch_key = (
+                model,
+                tuple(sorted(filters)),
+                tuple(sorted(columns)),
+                tuple(sorted(extra)),
+            )
+            batches[batch_key].append((item, computed))
+
+        for (model, _, _, _), batch in batches.items():
+            for chunk in chunked(batch, self.bulk_update_size):
+                missing = bulk_increment(
+                    model,
+                    [
+                        (filters, columns, extra or {})
+                        for (_, columns, filters, extra, _), _ in chunk
+                    ],
+                    computed=chunk[0][1],
+                )
+                metrics.timing(
+                    "buffer.process-batch.rows",
+                    len(chunk) - len(missing),
+                    tags={"model": model.__name__},
+                )
+                for idx, (item, _) in enumerate(chunk):
+                    if idx in missing:
+                        fallback.append(item)
+                        continue
+                    model, columns, filters, extra, _ = item
+                    buffer_incr_complete.send_robust(
+                        model=model,
+                        columns=columns,
+                        filters=filters,
+                        extra=extra,
+                        created=False,
+                        sender=model,
+                    )
+
+        for item in fallback:
+            # subclasses change the signature of ``process``, so always
+            # go through the implementation that writes a single row
+            Buffer.process(self, *item)
@@ -1,5 +1,7 @@
+import math
 import pickle
 import threading
+from collections import defaultdict
 from datetime import datetime
 from time import time
 
@@ -20,6 +22,22 @@ _local_buffers = None
 _local_buffers_lock = threading.Lock()
 
 
+def _is_json_safe(value):
+    """
+    Returns whether ``value`` survives a JSON round trip unchanged.
+    """
+    if value is None or isinstance(value, (str, bool, int)):
+        return True
+    if isinstance(value, float):
+        # sentry.utils.json encodes nan and inf as null
+        return math.isfinite(value)
+    if isinstance(value, list):
+        return all(_is_json_safe(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _is_json_safe(v) for k, v in value.items())
+    return False
+
+
 class PendingBuffer:
     def __init__(self, size):
         assert size > 0
@@ -47,16 +65,160 @@ class PendingBuffer:
         return rv
 
 
+class CoalescedIncr:
+    """
+    The merged state of all increments for a single buffer key that have been
+    collected in-process but not yet written to Redis.
+    """
+
+    __slots__ = ("model", "filters", "columns", "extra", "signal_only", "count")
+
+    def __init__(self, model, filters):
+        self.model = model
+        self.filters = filters
+        self.columns = defaultdict(int)
+        self.extra = {}
+        self.signal_only = False
+        self.count = 0
+
+    def merge(self, columns, extra=None, signal_only=None):
+        for column, amount in columns.items():
+            self.columns[column] += amount
+        if extra:
+            # last write wins, same as ``hset`` on the Redis side
+            self.extra.update(extra)
+        if signal_only is True:
+            self.signal_only = True
+        self.count += 1
+
+
+class IncrCoalescer:
+    """
+    Collects buffer increments in memory, merging increments for the same
+    key, until either ``max_size`` increments have been collected or
+    ``max_delay`` seconds have passed since the first one.
+    """
+
+    def __init__(self, max_size, max_delay):
+        assert max_size > 0
+        assert max_delay >= 0
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pending = {}
+        self.count = 0
+        self.started = None
+
+    def add(self, key, model, filters, columns, extra=None, signal_only=None):
+        with self.lock:
+            item = self.pending.get(key)
+            if item is None:
+                item = self.pending[key] = CoalescedIncr(model, filters)
+            item.merge(columns, extra, signal_only)
+            self.count += 1
+            if self.started is None:
+                self.started = time()
+
+    def should_flush(self):
+        if not self.count:
+            return False
+        return self.count >= self.max_size or time() - self.started >= self.max_delay
+
+    def take(self):
+        """
+        Returns the collected increments as ``(key, CoalescedIncr)`` pairs
+        along with the number of ``incr`` calls they represent, and resets
+        the coalescer.
+        """
+        with self.lock:
+            rv = list(self.pending.items()), self.count
+            self._reset()
+        return rv
+
+    def restore(self, items):
+        """
+        Merges ``(key, CoalescedIncr)`` pairs returned by ``take`` back into
+        the coalescer after writing them out failed. Values of ``extra``
+        that were collected in the meantime take precedence.
+        """
+        with self.lock:
+            for key, item in items:
+                pending = self.pending.get(key)
+                if pending is None:
+                    self.pending[key] = item
+                else:
+                    for column, amount in item.columns.items():
+                        pending.columns[column] += amount
+                    pending.extra = {**item.extra, **pending.extra}
+                    pending.signal_only = pending.signal_only or item.signal_only
+                    pending.count += item.count
+                self.count += item.count
+            if self.started is None:
+                self.started = time()
+
+
 class RedisBuffer(Buffer):
     key_expire = 60 * 60  # 1 hour
     pending_key = "b:p"
 
-    def __init__(self, pending_partitions=1, incr_batch_size=2, **options):
+    def __init__(
+        self,
+        pending_partitions=1,
+        incr_batch_size=2,
+        max_incr_batch_size=None,
+        pending_backlog_threshold=10000,
+        pending_slice_size=1000,
+        pending_lock_timeout=60,
+        batch_flush=False,
+        pickle_writes=False,
+        coalesce_max_size=0,
+        coalesce_max_delay=1.0,
+        **options,
+    ):
         self.cluster, options = get_cluster_from_options("SENTRY_BUFFER_OPTIONS", options)
         self.pending_partitions = pending_partitions
         self.incr_batch_size = incr_batch_size
+        self.max_incr_batch_size = max_incr_batch_size
+        self.pending_backlog_threshold = pending_backlog_threshold
+        self.pending_slice_size = pending_slice_size
+        self.pending_lock_timeout = pending_lock_timeout
+        self.batch_flush = batch_flush
+        # Values are written with the typed JSON encoding of ``_dump_value``,
+        # which is both smaller and faster to decode than pickle. Readers
+        # understand both formats; ``pickle_writes`` keeps writing pickle
+        # while workers that predate the typed encoding are still running.
+        self.pickle_writes = pickle_writes
         assert self.pending_partitions > 0
         assert self.incr_batch_size > 0
+        assert self.pending_slice_size > 0
+
+        # Coalescing of increments is opt-in. When enabled, ``incr`` merges
+        # increments for the same key in memory and writes them to Redis in
+        # one pipeline per host once the window or the size limit is hit.
+        # Increments that have not been written yet are lost if the process
+        # dies without flushing them (e.g. when it is killed), which is at
+        # most ``coalesce_max_size`` increments or ``coalesce_max_delay``
+        # seconds worth of them.
+        if coalesce_max_size > 0:
+            self.coalescer = IncrCoalescer(coalesce_max_size, coalesce_max_delay)
+            self._connect_coalescer_signals()
+        else:
+            self.coalescer = None
+
+    def _connect_coalescer_signals(self):
+        from celery.signals import task_postrun, worker_process_shutdown
+
+        task_postrun.connect(self._maybe_flush_coalesced, weak=False)
+        worker_process_shutdown.connect(self._flush_coalesced_on_shutdown, weak=False)
+
+    def _maybe_flush_coalesced(self, **kwargs):
+        self.flush_coalesced(force=False)
+
+    def _flush_coalesced_on_shutdown(self, **kwargs):
+        self.flush_coalesced()
 
     def validate(self):
         try:
@@ -110,15 +272,26 @@ class RedisBuffer(Buffer):
         return result
 
     def _dump_value(self, value):
-        if isinstance(value, str):
+        if value is None:
+            type_ = "n"
+            value = ""
+        elif isinstance(value, str):
             type_ = "s"
         elif isinstance(value, datetime):
             type_ = "d"
-            value = value.strftime("%s.%f")
+            value = "%.6f" % value.timestamp()
+        elif isinstance(value, bool):
+            # needs to be checked before int, bool is a subclass of it
+            type_ = "b"
+            value = int(value)
         elif isinstance(value, int):
             type_ = "i"
         elif isinstance(value, float):
             type_ = "f"
+            value = repr(value)
+        elif isinstance(value, (dict, list)) and _is_json_safe(value):
+            type_ = "j"
+            value = json.dumps(value)
         else:
             raise TypeError(type(value))
         return (type_, str(value))
@@ -139,9 +312,50 @@ class RedisBuffer(Buffer):
             return int(value)
         elif type_ == "f":
             return float(value)
+        elif type_ == "n":
+            return None
+        elif type_ == "b":
+            return value == "1"
+        elif type_ == "j":
+            return json.loads(value)
         else:
             raise TypeError(f"invalid type: {type_}")
 
+    def _encode_filters(self, filters):
+        """
+        Encodes filters as a JSON object of typed values. Anything the typed
+        encoding can't represent exactly is pickled instead.
+        """
+        if self.pickle_writes:
+            return pickle.dumps(filters)
+        try:
+            return json.dumps(self._dump_values(filters))
+        except TypeError:
+            metrics.incr("buffer.encode.pickle", tags={"field": "filters"}, skip_internal=True)
+            return pickle.dumps(filters)
+
+    def _encode_value(self, value):
+        if self.pickle_writes:
+            return pickle.dumps(value)
+        try:
+            return json.dumps(self._dump_value(value))
+        except TypeError:
+            metrics.incr("buffer.encode.pickle", tags={"field": "extra"}, skip_internal=True)
+            return pickle.dumps(value)
+
+    def _decode_filters(self, payload):
+        # The format is detected from the first byte: typed JSON always is an
+        # object, pickle payloads never start with a brace.
+        if payload.startswith(b"{"):
+            return self._load_values(json.loads(payload.decode("utf-8")))
+        return pickle.loads(payload)
+
+    def _decode_value(self, payload):
+        # typed JSON values are always encoded as a two-element array
+        if payload.startswith(b"["):
+            return self._load_value(json.loads(payload.decode("utf-8")))
+        return pickle.loads(payload)
+
     def incr(self, model, columns, filters, extra=None, signal_only=None):
         """
         Increment the key by doing the following:
@@ -151,22 +365,37 @@ class RedisBuffer(Buffer):
             - Perform a set (last write wins) on extra
             - Perform a set on signal_only (only if True)
         - Add hashmap key to pending flushes
+
+        If coalescing is enabled the increment is merged in memory with other
+        increments for the same key and written out by ``flush_coalesced``.
         """
+        key = self._make_key(model, filters)
+
+        if self.coalescer is not None:
+            self.coalescer.add(key, model, filters, columns, extra, signal_only)
+            if self.coalescer.should_flush():
+                self.flush_coalesced()
+        else:
+            # We can't use conn.map() due to wanting to support multiple pending
+            # keys (one per Redis partition)
+            conn = self.cluster.get_local_client_for_key(key)
+            pipe = conn.pipeline()
+            self._pipeline_incr(pipe, key, model, columns, filters, extra, signal_only)
+            pipe.execute()
+
+        metrics.incr(
+            "buffer.incr",
+            skip_internal=True,
+            tags={"module": model.__module__, "model": model.__name__},
+        )
 
+    def _pipeline_incr(self, pipe, key, model, columns, filters, extra=None, signal_only=None):
         # TODO(dcramer): longer term we'd rather not have to serialize values
         # here (unless it's to JSON)
-        key = self._make_key(model, filters)
         pending_key = self._make_pending_key_from_key(key)
-        # We can't use conn.map() due to wanting to support multiple pending
-        # keys (one per Redis partition)
-        conn = self.cluster.get_local_client_for_key(key)
 
-        pipe = conn.pipeline()
         pipe.hsetnx(key, "m", f"{model.__module__}.{model.__name__}")
-        # TODO(dcramer): once this goes live in production, we can kill the pickle path
-        # (this is to ensure a zero downtime deploy where we can transition event processing)
-        pipe.hsetnx(key, "f", pickle.dumps(filters))
-        # pipe.hsetnx(key, 'f', json.dumps(self._dump_values(filters)))
+        pipe.hsetnx(key, "f", self._encode_filters(filters))
         for column, amount in columns.items():
             pipe.hincrby(key, "i+" + column, amount)
 
@@ -175,30 +404,105 @@ class RedisBuffer(Buffer):
             # hook here
             # e.g. "update score if last_seen or times_seen is changed"
             for column, value in extra.items():
-                # TODO(dcramer): once this goes live in production, we can kill the pickle path
-                # (this is to ensure a zero downtime deploy where we can transition event processing)
-                pipe.hset(key, "e+" + column, pickle.dumps(value))
-                # pipe.hset(key, 'e+' + column, json.dumps(self._dump_value(value)))
+                pipe.hset(key, "e+" + column, self._encode_value(value))
 
         if signal_only is True:
             pipe.hset(key, "s", "1")
 
         pipe.expire(key, self.key_expire)
-        pipe.zadd(pending_key, {key: time()})
-        pipe.execute()
+        # The score is the time the key first became pending, so that keys
+        # which keep being incremented are not pushed past the cutoff of
+        # ``process_pending`` and the pending lag reflects the oldest write.
+        pipe.zadd(pending_key, {key: time()}, nx=True)
 
-        metrics.incr(
-            "buffer.incr",
-            skip_internal=True,
-            tags={"module": model.__module__, "model": model.__name__},
-        )
+    def flush_coalesced(self, force=True):
+        """
+        Writes all increments collected by the coalescer to Redis, using a
+        single pipeline per Redis host. Unless ``force`` is set, this only
+        flushes once the coalescing window or size limit has been reached.
+
+        If writing to a host fails, the increments that have not been written
+        are put back into the coalescer to be retried by the next flush, and
+        the error is raised.
+        """
+        if self.coalescer is None:
+            return
+        if not force and not self.coalescer.should_flush():
+            return
+
+        items, incr_count = self.coalescer.take()
+        if not items:
+            return
+
+        router = self.cluster.get_router()
+        hosts = defaultdict(list)
+        for key, item in items:
+            hosts[router.get_host_for_key(key)].append((key, item))
+
+        with metrics.timer("buffer.coalesce.flush"):
+            hosts = list(hosts.items())
+            for index, (host, host_items) in enumerate(hosts):
+                try:
+                    pipe = self.cluster.get_local_client(host).pipeline()
+                    for key, item in host_items:
+                        self._pipeline_incr(
+                            pipe,
+                            key,
+                            item.model,
+                            dict(item.columns),
+                            item.filters,
+                            item.extra,
+                            item.signal_only,
+                        )
+                    pipe.execute()
+                except Exception:
+                    self.coalescer.restore(
+                        [key_item for _, remaining in hosts[index:] for key_item in remaining]
+                    )
+                    metrics.incr("buffer.coalesce.flush-failed")
+                    raise
+
+        metrics.timing("buffer.coalesce.incrs", incr_count)
+        metrics.timing("buffer.coalesce.keys", len(items))
+        metrics.timing("buffer.coalesce.hosts", len(hosts))
+        metrics.timing("buffer.coalesce.ratio", incr_count / len(items))
+
+    def _get_pending_backlog(self, pending_key):
+        """
+        Returns the number of pending keys and the timestamp of the oldest
+        pending key (or ``None`` if there are none) across all hosts.
+        """
+        with self.cluster.all() as conn:
+            sizes = conn.zcard(pending_key)
+            oldest = conn.zrange(pending_key, 0, 0, withscores=True)
+
+        backlog = sum(sizes.value.values())
+        timestamps = [entries[0][1] for entries in oldest.value.values() if entries]
+        return backlog, min(timestamps) if timestamps else None
+
+    def _get_incr_batch_size(self, backlog):
+        """
+        Returns the number of keys to hand to a single ``process_incr`` task.
+        The batch size doubles every time the backlog doubles past
+        ``pending_backlog_threshold``, up to ``max_incr_batch_size``.
+        """
+        batch_size = self.incr_batch_size
+        max_batch_size = max(self.max_incr_batch_size or 0, batch_size)
+        threshold = self.pending_backlog_threshold
+        while backlog > threshold and batch_size < max_batch_size:
+            batch_size *= 2
+            threshold *= 2
+        return min(batch_size, max_batch_size)
 
     def process_pending(self, partition=None):
         if partition is None and self.pending_partitions > 1:
             # If we're using partitions, this one task fans out into
-            # N subtasks instead.
+            # N subtasks instead. Partitions without a backlog are skipped.
             for i in range(self.pending_partitions):
-                process_pending.apply_async(kwargs={"partition": i})
+                backlog, _ = self._get_pending_backlog(self._make_pending_key(i))
+                metrics.timing("buffer.pending-backlog", backlog, tags={"partition": str(i)})
+                if backlog:
+                    process_pending.apply_async(kwargs={"partition": i})
             # Explicitly also run over the unpartitioned buffer as well
             # to ease in transition. In practice, this should just be
             # super fast and is fine to do redundantly.
@@ -207,32 +511,50 @@ class RedisBuffer(Buffer):
         client = self.cluster.get_routing_client()
         lock_key = self._make_lock_key(pending_key)
         # prevent a stampede due to celerybeat + periodic task
-        if not client.set(lock_key, "1", nx=True, ex=60):
+        if not client.set(lock_key, "1", nx=True, ex=self.pending_lock_timeout):
             return
 
-        pending_buffer = PendingBuffer(self.incr_batch_size)
-
         try:
+            now = time()
+            backlog, oldest = self._get_pending_backlog(pending_key)
+            if oldest is not None:
+                metrics.timing(
+                    "buffer.pending-lag", now - oldest, tags={"partition": str(partition)}
+                )
+            if not backlog:
+                metrics.timing("buffer.pending-size", 0)
+                return
+
+            pending_buffer = PendingBuffer(self._get_incr_batch_size(backlog))
             keycount = 0
-            with self.cluster.all() as conn:
-                results = conn.zrange(pending_key, 0, -1)
 
-            with self.cluster.all() as conn:
-                for host_id, keys in results.value.items():
+            for host_id in self.cluster.hosts:
+                conn = self.cluster.get_local_client(host_id)
+                while True:
+                    # Drain the pending set in slices rather than loading it
+                    # into memory at once. Only keys that were pending when
+                    # we started are considered, so that a steady stream of
+                    # new keys cannot keep this loop running forever.
+                    keys = conn.zrangebyscore(
+                        pending_key, "-inf", now, start=0, num=self.pending_slice_size
+                    )
                     if not keys:
-                        continue
+                        break
                     keycount += len(keys)
                     for key in keys:
                         pending_buffer.append(key.decode("utf-8"))
                         if pending_buffer.full():
                             process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
-                    conn.target([host_id]).zrem(pending_key, *keys)
+                    conn.zrem(pending_key, *keys)
+                    # keep holding the partition lock while we are draining
+                    client.expire(lock_key, self.pending_lock_timeout)
 
             # queue up remainder of pending keys
             if not pending_buffer.empty():
                 process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
 
             metrics.timing("buffer.pending-size", keycount)
+            metrics.timing("buffer.pending-batch-size", pending_buffer.size)
         finally:
             client.delete(lock_key)
 
@@ -243,9 +565,48 @@ class RedisBuffer(Buffer):
         if key is not None:
             batch_keys = [key]
 
+        if self.batch_flush and len(batch_keys) > 1:
+            self._process_batch_incr(batch_keys)
+            return
+
         for key in batch_keys:
             self._process_single_incr(key)
 
+    def _load_incr(self, key, values):
+        """
+        Decodes the hash of a buffer key into the arguments for
+        ``Buffer.process``, or returns ``None`` if the key was empty.
+        """
+        # XXX(python3): In python2 this isn't as important since redis will
+        # return string tyes (be it, byte strings), but in py3 we get bytes
+        # back, and really we just want to deal with keys as strings.
+        values = {force_text(k): v for k, v in values.items()}
+
+        if not values:
+            metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
+            self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
+            return None
+
+        # XXX(py3): Note that ``import_string`` explicitly wants a str in
+        # python2, so we'll decode (for python3) and then translate back to
+        # a byte string (in python2) for import_string.
+        model = import_string(str(values.pop("m").decode("utf-8")))  # NOQA
+
+        filters = self._decode_filters(values.pop("f"))
+
+        incr_values = {}
+        extra_values = {}
+        signal_only = None
+        for k, v in values.items():
+            if k.startswith("i+"):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith("e+"):
+                extra_values[k[2:]] = self._decode_value(v)
+            elif k == "s":
+                signal_only = bool(int(v))  # Should be 1 if set
+
+        return model, incr_values, filters, extra_values, signal_only
+
     def _process_single_incr(self, key):
         client = self.cluster.get_routing_client()
         lock_key = self._make_lock_key(key)
@@ -266,42 +627,61 @@ class RedisBuffer(Buffer):
             pipe.delete(key)
             values = pipe.execute()[0]
 
-            # XXX(python3): In python2 this isn't as important since redis will
-            # return string tyes (be it, byte strings), but in py3 we get bytes
-            # back, and really we just want to deal with keys as strings.
-            values = {force_text(k): v for k, v in values.items()}
-
-            if not values:
-                metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
-                self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
-                return
-
-            # XXX(py3): Note that ``import_string`` explicitly wants a str in
-            # python2, so we'll decode (for python3) and then translate back to
-            # a byte string (in python2) for import_string.
-            model = import_string(str(values.pop("m").decode("utf-8")))  # NOQA
+            item = self._load_incr(key, values)
+            if item is not None:
+                super().process(*item)
+        finally:
+            client.delete(lock_key)
 
-            if values["f"].startswith(b"{"):
-                filters = self._load_values(json.loads(values.pop("f").decode("utf-8")))
+    def _process_batch_incr(self, batch_keys):
+        """
+        Like ``_process_single_incr``, but takes the locks and reads the values
+        of all keys with one pipeline per Redis host, and hands the decoded
+        increments to ``Buffer.process_batch`` to write them in bulk.
+        """
+        with self.cluster.map() as conn:
+            acquired = [
+                (key, conn.set(self._make_lock_key(key), "1", nx=True, ex=10)) for key in batch_keys
+            ]
+
+        locked_keys = []
+        for key, result in acquired:
+            if result.value:
+                locked_keys.append(key)
             else:
-                # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                filters = pickle.loads(values.pop("f"))
-
-            incr_values = {}
-            extra_values = {}
-            signal_only = None
-            for k, v in values.items():
-                if k.startswith("i+"):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith("e+"):
-                    if v.startswith(b"["):
-                        extra_values[k[2:]] = self._load_value(json.loads(v.decode("utf-8")))
-                    else:
-                        # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                        extra_values[k[2:]] = pickle.loads(v)
-                elif k == "s":
-                    signal_only = bool(int(v))  # Should be 1 if set
-
-            super().process(model, incr_values, filters, extra_values, signal_only)
+                metrics.incr("buffer.revoked", tags={"reason": "locked"}, skip_internal=False)
+                self.logger.debug("buffer.revoked.locked", extra={"redis_key": key})
+
+        try:
+            router = self.cluster.get_router()
+            hosts = defaultdict(list)
+            for key in locked_keys:
+                hosts[router.get_host_for_key(key)].append(key)
+
+            payloads = {}
+            with metrics.timer("buffer.process-batch.read"):
+                for host, keys in hosts.items():
+                    pipe = self.cluster.get_local_client(host).pipeline()
+                    for key in keys:
+                        pipe.hgetall(key)
+                        pipe.zrem(self._make_pending_key_from_key(key), key)
+                        pipe.delete(key)
+                    results = pipe.execute()
+                    for idx, key in enumerate(keys):
+                        payloads[key] = results[idx * 3]
+
+            items = []
+            for key in locked_keys:
+                item = self._load_incr(key, payloads[key])
+                if item is not None:
+                    items.append(item)
+
+            metrics.timing("buffer.process-batch.keys", len(items))
+            if items:
+                with metrics.timer("buffer.process-batch.write"):
+                    self.process_batch(items)
         finally:
-            client.delete(lock_key)
+            if locked_keys:
+                with self.cluster.map() as conn:
+                    for key in locked_keys:
+                        conn.delete(self._make_lock_key(key))
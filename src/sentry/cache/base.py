@@ -32,12 +32,29 @@ class BaseCache(local):
     def set(self, key, value, timeout, version=None, raw=False):
         raise NotImplementedError
 
+    def set_many(self, items, timeout, version=None, raw=False):
+        # This implementation can/should be overridden by subclasses to
+        # improve performance using batched operations where possible.
+        for key, value in items:
+            self.set(key, value, timeout, version=version, raw=raw)
+
     def delete(self, key, version=None):
         raise NotImplementedError
 
     def get(self, key, version=None, raw=False):
         raise NotImplementedError
 
+    def get_many(self, keys, version=None, raw=False):
+        # Returns a dictionary of the keys that were found to their values.
+        # This implementation can/should be overridden by subclasses to
+        # improve performance using batched operations where possible.
+        results = {}
+        for key in keys:
+            value = self.get(key, version=version, raw=raw)
+            if value is not None:
+                results[key] = value
+        return results
+
     def _mark_transaction(self, op):
         """
         Mark transaction with a tag so we can identify system components that rely
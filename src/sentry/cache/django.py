@@ -8,6 +8,10 @@ class DjangoCache(BaseCache):
         cache.set(key, value, timeout, version=version or self.version)
         self._mark_transaction("set")
 
+    def set_many(self, items, timeout, version=None, raw=False):
+        cache.set_many(dict(items), timeout, version=version or self.version)
+        self._mark_transaction("set")
+
     def delete(self, key, version=None):
         cache.delete(key, version=version or self.version)
         self._mark_transaction("delete")
@@ -15,3 +19,8 @@ class DjangoCache(BaseCache):
     def get(self, key, version=None, raw=False):
         return cache.get(key, version=version or self.version)
         self._mark_transaction("get")
+
+    def get_many(self, keys, version=None, raw=False):
+        results = cache.get_many(keys, version=version or self.version)
+        self._mark_transaction("get")
+        return results
@@ -16,18 +16,43 @@ class CommonRedisCache(BaseCache):
         self.client = client
         BaseCache.__init__(self, **options)
 
-    def set(self, key, value, timeout, version=None, raw=False):
-        key = self.make_key(key, version=version)
+    def _prepare_value(self, key, value, raw):
         v = json.dumps(value) if not raw else value
         if len(v) > self.max_size:
             raise ValueTooLarge(f"Cache key too large: {key!r} {len(v)!r}")
+        return v
+
+    def _set(self, client, key, v, timeout):
         if timeout:
-            self.client.setex(key, int(timeout), v)
+            client.setex(key, int(timeout), v)
         else:
-            self.client.set(key, v)
+            client.set(key, v)
+
+    def set(self, key, value, timeout, version=None, raw=False):
+        key = self.make_key(key, version=version)
+        v = self._prepare_value(key, value, raw)
+        self._set(self.client, key, v, timeout)
+
+        self._mark_transaction("set")
+
+    def set_many(self, items, timeout, version=None, raw=False):
+        # All values are encoded before any of them are written, so that a
+        # value that is too large doesn't result in a partial write.
+        values = []
+        for key, value in items:
+            key = self.make_key(key, version=version)
+            values.append((key, self._prepare_value(key, value, raw)))
+
+        self._set_many(values, timeout)
 
         self._mark_transaction("set")
 
+    def _set_many(self, values, timeout):
+        with self.client.pipeline(transaction=False) as pipeline:
+            for key, v in values:
+                self._set(pipeline, key, v, timeout)
+            pipeline.execute()
+
     def delete(self, key, version=None):
         key = self.make_key(key, version=version)
         self.client.delete(key)
@@ -44,6 +69,25 @@ class CommonRedisCache(BaseCache):
 
         return result
 
+    def get_many(self, keys, version=None, raw=False):
+        keys = list(keys)
+        values = self._get_many([self.make_key(key, version=version) for key in keys])
+
+        results = {}
+        for key, value in zip(keys, values):
+            if value is not None:
+                results[key] = json.loads(value) if not raw else value
+
+        self._mark_transaction("get")
+
+        return results
+
+    def _get_many(self, keys):
+        with self.client.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.get(key)
+            return pipeline.execute()
+
 
 class RbCache(CommonRedisCache):
     def __init__(self, **options):
@@ -51,6 +95,16 @@ class RbCache(CommonRedisCache):
         client = cluster.get_routing_client()
         CommonRedisCache.__init__(self, client, **options)
 
+    def _set_many(self, values, timeout):
+        with self.client.map() as client:
+            for key, v in values:
+                self._set(client, key, v, timeout)
+
+    def _get_many(self, keys):
+        with self.client.map() as client:
+            promises = [client.get(key) for key in keys]
+        return [promise.value for promise in promises]
+
 
 # Confusing legacy name for RbCache.  We don't actually have a pure redis cache
 RedisCache = RbCache
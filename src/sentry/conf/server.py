@@ -1203,6 +1203,10 @@ SENTRY_ATTACHMENTS_OPTIONS = {}
 SENTRY_EVENT_PROCESSING_STORE = "sentry.eventstore.processing.default.DefaultEventProcessingStore"
 SENTRY_EVENT_PROCESSING_STORE_OPTIONS = {}
 
+# The backend of ``sentry.utils.json``, either "simplejson" or "rapidjson"
+# (requires python-rapidjson.)
+SENTRY_JSON_BACKEND = "simplejson"
+
 # The internal Django cache is still used in many places
 # TODO(dcramer): convert uses over to Sentry's backend
 CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
@@ -2187,6 +2191,9 @@ SENTRY_SYNTHETIC_MONITORING_PROJECT_ID = None
 SENTRY_SIMILARITY_INDEX_REDIS_CLUSTER = "default"
 # Similarity-v2: uses grouping components for diffing (None = fallback to setting for v1)
 SENTRY_SIMILARITY2_INDEX_REDIS_CLUSTER = None
+# Path of a SQLite database to keep the similarity indexes in instead of a
+# redis cluster, for single node installations
+SENTRY_SIMILARITY_INDEX_SQLITE_PATH = None
 
 # The grouping strategy to use for driving similarity-v2. You can add multiple
 # strategies here to index them all. This is useful for transitioning a
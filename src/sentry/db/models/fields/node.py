@@ -129,19 +129,16 @@ class NodeData(collections.MutableMapping):
             self.data["_ref"] = ref
             self.data["_ref_version"] = self.ref_version
 
-    def save(self, subkeys=None):
+    def get_subkeys(self, subkeys=None):
         """
-        Write current data back to nodestore.
-
-        :param subkeys: Additional JSON payloads to attach to nodestore value,
-            currently only {"unprocessed": {...}} is added for reprocessing.
-            See documentation of nodestore.
+        Returns the subkeys that ``save`` writes to nodestore, or ``None`` if
+        there is nothing to save.
         """
 
         # We never loaded any data for reading or writing, so there
         # is nothing to save.
         if self._node_data is None:
-            return
+            return None
 
         # We can't put our wrappers into the nodestore, so we need to
         # ensure that the data is converted into a plain old dict
@@ -151,9 +148,39 @@ class NodeData(collections.MutableMapping):
 
         subkeys = subkeys or {}
         subkeys[None] = to_write
+        return subkeys
+
+    def save(self, subkeys=None):
+        """
+        Write current data back to nodestore.
+
+        :param subkeys: Additional JSON payloads to attach to nodestore value,
+            currently only {"unprocessed": {...}} is added for reprocessing.
+            See documentation of nodestore.
+        """
+        subkeys = self.get_subkeys(subkeys)
+        if subkeys is None:
+            return
 
         nodestore.set_subkeys(self.id, subkeys)
 
+    @staticmethod
+    def save_many(nodes):
+        """
+        Write the data of multiple nodes back to nodestore in a single batch.
+
+        :param nodes: A sequence of ``(node_data, subkeys)`` pairs, see
+            ``save``.
+        """
+        items = {}
+        for node_data, subkeys in nodes:
+            subkeys = node_data.get_subkeys(subkeys)
+            if subkeys is not None:
+                items[node_data.id] = subkeys
+
+        if items:
+            nodestore.set_subkeys_multi(items)
+
 
 class NodeField(GzippedDictField):
     """
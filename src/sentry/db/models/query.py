@@ -1,14 +1,14 @@
 import itertools
 from functools import reduce
 
-from django.db import IntegrityError, router, transaction
+from django.db import IntegrityError, connections, router, transaction
 from django.db.models import Model, Q
 from django.db.models.expressions import CombinedExpression
 from django.db.models.signals import post_save
 
 from .utils import resolve_combined_expression
 
-__all__ = ("update", "create_or_update")
+__all__ = ("update", "create_or_update", "bulk_increment")
 
 
 def update(self, using=None, **kwargs):
@@ -95,6 +95,109 @@ def create_or_update(model, using=None, **kwargs):
     return affected, False
 
 
+def _get_cast_type(field, connection):
+    db_type = field.db_type(connection)
+    # serial types can only be used in column definitions
+    return {"serial": "integer", "bigserial": "bigint"}.get(db_type, db_type)
+
+
+def bulk_increment(model, rows, computed=None, using=None):
+    """
+    Applies many ``create_or_update``-style updates to existing rows of
+    ``model`` with a single ``UPDATE ... FROM (VALUES ...)`` statement.
+
+    ``rows`` is a list of ``(filters, counters, values)`` tuples, all using
+    the same filter, counter and value columns. Counters are added to the
+    current column value, values are assigned as-is. ``computed`` maps further
+    columns to SQL expressions, where ``t`` refers to the current row and
+    ``v`` to the new counters and values.
+
+    Rows are not created. Returns the indexes of all rows that did not match
+    an existing row, or that target the same row as an earlier entry, so the
+    caller can fall back to ``create_or_update`` for them.
+
+    >>> bulk_increment(Group, [({'id': 1}, {'times_seen': 2}, {})])
+    set()
+    """
+    if not rows:
+        return set()
+
+    if not using:
+        using = router.db_for_write(model)
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+
+    filters, counters, values = rows[0]
+    columns = []
+    for kind, names in (("f", filters), ("i", counters), ("e", values)):
+        for name in sorted(names):
+            field = opts.pk if name == "pk" else opts.get_field(name)
+            columns.append((kind, name, field))
+
+    def prep_value(field, value):
+        if isinstance(value, Model):
+            value = value.pk
+        return field.get_db_prep_save(value, connection=connection)
+
+    row_sql = "(%s, {})".format(
+        ", ".join("%s::{}".format(_get_cast_type(field, connection)) for _, _, field in columns)
+    )
+    params = []
+    values_sql = []
+    seen = set()
+    for idx, (filters, counters, values) in enumerate(rows):
+        row = {"f": filters, "i": counters, "e": values}
+        row_params = [prep_value(field, row[kind][name]) for kind, name, field in columns]
+        # an UPDATE only applies one source row per target row, so repeated
+        # filters have to go through the slow path instead
+        row_filters = tuple(p for p, (kind, _, _) in zip(row_params, columns) if kind == "f")
+        if row_filters in seen:
+            continue
+        seen.add(row_filters)
+
+        params.append(idx)
+        params.extend(row_params)
+        values_sql.append(row_sql)
+
+    aliases = ["_idx"] + ["%s_%d" % (kind, i) for i, (kind, _, _) in enumerate(columns)]
+    set_sql = []
+    where_sql = []
+    for alias, (kind, _, field) in zip(aliases[1:], columns):
+        column = qn(field.column)
+        if kind == "f":
+            where_sql.append(f"t.{column} = v.{alias}")
+        elif kind == "i":
+            set_sql.append(f"{column} = t.{column} + v.{alias}")
+        else:
+            set_sql.append(f"{column} = v.{alias}")
+
+    # computed expressions refer to the new values by their field name
+    aliases_by_name = {name: alias for alias, (_, name, _) in zip(aliases[1:], columns)}
+    for name, expression in (computed or {}).items():
+        column = qn(opts.get_field(name).column)
+        set_sql.append("{} = {}".format(column, expression.format(**aliases_by_name)))
+
+    sql = (
+        "UPDATE {table} AS t SET {set} "
+        "FROM (VALUES {values}) AS v ({aliases}) "
+        "WHERE {where} RETURNING v._idx"
+    ).format(
+        table=qn(opts.db_table),
+        set=", ".join(set_sql),
+        values=", ".join(values_sql),
+        aliases=", ".join(aliases),
+        where=" AND ".join(where_sql),
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        updated = {row[0] for row in cursor.fetchall()}
+
+    return set(range(len(rows))) - updated
+
+
 def in_iexact(column, values):
     """Operator to test if any of the given values are (case-insensitive)
     matching to values in the given column."""
@@ -3,8 +3,8 @@ import ipaddress
 import logging
 import random
 import time
+from collections import defaultdict
 from datetime import datetime, timedelta
-from io import BytesIO
 
 import sentry_sdk
 from django.conf import settings
@@ -23,6 +23,7 @@ from sentry.constants import (
     DataCategory,
 )
 from sentry.culprit import generate_culprit
+from sentry.db.models import NodeData
 from sentry.eventstore.processing import event_processing_store
 from sentry.grouping.api import (
     BackgroundGroupingConfigLoader,
@@ -32,6 +33,7 @@ from sentry.grouping.api import (
     get_fingerprinting_config_for_project,
     get_grouping_config_dict_for_event_data,
     get_grouping_config_dict_for_project,
+    get_hashes_for_event,
     load_grouping_config,
 )
 from sentry.ingest.inbound_filters import FilterStatKeys
@@ -71,6 +73,7 @@ from sentry.reprocessing2 import (
 )
 from sentry.signals import first_event_received, first_transaction_received, issue_unresolved
 from sentry.stacktraces.processing import normalize_stacktraces_for_grouping
+from sentry.tasks.base import track_memory_usage
 from sentry.tasks.integrations import kick_off_status_syncs
 from sentry.utils import json, metrics
 from sentry.utils.cache import cache_key_for_event
@@ -750,19 +753,24 @@ def _tsdb_record_all_metrics(jobs):
 
     # XXX: validate whether anybody actually uses those metrics
 
+    # Counters of all jobs are written together, per environment, so that
+    # backends can apply them in as few round-trips as possible.
+    incrs = defaultdict(list)
+
     for job in jobs:
-        incrs = []
         frequencies = []
         records = []
 
-        incrs.append((tsdb.models.project, job["project_id"]))
         event = job["event"]
         group = job["group"]
         release = job["release"]
         environment = job["environment"]
 
+        options = {"timestamp": event.datetime}
+        incrs[environment.id].append((tsdb.models.project, job["project_id"], options))
+
         if group:
-            incrs.append((tsdb.models.group, group.id))
+            incrs[environment.id].append((tsdb.models.group, group.id, options))
             frequencies.append(
                 (tsdb.models.frequent_environments_by_group, {group.id: {environment.id: 1}})
             )
@@ -776,7 +784,7 @@ def _tsdb_record_all_metrics(jobs):
                 )
 
         if release:
-            incrs.append((tsdb.models.release, release.id))
+            incrs[environment.id].append((tsdb.models.release, release.id, options))
 
         user = job["user"]
 
@@ -787,18 +795,19 @@ def _tsdb_record_all_metrics(jobs):
             if group:
                 records.append((tsdb.models.users_affected_by_group, group.id, (user.tag_value,)))
 
-        if incrs:
-            tsdb.incr_multi(incrs, timestamp=event.datetime, environment_id=environment.id)
-
         if records:
             tsdb.record_multi(records, timestamp=event.datetime, environment_id=environment.id)
 
         if frequencies:
             tsdb.record_frequency_multi(frequencies, timestamp=event.datetime)
 
+    for environment_id, items in incrs.items():
+        tsdb.incr_multi(items, environment_id=environment_id)
+
 
 @metrics.wraps("save_event.nodestore_save_many")
 def _nodestore_save_many(jobs):
+    nodes = []
     for job in jobs:
         # Write the event to Nodestore
         subkeys = {}
@@ -812,7 +821,9 @@ def _nodestore_save_many(jobs):
             if data is not None:
                 subkeys["unprocessed"] = data
 
-        job["event"].data.save(subkeys=subkeys)
+        nodes.append((job["event"].data, subkeys))
+
+    NodeData.save_many(nodes)
 
 
 @metrics.wraps("save_event.eventstream_insert_many")
@@ -840,6 +851,9 @@ def _eventstream_insert_many(jobs):
             skip_consume=job.get("raw", False),
         )
 
+    # Batching eventstreams only publish events once they are flushed.
+    eventstream.flush()
+
 
 @metrics.wraps("save_event.track_outcome_accepted_many")
 def _track_outcome_accepted_many(jobs):
@@ -1503,9 +1517,22 @@ def save_attachment(
     else:
         timestamp = datetime.utcnow().replace(tzinfo=UTC)
 
+    file = File.objects.create(
+        name=attachment.name,
+        type=attachment.type,
+        headers={"Content-Type": attachment.content_type},
+    )
+
+    # Chunks are streamed into the file store, so that the attachment is
+    # never held in memory entirely.
     try:
-        data = attachment.data
+        with track_memory_usage(
+            "attachments.memory_change", tags={"type": attachment.type, "operation": "save"}
+        ):
+            file.putfile(attachment.open(), blob_size=settings.SENTRY_ATTACHMENT_BLOB_SIZE)
     except MissingAttachmentChunks:
+        file.delete()
+
         track_outcome(
             org_id=project.organization_id,
             project_id=project.id,
@@ -1520,13 +1547,6 @@ def save_attachment(
         logger.exception("Missing chunks for cache_key=%s", cache_key)
         return
 
-    file = File.objects.create(
-        name=attachment.name,
-        type=attachment.type,
-        headers={"Content-Type": attachment.content_type},
-    )
-    file.putfile(BytesIO(data), blob_size=settings.SENTRY_ATTACHMENT_BLOB_SIZE)
-
     EventAttachment.objects.create(
         event_id=event_id,
         project_id=project.id,
@@ -1562,6 +1582,10 @@ def save_attachments(cache_key, attachments, job):
 
     event = job["event"]
 
+    # Fetch the chunks of all attachments at once rather than one by one.
+    with metrics.timer("event_manager.save_attachments.prefetch"):
+        attachment_cache.prefetch_data(attachments)
+
     for attachment in attachments:
         save_attachment(
             cache_key,
@@ -1625,7 +1649,7 @@ def _calculate_event_grouping(project, event, grouping_config):
         # event.  If that config has since been deleted (because it was an
         # experimental grouping config) we fall back to the default.
         try:
-            flat_hashes, hierarchical_hashes = event.get_hashes(grouping_config)
+            flat_hashes, hierarchical_hashes = get_hashes_for_event(event, grouping_config)
         except GroupingConfigNotFound:
             event.data["grouping_config"] = get_grouping_config_dict_for_project(project)
             flat_hashes, hierarchical_hashes = event.get_hashes()
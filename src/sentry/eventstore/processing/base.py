@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
 
 import sentry_sdk
 
@@ -40,6 +40,18 @@ class EventProcessingStore:
             self.inner.set(key, event, self.timeout)
             return key
 
+    def store_many(self, events: Sequence[Event], unprocessed: bool = False) -> Sequence[str]:
+        """
+        Store multiple events at once. Returns the keys of the events in the
+        same order as the events were provided.
+        """
+        with sentry_sdk.start_span(op="eventstore.processing.store_many"):
+            keys = [cache_key_for_event(event) for event in events]
+            if unprocessed:
+                keys = [self.__get_unprocessed_key(key) for key in keys]
+            self.inner.set_many(list(zip(keys, events)), self.timeout)
+            return keys
+
     def get(self, key: str, unprocessed: bool = False) -> Optional[Event]:
         with sentry_sdk.start_span(op="eventstore.processing.get"):
             if unprocessed:
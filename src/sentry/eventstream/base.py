@@ -1,5 +1,6 @@
 import logging
 
+from sentry.celery import app
 from sentry.tasks.post_process import post_process_group
 from sentry.utils.cache import cache_key_for_event
 from sentry.utils.services import Service
@@ -17,6 +18,7 @@ class ForwarderNotRequired(NotImplementedError):
 class EventStream(Service):
     __all__ = (
         "insert",
+        "flush",
         "start_delete_groups",
         "end_delete_groups",
         "start_merge",
@@ -40,6 +42,7 @@ class EventStream(Service):
         is_new_group_environment,
         primary_hash,
         skip_consume=False,
+        producer=None,
     ):
         if skip_consume:
             logger.info("post_process.skip.raw_event", extra={"event_id": event.event_id})
@@ -47,15 +50,28 @@ class EventStream(Service):
             cache_key = cache_key_for_event(
                 {"project": event.project_id, "event_id": event.event_id}
             )
-            post_process_group.delay(
-                is_new=is_new,
-                is_regression=is_regression,
-                is_new_group_environment=is_new_group_environment,
-                primary_hash=primary_hash,
-                cache_key=cache_key,
-                group_id=event.group_id,
+            post_process_group.apply_async(
+                kwargs={
+                    "is_new": is_new,
+                    "is_regression": is_regression,
+                    "is_new_group_environment": is_new_group_environment,
+                    "primary_hash": primary_hash,
+                    "cache_key": cache_key,
+                    "group_id": event.group_id,
+                },
+                producer=producer,
             )
 
+    def _dispatch_post_process_group_tasks(self, tasks):
+        """
+        Dispatches a post-processing task for each of the given keyword
+        arguments of ``_dispatch_post_process_group_task``, publishing them all
+        with the same connection to the broker.
+        """
+        with app.producer_or_acquire() as producer:
+            for task_kwargs in tasks:
+                self._dispatch_post_process_group_task(producer=producer, **task_kwargs)
+
     def insert(
         self,
         group,
@@ -71,6 +87,13 @@ class EventStream(Service):
             event, is_new, is_regression, is_new_group_environment, primary_hash, skip_consume
         )
 
+    def flush(self):
+        """
+        Waits until all previously inserted events have been published, if the
+        backend publishes them asynchronously.
+        """
+        pass
+
     def start_delete_groups(self, project_id, group_ids):
         pass
 
@@ -116,6 +139,10 @@ class EventStream(Service):
         synchronize_commit_group,
         commit_batch_size=100,
         initial_offset_reset="latest",
+        parallel=False,
+        dispatch_batch_size=100,
+        post_process_workers=None,
+        dead_letter_topic=None,
     ):
         assert not self.requires_post_process_forwarder()
         raise ForwarderNotRequired
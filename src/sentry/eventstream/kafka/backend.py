@@ -1,31 +1,100 @@
 import logging
 import signal
+import time
 from typing import Any
 
-from confluent_kafka import OFFSET_INVALID, TopicPartition
+from confluent_kafka import OFFSET_INVALID, Producer, TopicPartition
 from django.conf import settings
 from django.utils.functional import cached_property
 
 from sentry.eventstream.kafka.consumer import SynchronizedConsumer
+from sentry.eventstream.kafka.forwarder import ParallelPostProcessForwarder
+from sentry.eventstream.kafka.postprocess import PostProcessExecutor
 from sentry.eventstream.kafka.protocol import get_task_kwargs_for_message
 from sentry.eventstream.snuba import SnubaProtocolEventStream
 from sentry.utils import json, kafka, metrics
+from sentry.utils.kafka_config import get_kafka_producer_cluster_options
 
 logger = logging.getLogger(__name__)
 
+# Producer configuration for the ``batching`` mode, which can be overridden
+# with the ``producer_configuration`` option. Messages are produced as one
+# batch per ``save_event`` batch, and the producer is flushed explicitly at
+# the end of it, so the linger time only bounds how long a batch is held back
+# by the producer otherwise.
+BATCHING_PRODUCER_CONFIGURATION = {
+    "linger.ms": 100,
+    "compression.type": "lz4",
+}
+
 
 class KafkaEventStream(SnubaProtocolEventStream):
-    def __init__(self, **options):
+    """
+    Publishes events to the events topic in Kafka.
+
+    With ``batching`` enabled, inserted events are held back by the producer
+    until ``flush`` is called at the end of a ``save_event`` batch, rather
+    than the producer being polled on every insert. All other messages are
+    still produced as usual. The producer is then separate from the shared
+    one of the cluster, so it can be configured for this (see
+    ``BATCHING_PRODUCER_CONFIGURATION``).
+
+    Payloads are encoded with ``json_backend`` if it is given (see
+    ``sentry.utils.json.get_encoder``), and ``sentry.utils.json.dumps``
+    otherwise.
+    """
+
+    def __init__(self, batching=False, producer_configuration=None, json_backend=None, **options):
         self.topic = settings.KAFKA_TOPICS[settings.KAFKA_EVENTS]["topic"]
+        self.batching = batching
+        self.producer_configuration = producer_configuration or {}
+
+        self.encode = json.get_encoder(json_backend) if json_backend else json.dumps
 
     @cached_property
     def producer(self):
-        return kafka.producers.get(settings.KAFKA_EVENTS)
+        if not self.batching:
+            return kafka.producers.get(settings.KAFKA_EVENTS)
+
+        cluster_name = settings.KAFKA_TOPICS[settings.KAFKA_EVENTS]["cluster"]
+        cluster_options = dict(BATCHING_PRODUCER_CONFIGURATION)
+        cluster_options.update(get_kafka_producer_cluster_options(cluster_name))
+        cluster_options.update(self.producer_configuration)
+        return Producer(cluster_options)
 
     def delivery_callback(self, error, message):
         if error is not None:
             logger.warning("Could not publish message (error: %s): %r", error, message)
 
+    def _get_delivery_callback(self, batched):
+        if not batched:
+            return self.delivery_callback
+
+        produced_at = time.time()
+
+        def delivery_callback(error, message):
+            metrics.timing(
+                "eventstream.batch.delivery_latency",
+                time.time() - produced_at,
+                tags={"success": error is None},
+            )
+            self.delivery_callback(error, message)
+
+        return delivery_callback
+
+    def flush(self):
+        if not self.batching:
+            return
+
+        batch_size = len(self.producer)
+        if not batch_size:
+            return
+
+        metrics.timing("eventstream.batch.size", batch_size)
+        with metrics.timer("eventstream.batch.flush"):
+            # Also fires the delivery callbacks of the batch.
+            self.producer.flush()
+
     def _send(
         self,
         project_id,
@@ -46,8 +115,12 @@ class KafkaEventStream(SnubaProtocolEventStream):
         # interfering with request handling. (This does `poll` does not act as
         # a heartbeat for the purposes of any sort of session expiration.)
         # Note that this call to poll() is *only* dealing with earlier
-        # asynchronous produce() calls from the same process.
-        self.producer.poll(0.0)
+        # asynchronous produce() calls from the same process. In batching
+        # mode, the callbacks of inserts are fired when the batch is flushed
+        # instead.
+        batched = self.batching and _type == "insert"
+        if not batched:
+            self.producer.poll(0.0)
 
         assert isinstance(extra_data, tuple)
         key = str(project_id)
@@ -56,8 +129,8 @@ class KafkaEventStream(SnubaProtocolEventStream):
             self.producer.produce(
                 topic=self.topic,
                 key=key.encode("utf-8"),
-                value=json.dumps((self.EVENT_PROTOCOL_VERSION, _type) + extra_data),
-                on_delivery=self.delivery_callback,
+                value=self.encode((self.EVENT_PROTOCOL_VERSION, _type) + extra_data),
+                on_delivery=self._get_delivery_callback(batched),
                 headers=[(k, v.encode("utf-8")) for k, v in headers.items()],
             )
         except Exception as error:
@@ -78,7 +151,41 @@ class KafkaEventStream(SnubaProtocolEventStream):
         synchronize_commit_group,
         commit_batch_size=100,
         initial_offset_reset="latest",
+        parallel=False,
+        dispatch_batch_size=100,
+        post_process_workers=None,
+        dead_letter_topic=None,
     ):
+        if post_process_workers:
+            # Post-processing in the forwarder requires offsets to be
+            # committed only after the events have been processed.
+            post_process = PostProcessExecutor(
+                post_process_workers, dead_letter_topic=dead_letter_topic
+            )
+            try:
+                return self._run_parallel_post_process_forwarder(
+                    consumer_group,
+                    commit_log_topic,
+                    synchronize_commit_group,
+                    post_process,
+                    commit_batch_size=commit_batch_size,
+                    initial_offset_reset=initial_offset_reset,
+                    dispatch_batch_size=dispatch_batch_size,
+                )
+            finally:
+                post_process.shutdown()
+
+        if parallel:
+            return self._run_parallel_post_process_forwarder(
+                consumer_group,
+                commit_log_topic,
+                synchronize_commit_group,
+                self._dispatch_post_process_group_tasks_for_messages,
+                commit_batch_size=commit_batch_size,
+                initial_offset_reset=initial_offset_reset,
+                dispatch_batch_size=dispatch_batch_size,
+            )
+
         logger.debug("Starting post-process forwarder...")
 
         cluster_name = settings.KAFKA_TOPICS[settings.KAFKA_EVENTS]["cluster"]
@@ -226,3 +333,59 @@ class KafkaEventStream(SnubaProtocolEventStream):
         commit_offsets()
 
         consumer.close()
+
+    def _dispatch_post_process_group_tasks_for_messages(self, messages):
+        with metrics.timer("eventstream.duration", instance="get_task_kwargs_for_message"):
+            tasks = [get_task_kwargs_for_message(message.value()) for message in messages]
+
+        tasks = [task_kwargs for task_kwargs in tasks if task_kwargs is not None]
+        if tasks:
+            with metrics.timer(
+                "eventstream.duration", instance="dispatch_post_process_group_tasks"
+            ):
+                self._dispatch_post_process_group_tasks(tasks)
+
+    def _run_parallel_post_process_forwarder(
+        self,
+        consumer_group,
+        commit_log_topic,
+        synchronize_commit_group,
+        process,
+        commit_batch_size=100,
+        initial_offset_reset="latest",
+        dispatch_batch_size=100,
+    ):
+        logger.debug("Starting parallel post-process forwarder...")
+
+        cluster_name = settings.KAFKA_TOPICS[settings.KAFKA_EVENTS]["cluster"]
+
+        def on_commit(error, partitions):
+            if error is not None:
+                logger.warning("Could not commit offsets (error: %s): %r", error, partitions)
+            forwarder.on_commit(error, partitions)
+
+        consumer = SynchronizedConsumer(
+            cluster_name=cluster_name,
+            consumer_group=consumer_group,
+            commit_log_topic=commit_log_topic,
+            synchronize_commit_group=synchronize_commit_group,
+            initial_offset_reset=initial_offset_reset,
+            on_commit=on_commit,
+        )
+
+        forwarder = ParallelPostProcessForwarder(
+            consumer,
+            self.topic,
+            process,
+            commit_batch_size=commit_batch_size,
+            batch_size=dispatch_batch_size,
+        )
+
+        def handle_shutdown_request(signum: int, frame: Any) -> None:
+            logger.debug("Received signal %r, requesting shutdown...", signum)
+            forwarder.stop()
+
+        signal.signal(signal.SIGINT, handle_shutdown_request)
+        signal.signal(signal.SIGTERM, handle_shutdown_request)
+
+        forwarder.run()
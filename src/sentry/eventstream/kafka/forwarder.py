@@ -0,0 +1,297 @@
+import logging
+import time
+from queue import Empty, Full, Queue
+
+from confluent_kafka import TopicPartition
+
+from sentry.eventstream.kafka.state import SynchronizedPartitionStateManager
+from sentry.utils import metrics
+from sentry.utils.concurrent import execute
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the messages of a partition in a worker queue.
+STOP_WORKER = object()
+
+
+class PartitionWorker:
+    """
+    Processes the messages of a single partition in order in a separate
+    thread, by calling ``process`` with batches of (at most) ``batch_size``
+    messages.
+
+    Processed offsets are recorded as the local offsets of the partition in
+    ``offsets``, while the forwarder records the consumed offsets as the
+    remote offsets.
+    """
+
+    def __init__(self, topic, partition, process, offsets, batch_size, max_pending):
+        self.topic = topic
+        self.partition = partition
+        self.process = process
+        self.offsets = offsets
+        self.batch_size = batch_size
+        self.tags = {"partition": partition}
+
+        self.__queue = Queue(maxsize=max_pending)
+        self.__future = execute(self.__run)
+
+    def __get_batch(self):
+        batch = [self.__queue.get()]
+        while len(batch) < self.batch_size and batch[-1] is not STOP_WORKER:
+            try:
+                batch.append(self.__queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def __run(self):
+        while True:
+            batch = self.__get_batch()
+            stop = batch[-1] is STOP_WORKER
+            if stop:
+                batch.pop()
+
+            if batch:
+                self.__process_batch(batch)
+
+            if stop:
+                return
+
+    def __process_batch(self, batch):
+        start = time.time()
+
+        self.process(batch)
+
+        message = batch[-1]
+        self.offsets.set_local_offset(self.topic, self.partition, message.offset() + 1)
+
+        end = time.time()
+        metrics.timing("eventstream.forwarder.partition.batch_size", len(batch), tags=self.tags)
+        metrics.timing("eventstream.forwarder.partition.duration", end - start, tags=self.tags)
+        metrics.incr("eventstream.forwarder.partition.messages", len(batch), tags=self.tags)
+
+        _, timestamp = message.timestamp()
+        if timestamp is not None and timestamp > 0:
+            metrics.timing(
+                "eventstream.forwarder.partition.lag", end - timestamp / 1000.0, tags=self.tags
+            )
+
+    def check(self):
+        """
+        Raises the exception of the worker, if it has stopped due to an error.
+        """
+        if self.__future.done():
+            self.__future.result()
+
+    def submit(self, message):
+        """
+        Queues a message for processing, blocking while the worker has
+        ``max_pending`` messages queued already.
+        """
+        while True:
+            try:
+                self.__queue.put(message, timeout=1.0)
+                return
+            except Full:
+                self.check()
+
+    def stop(self):
+        """
+        Waits until all queued messages have been processed and stops the
+        worker.
+        """
+        self.submit(STOP_WORKER)
+        self.__future.result()
+
+
+class ParallelPostProcessForwarder:
+    """
+    Processes messages consumed by a ``SynchronizedConsumer`` with ``process``
+    in one ``PartitionWorker`` per assigned partition. Ordering is preserved
+    within every partition, while partitions are processed concurrently.
+
+    Offsets are tracked in a ``SynchronizedPartitionStateManager``: the remote
+    offset of a partition is the offset that has been consumed, the local
+    offset the one that has been processed by the worker and can be committed.
+    Processed offsets are committed every ``commit_batch_size`` messages, and
+    after ``commit_interval`` seconds while no messages are being consumed.
+
+    Asynchronous commits are only known to have succeeded once the consumer
+    calls its ``on_commit`` callback, which must call ``on_commit`` of the
+    forwarder.
+    """
+
+    def __init__(
+        self,
+        consumer,
+        topic,
+        process,
+        commit_batch_size=100,
+        batch_size=100,
+        max_pending=1000,
+        commit_interval=1.0,
+    ):
+        self.consumer = consumer
+        self.topic = topic
+        self.process = process
+        self.commit_batch_size = commit_batch_size
+        self.commit_interval = commit_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        # The state changes are of no interest, the states only indicate if
+        # workers are behind the consumer.
+        self.offsets = SynchronizedPartitionStateManager(lambda *args: None)
+        self.workers = {}
+        self.committed_offsets = {}
+        self.last_commit = time.time()
+
+        self.__shutdown_requested = False
+
+    def __start_worker(self, topic, partition):
+        return PartitionWorker(
+            topic,
+            partition,
+            self.process,
+            self.offsets,
+            batch_size=self.batch_size,
+            max_pending=self.max_pending,
+        )
+
+    def __on_assign(self, consumer, partitions):
+        logger.info("Received partition assignment: %r", partitions)
+
+        for i in partitions:
+            key = (i.topic, i.partition)
+            if key not in self.workers:
+                self.workers[key] = self.__start_worker(i.topic, i.partition)
+
+    def __on_revoke(self, consumer, partitions):
+        logger.info("Revoked partition assignment: %r", partitions)
+
+        keys = []
+        for i in partitions:
+            key = (i.topic, i.partition)
+            worker = self.workers.pop(key, None)
+            if worker is None:
+                logger.warning(
+                    "Received unexpected partition revocation for unowned partition: %r", i
+                )
+                continue
+
+            worker.stop()
+            keys.append(key)
+
+        self.commit(keys, asynchronous=False)
+
+        for topic, partition in keys:
+            self.offsets.remove(topic, partition)
+            self.committed_offsets.pop((topic, partition), None)
+
+    def commit(self, keys, asynchronous=True):
+        offsets_to_commit = []
+        for topic, partition in keys:
+            offset = self.offsets.get_offsets(topic, partition).local
+            if offset is None or offset == self.committed_offsets.get((topic, partition)):
+                continue
+
+            offsets_to_commit.append(TopicPartition(topic, partition, offset))
+
+        self.last_commit = time.time()
+        if not offsets_to_commit:
+            return
+
+        logger.debug(
+            "Committing offset(s) for %s partition(s): %r",
+            len(offsets_to_commit),
+            offsets_to_commit,
+        )
+        with metrics.timer("eventstream.forwarder.commit"):
+            results = self.consumer.commit(offsets=offsets_to_commit, asynchronous=asynchronous)
+
+        if asynchronous:
+            # The committed offsets are updated by ``on_commit``.
+            return
+
+        errors = [i for i in results if i.error is not None]
+        if errors:
+            raise Exception(
+                "Failed to commit {}/{} partitions: {!r}".format(
+                    len(errors), len(offsets_to_commit), errors
+                )
+            )
+
+        for i in offsets_to_commit:
+            self.committed_offsets[(i.topic, i.partition)] = i.offset
+
+    def on_commit(self, error, partitions):
+        """
+        Records the offsets of an asynchronous commit once it has succeeded.
+        """
+        if error is not None:
+            return
+
+        for i in partitions:
+            key = (i.topic, i.partition)
+            if i.error is None and key in self.workers:
+                self.committed_offsets[key] = i.offset
+
+    def __record_pending(self):
+        for (topic, partition), worker in self.workers.items():
+            offsets = self.offsets.get_offsets(topic, partition)
+            if offsets.local is not None and offsets.remote is not None:
+                metrics.timing(
+                    "eventstream.forwarder.partition.pending",
+                    offsets.remote - offsets.local,
+                    tags=worker.tags,
+                )
+
+    def stop(self):
+        """
+        Requests the forwarder to shut down after the current message.
+        """
+        self.__shutdown_requested = True
+
+    def run(self):
+        self.consumer.subscribe(
+            [self.topic], on_assign=self.__on_assign, on_revoke=self.__on_revoke
+        )
+
+        i = 0
+        while not self.__shutdown_requested:
+            for worker in self.workers.values():
+                worker.check()
+
+            message = self.consumer.poll(0.1)
+            if message is None:
+                if time.time() - self.last_commit >= self.commit_interval:
+                    self.commit(self.workers.keys())
+                continue
+
+            error = message.error()
+            if error is not None:
+                raise Exception(error)
+
+            key = (message.topic(), message.partition())
+            worker = self.workers.get(key)
+            if worker is None:
+                logger.warning("Skipping message for unowned partition: %r", key)
+                continue
+
+            i = i + 1
+            self.offsets.set_remote_offset(
+                message.topic(), message.partition(), message.offset() + 1
+            )
+            worker.submit(message)
+
+            if i % self.commit_batch_size == 0:
+                self.__record_pending()
+                self.commit(self.workers.keys())
+
+        logger.debug("Waiting for workers, committing offsets and closing consumer...")
+        for worker in self.workers.values():
+            worker.stop()
+        self.commit(self.workers.keys(), asynchronous=False)
+
+        self.consumer.close()
@@ -0,0 +1,133 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from sentry.eventstore.models import Event
+from sentry.eventstore.processing import event_processing_store
+from sentry.eventstream.kafka.protocol import get_task_kwargs_for_message
+from sentry.tasks.post_process import post_process_event
+from sentry.utils import kafka, metrics
+from sentry.utils.cache import cache_key_for_event
+
+logger = logging.getLogger(__name__)
+
+
+class PostProcessExecutor:
+    """
+    Post-processes the events of batches of messages from the events topic in
+    a thread pool of ``max_workers`` threads, instead of dispatching
+    ``post_process_group`` tasks to Celery. Like that task, the event is built
+    from its data in the processing store rather than the (pruned) data in the
+    message, so there is still one fetch from the processing store per event.
+
+    Like the ``post_process_group`` task, events are skipped once they are no
+    longer in the processing store, from which they are removed at the end of
+    post-processing. This keeps events from being post-processed again after
+    the forwarder rewinds, or restarts before the offsets of a batch have been
+    committed. Post-processing is not idempotent, so failed events are not
+    retried: the message is produced to ``dead_letter_topic``, or the error is
+    raised if there is none.
+
+    This is meant to be used as ``process`` function of the
+    ``ParallelPostProcessForwarder``, which only commits the offsets of a batch
+    once it has been processed.
+    """
+
+    def __init__(self, max_workers, dead_letter_topic=None):
+        self.dead_letter_topic = dead_letter_topic
+
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="post-process"
+        )
+
+    @property
+    def producer(self):
+        return kafka.producers.get(settings.KAFKA_EVENTS)
+
+    def __call__(self, messages):
+        with metrics.timer("eventstream.post_process.batch"):
+            futures = [
+                self.__executor.submit(self.__process_message, message) for message in messages
+            ]
+            dead_letters = sum(future.result() for future in futures)
+
+        # Dead letters have to be delivered before the offsets are committed.
+        if dead_letters:
+            with metrics.timer("eventstream.post_process.duration", instance="dead_letter_flush"):
+                self.producer.flush()
+
+    def __process_message(self, message):
+        """
+        Returns whether the message has been produced to the dead letter topic.
+        """
+        try:
+            self.__post_process(message)
+        except Exception:
+            if not self.dead_letter_topic:
+                raise
+
+            logger.exception("Error post-processing message, sending to dead letter topic.")
+            metrics.incr("eventstream.post_process.dead_letter")
+            self.producer.produce(
+                self.dead_letter_topic,
+                key=message.key(),
+                value=message.value(),
+                headers={
+                    "partition": str(message.partition()),
+                    "offset": str(message.offset()),
+                    "topic": message.topic(),
+                },
+            )
+            return True
+
+        return False
+
+    def __post_process(self, message):
+        with metrics.timer("eventstream.post_process.duration", instance="get_task_kwargs"):
+            task_kwargs = get_task_kwargs_for_message(message.value())
+
+        if task_kwargs is None:
+            return
+
+        message_event = task_kwargs["event"]
+        cache_key = cache_key_for_event(
+            {"project": message_event.project_id, "event_id": message_event.event_id}
+        )
+
+        # We use the data being present/missing in the processing store
+        # to ensure that we don't duplicate work should the forwarder need to
+        # rewind history.
+        with metrics.timer("eventstream.post_process.duration", instance="processing_store"):
+            data = event_processing_store.get(cache_key)
+        if not data:
+            logger.info(
+                "post_process.skipped",
+                extra={"cache_key": cache_key, "reason": "missing_cache"},
+            )
+            return
+
+        event = Event(
+            project_id=data["project"],
+            event_id=data["event_id"],
+            group_id=message_event.group_id,
+            data=data,
+        )
+
+        # Like Celery does for every task, discard connections that are
+        # unusable or past their maximum age.
+        close_old_connections()
+
+        with metrics.timer("eventstream.post_process.duration", instance="post_process"):
+            post_process_event(
+                event,
+                task_kwargs["is_new"],
+                task_kwargs["is_regression"],
+                task_kwargs["is_new_group_environment"],
+                cache_key,
+                primary_hash=task_kwargs["primary_hash"],
+            )
+
+    def shutdown(self):
+        self.__executor.shutdown()
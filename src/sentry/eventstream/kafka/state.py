@@ -171,6 +171,22 @@ class SynchronizedPartitionStateManager:
                     (updated_state, updated_offsets),
                 )
 
+    def get_offsets(self, topic, partition):
+        """
+        Get the local and remote offsets for a topic and partition.
+        """
+        with self.__lock:
+            state, offsets = self.partitions.get((topic, partition), (None, Offsets(None, None)))
+            return offsets
+
+    def remove(self, topic, partition):
+        """
+        Stop tracking a topic and partition, for instance once it has been
+        revoked from the local consumer. The callback function is not invoked.
+        """
+        with self.__lock:
+            self.partitions.pop((topic, partition), None)
+
     def validate_local_message(self, topic, partition, offset):
         """
         Check if a message should be consumed by the local consumer.
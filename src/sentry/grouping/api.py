@@ -6,9 +6,11 @@ from sentry.grouping.enhancer import LATEST_VERSION, Enhancements, InvalidEnhanc
 from sentry.grouping.strategies.base import DEFAULT_GROUPING_ENHANCEMENTS_BASE, GroupingContext
 from sentry.grouping.strategies.configurations import CONFIGURATIONS
 from sentry.grouping.utils import (
+    ParsedConfigCache,
     expand_title_template,
     hash_from_values,
     is_default_fingerprint_var,
+    parse_fingerprint_var,
     resolve_fingerprint_values,
 )
 from sentry.grouping.variants import (
@@ -22,6 +24,36 @@ from sentry.grouping.variants import (
 
 HASH_RE = re.compile(r"^[0-9a-f]{32}$")
 
+# Serialized enhancements by their base and project rules, and fingerprinting
+# rules by their project rules. These avoid the roundtrip to the cache, and
+# parsing the rules, for every event.
+_enhancements_config_cache = ParsedConfigCache("enhancements_config")
+_fingerprinting_rules_cache = ParsedConfigCache("fingerprinting_rules")
+
+# Flat and hierarchical hashes by a digest of the grouping inputs of events,
+# see ``get_hashes_for_event``.
+_event_hashes_cache = ParsedConfigCache("event_hashes", max_size=10000)
+
+# Keys of the event payload that grouping depends on. Tags are only taken
+# into account if they are referenced by the fingerprint.
+GROUPING_INPUT_KEYS = (
+    "checksum",
+    "fingerprint",
+    "platform",
+    "transaction",
+    "level",
+    "logger",
+    "logentry",
+    "exception",
+    "stacktrace",
+    "threads",
+    "template",
+    "csp",
+    "hpkp",
+    "expectct",
+    "expectstaple",
+)
+
 
 class GroupingConfigNotFound(LookupError):
     pass
@@ -44,6 +76,12 @@ class GroupingConfigLoader:
         config_id = self._get_config_id(project)
         enhancements_base = CONFIGURATIONS[config_id].enhancements_base
 
+        return _enhancements_config_cache.get_or_load(
+            f"{LATEST_VERSION}:{enhancements_base}|{enhancements}",
+            lambda: self._load_enhancements(enhancements, enhancements_base),
+        )
+
+    def _load_enhancements(self, enhancements, enhancements_base):
         # Instead of parsing and dumping out config here, we can make a
         # shortcut
         from sentry.utils.cache import cache
@@ -152,12 +190,17 @@ def load_default_grouping_config():
 
 
 def get_fingerprinting_config_for_project(project):
-    from sentry.grouping.fingerprinting import FingerprintingRules, InvalidFingerprintingConfig
+    from sentry.grouping.fingerprinting import FingerprintingRules
 
     rules = project.get_option("sentry:fingerprinting_rules")
     if not rules:
         return FingerprintingRules([])
 
+    return _fingerprinting_rules_cache.get_or_load(rules, lambda: _load_fingerprinting_rules(rules))
+
+
+def _load_fingerprinting_rules(rules):
+    from sentry.grouping.fingerprinting import FingerprintingRules, InvalidFingerprintingConfig
     from sentry.utils.cache import cache
     from sentry.utils.hashlib import md5_text
 
@@ -174,6 +217,46 @@ def get_fingerprinting_config_for_project(project):
     return rv
 
 
+def get_grouping_inputs_digest(event_data, config):
+    """
+    Returns a digest of everything the hashes of an event depend on: the
+    grouping config and the grouping relevant parts of the event payload.
+    """
+    from sentry.utils import json
+
+    inputs = {key: event_data.get(key) for key in GROUPING_INPUT_KEYS}
+    if any(
+        (parse_fingerprint_var(value) or "").startswith("tags.")
+        for value in event_data.get("fingerprint") or ()
+    ):
+        inputs["tags"] = event_data.get("tags")
+
+    config_key = "{}|{}|".format(config["id"], config.get("enhancements") or "")
+    return hash_from_values([config_key, json.dumps(inputs)])
+
+
+def get_hashes_for_event(event, config):
+    """
+    Returns the flat and hierarchical hashes of the event for the given
+    grouping config dictionary, like ``event.get_hashes(config)``.
+
+    Events with identical grouping inputs, as they occur when the same error
+    happens many times, have identical hashes. These are kept in a
+    per-process cache, so that grouping only runs for the first of them.
+    """
+    if not options.get("store.grouping-hash-cache-enabled"):
+        return event.get_hashes(config)
+
+    def get_hashes():
+        flat_hashes, hierarchical_hashes = event.get_hashes(config)
+        return tuple(flat_hashes), tuple(hierarchical_hashes)
+
+    flat_hashes, hierarchical_hashes = _event_hashes_cache.get_or_load(
+        get_grouping_inputs_digest(event.data, config), get_hashes
+    )
+    return list(flat_hashes), list(hierarchical_hashes)
+
+
 def apply_server_fingerprinting(event, config, allow_custom_title=True):
     client_fingerprint = event.get("fingerprint")
     rv = config.get_fingerprint_values_for_event(event)
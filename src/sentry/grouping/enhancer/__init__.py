@@ -8,10 +8,12 @@ from parsimonious.grammar import Grammar, NodeVisitor
 
 from sentry import projectoptions
 from sentry.grouping.component import GroupingComponent
+from sentry.grouping.utils import ParsedConfigCache
 from sentry.utils.strings import unescape_string
 
 from .actions import Action, FlagAction, VarAction
 from .exceptions import InvalidEnhancerConfig
+from .index import RuleIndex
 from .matchers import (
     CalleeMatch,
     CallerMatch,
@@ -70,6 +72,9 @@ _        = space*
 VERSIONS = [1, 2]
 LATEST_VERSION = VERSIONS[-1]
 
+# Enhancements by their serialized form, see ``Enhancements.loads_cached``.
+_enhancements_cache = ParsedConfigCache("enhancements")
+
 
 class StacktraceState:
     def __init__(self):
@@ -116,6 +121,9 @@ class Enhancements:
         self._modifier_rules = [rule for rule in self.iter_rules() if rule.is_modifier]
         self._updater_rules = [rule for rule in self.iter_rules() if rule.is_updater]
 
+        self._modifier_index = RuleIndex(self._modifier_rules)
+        self._updater_index = RuleIndex(self._updater_rules)
+
     def apply_modifications_to_frame(self, frames, platform, exception_data):
         """This applies the frame modifications to the frames itself.  This
         does not affect grouping.
@@ -124,10 +132,11 @@ class Enhancements:
         cache = {}
 
         match_frames = [create_match_frame(frame, platform) for frame in frames]
+        candidates = self._modifier_index.get_candidate_frames(match_frames, cache)
 
-        for rule in self._modifier_rules:
+        for rule, frame_indices in zip(self._modifier_rules, candidates):
             for idx, action in rule.get_matching_frame_actions(
-                match_frames, platform, exception_data, cache
+                match_frames, platform, exception_data, cache, frame_indices
             ):
                 action.apply_modifications_to_frame(frames, match_frames, idx, rule=rule)
 
@@ -136,13 +145,14 @@ class Enhancements:
         cache = {}
 
         match_frames = [create_match_frame(frame, platform) for frame in frames]
+        candidates = self._updater_index.get_candidate_frames(match_frames, cache)
 
         stacktrace_state = StacktraceState()
         # Apply direct frame actions and update the stack state alongside
-        for rule in self._updater_rules:
+        for rule, frame_indices in zip(self._updater_rules, candidates):
 
             for idx, action in rule.get_matching_frame_actions(
-                match_frames, platform, exception_data, cache
+                match_frames, platform, exception_data, cache, frame_indices
             ):
                 action.update_frame_components_contributions(components, frames, idx, rule=rule)
                 action.modify_stacktrace_state(stacktrace_state, rule)
@@ -259,6 +269,13 @@ class Enhancements:
         except (LookupError, AttributeError, TypeError, ValueError) as e:
             raise ValueError("invalid stack trace rule config: %s" % e)
 
+    @classmethod
+    def loads_cached(cls, data):
+        """Like `loads`, but returns an instance shared by all callers from a
+        per-process cache.  The returned enhancements must not be modified.
+        """
+        return _enhancements_cache.get_or_load(data, lambda: cls.loads(data))
+
     @classmethod
     def from_config_string(self, s, bases=None, id=None):
         try:
@@ -312,9 +329,14 @@ class Rule:
             matchers[matcher.key] = matcher.pattern
         return {"match": matchers, "actions": [str(x) for x in self.actions]}
 
-    def get_matching_frame_actions(self, frames, platform, exception_data=None, cache=None):
+    def get_matching_frame_actions(
+        self, frames, platform, exception_data=None, cache=None, frame_indices=None
+    ):
         """Given a frame returns all the matching actions based on this rule.
         If the rule does not match `None` is returned.
+
+        If `frame_indices` is given, only the frames at these indices are
+        checked.
         """
         if not self.matchers:
             return []
@@ -326,8 +348,11 @@ class Rule:
 
         rv = []
 
+        if frame_indices is None:
+            frame_indices = range(len(frames))
+
         # 2 - Check if frame matchers match
-        for idx, frame in enumerate(frames):
+        for idx in frame_indices:
             if all(
                 m.matches_frame(frames, idx, platform, exception_data, cache)
                 for m in self._other_matchers
@@ -0,0 +1,130 @@
+import re
+
+from .matchers import FrameFieldMatch, FunctionMatch, PathLikeMatch
+
+# Wildcards in glob patterns. Patterns with any other special characters are
+# never indexed.
+WILDCARDS_RE = re.compile(rb"[*?]")
+PATH_WILDCARDS_RE = re.compile(rb"[*?/\\]")
+UNSUPPORTED_CHARS = set(b"[]{}\\!")
+
+# Fields that can be indexed. Unlike ``category`` and ``in_app``, they are not
+# modified by actions, so frame candidates can be computed once per stack
+# trace.
+INDEXED_FIELDS = ("function", "module", "path", "package")
+
+
+def _get_index_key(matcher):
+    """
+    Returns the ``(field, value, exact)`` that frames need to match for the
+    matcher to match: the value of the field is equal to ``value`` if
+    ``exact``, or contains ``value`` otherwise. Returns ``None`` if the
+    matcher cannot be indexed.
+    """
+    if isinstance(matcher, FunctionMatch):
+        field = "function"
+    elif isinstance(matcher, (FrameFieldMatch, PathLikeMatch)):
+        field = matcher.field
+    else:
+        return None
+
+    if matcher.negated:
+        return None
+
+    pattern = matcher._encoded_pattern
+    if field not in INDEXED_FIELDS or UNSUPPORTED_CHARS.intersection(pattern):
+        return None
+
+    if isinstance(matcher, PathLikeMatch):
+        # Paths are normalized and matched with and without a leading slash,
+        # so only parts between separators have to be contained literally.
+        parts = PATH_WILDCARDS_RE.split(pattern)
+    else:
+        parts = WILDCARDS_RE.split(pattern)
+        if len(parts) == 1:
+            return field, pattern, True
+
+    value = max(parts, key=len)
+    if not value:
+        return None
+
+    return field, value, False
+
+
+class RuleIndex:
+    """
+    Narrows down the frames that the rules of an ``Enhancements`` object have
+    to be matched against.
+
+    For every rule, one of its frame matchers is used as index: either the
+    value of its pattern if it has no wildcards, or the longest literal part
+    of the pattern. Frames that do not contain that value cannot match the
+    rule, and are skipped. Literal parts of all rules are combined into one
+    regular expression per field to quickly reject frames that do not match
+    any of them.
+
+    Rules without a suitable matcher are matched against all frames.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+        self._unindexed = []
+        self._exact = {}
+        self._contains = {}
+
+        for i, rule in enumerate(rules):
+            keys = [_get_index_key(matcher) for matcher in rule._other_matchers]
+            keys = [key for key in keys if key is not None]
+            if not keys:
+                self._unindexed.append(i)
+                continue
+
+            # Prefer exact matches, and longer (more selective) parts.
+            field, value, exact = max(keys, key=lambda key: (key[2], len(key[1])))
+            if exact:
+                self._exact.setdefault(field, {}).setdefault(value, []).append(i)
+            else:
+                self._contains.setdefault(field, []).append((value, i))
+
+        self._fields = sorted(set(self._exact) | set(self._contains))
+        self._prefilters = {
+            field: re.compile(b"|".join(re.escape(value) for value, _ in values))
+            for field, values in self._contains.items()
+        }
+
+    def _get_rules_for_value(self, field, value):
+        rv = list(self._exact.get(field, {}).get(value, ()))
+
+        prefilter = self._prefilters.get(field)
+        if prefilter is not None and prefilter.search(value) is not None:
+            rv.extend(i for contained, i in self._contains[field] if contained in value)
+
+        return rv
+
+    def get_candidate_frames(self, match_frames, cache):
+        """
+        Returns, for every rule, the indices of the frames in ``match_frames``
+        that it may match, or ``None`` if it has to be matched against all
+        frames.
+        """
+        rv = [[] for _ in self.rules]
+
+        for idx, match_frame in enumerate(match_frames):
+            for field in self._fields:
+                value = match_frame[field]
+                if value is None:
+                    continue
+
+                cache_key = (self, field, value)
+                rules = cache.get(cache_key)
+                if rules is None:
+                    rules = cache[cache_key] = self._get_rules_for_value(field, value)
+
+                for i in rules:
+                    rv[i].append(idx)
+
+        for i in self._unindexed:
+            rv[i] = None
+
+        return rv
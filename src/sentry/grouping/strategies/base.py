@@ -265,7 +265,7 @@ class StrategyConfiguration:
         if enhancements is None:
             enhancements_instance = Enhancements([])
         else:
-            enhancements_instance = Enhancements.loads(enhancements)
+            enhancements_instance = Enhancements.loads_cached(enhancements)
         self.enhancements = enhancements_instance
 
     def __repr__(self) -> str:
@@ -1,9 +1,12 @@
 import re
+from collections import OrderedDict
 from hashlib import md5
+from threading import Lock
 
 from django.utils.encoding import force_bytes
 
 from sentry.stacktraces.processing import get_crash_frame_from_event_data
+from sentry.utils import metrics
 from sentry.utils.safe import get_path
 
 _fingerprint_var_re = re.compile(r"\{\{\s*(\S+)\s*\}\}")
@@ -26,6 +29,51 @@ def hash_from_values(values):
     return result.hexdigest()
 
 
+class ParsedConfigCache:
+    """
+    A per-process LRU cache of parsed grouping configs, such as
+    ``Enhancements`` or ``FingerprintingRules``, keyed by a hash of their
+    source. Cached configs are shared by all events and threads, so they must
+    not be mutated.
+    """
+
+    def __init__(self, name, max_size=1000):
+        self.name = name
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def get_or_load(self, source, load):
+        """
+        Returns the config parsed from ``source``, calling ``load`` to parse
+        it on a cache miss.
+        """
+        key = hash_from_values([source])
+
+        with self.lock:
+            rv = self.items.get(key)
+            if rv is not None:
+                self.items.move_to_end(key)
+
+        if rv is not None:
+            metrics.incr("grouping.config_cache.hit", tags={"cache": self.name})
+            return rv
+
+        metrics.incr("grouping.config_cache.miss", tags={"cache": self.name})
+        rv = load()
+
+        with self.lock:
+            self.items[key] = rv
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+        return rv
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
 def get_rule_bool(value):
     if value:
         value = value.lower()
@@ -0,0 +1,248 @@
+"""
+Automatic load shedding ("admission control") for the ingest consumer.
+
+The pressure on the event pipeline is derived from the depth of the
+processing queues and the lag of the ingest consumer. While the pressure
+exceeds the configured thresholds, the projects contributing most to the
+load receive token budgets that limit them to a fair share of the reduced
+load. Events of other projects are not affected.
+
+The load of a project is measured by the payload bytes of its events, and the
+time the consumer spends dispatching them. That includes preprocessing, which
+runs in the consumer, but not the later stages in the Celery workers; payload
+bytes stand in for their cost.
+
+Manual killswitches take precedence: events dropped by them are never seen
+here.
+"""
+
+import logging
+import math
+import time
+from typing import Any, Callable, Iterable, Mapping, MutableMapping, Optional, Sequence, Tuple
+
+from sentry import options
+from sentry.constants import DataCategory
+from sentry.utils import metrics
+from sentry.utils.outcomes import Outcome, track_outcome
+
+logger = logging.getLogger(__name__)
+
+# Half-life (in seconds) of the per-project load statistics.
+STATS_HALF_LIFE = 60.0
+
+# Seconds between updates of the pressure and the project budgets.
+UPDATE_INTERVAL = 5.0
+
+# Number of seconds worth of budget a throttled project can use at once.
+BUDGET_BURST = 1.0
+
+OUTCOME_REASON = "load_shedding"
+
+
+def _get_queue_sizes(queues: Sequence[str]) -> Sequence[Tuple[str, int]]:
+    from sentry.monitoring.queues import backend
+
+    if backend is None or not queues:
+        return []
+    return backend.bulk_get_sizes(queues)
+
+
+def get_fair_share(loads: Iterable[float], target: float) -> float:
+    """
+    Returns the largest share ``C`` such that limiting every load to ``C``
+    reduces their sum to ``target`` ("water-filling"), or infinity if their
+    sum does not exceed ``target`` anyway.
+    """
+    loads = sorted(loads)
+    remaining = target
+    for i, load in enumerate(loads):
+        count = len(loads) - i
+        if load * count > remaining:
+            return remaining / count
+        remaining -= load
+    return math.inf
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.timestamp = now
+
+    def consume(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class ProjectLoad:
+    """
+    Exponentially decayed sums of the events, payload bytes and dispatch time
+    in the consumer of a project.
+    """
+
+    __slots__ = ("events", "bytes", "dispatched", "dispatch_seconds")
+
+    def __init__(self) -> None:
+        self.events = 0.0
+        self.bytes = 0.0
+        self.dispatched = 0.0
+        self.dispatch_seconds = 0.0
+
+    def decay(self, factor: float) -> None:
+        self.events *= factor
+        self.bytes *= factor
+        self.dispatched *= factor
+        self.dispatch_seconds *= factor
+
+    @property
+    def estimated_dispatch_seconds(self) -> float:
+        # Dispatch time is only known for admitted events, so it is
+        # extrapolated to all events of the project.
+        if not self.dispatched:
+            return 0.0
+        return self.dispatch_seconds / self.dispatched * self.events
+
+
+class AdmissionController:
+    """
+    Decides whether events are admitted into the pipeline, see the module
+    documentation. Configured with the ``store.admission-control-*`` options.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.time,
+        get_queue_sizes: Callable[[Sequence[str]], Sequence[Tuple[str, int]]] = _get_queue_sizes,
+    ) -> None:
+        self.clock = clock
+        self.get_queue_sizes = get_queue_sizes
+
+        self.pressure = 0.0
+        self.loads: MutableMapping[int, ProjectLoad] = {}
+        self.budgets: Mapping[int, TokenBucket] = {}
+
+        self.__lag = 0.0
+        self.__started: Optional[float] = None
+        self.__last_update: Optional[float] = None
+
+    def __get_queue_depth(self) -> int:
+        try:
+            sizes = self.get_queue_sizes(options.get("store.admission-control-queues"))
+        except Exception:
+            logger.exception("Could not get the size of the processing queues.")
+            return 0
+        return sum(size for _, size in sizes)
+
+    def __decay(self, elapsed: float) -> None:
+        factor = 0.5 ** (elapsed / STATS_HALF_LIFE)
+        for project_id, load in list(self.loads.items()):
+            load.decay(factor)
+            if load.events < 0.01:
+                del self.loads[project_id]
+
+    def __update_budgets(self, now: float) -> None:
+        self.budgets = {}
+        if self.pressure <= 1.0 or not self.loads:
+            return
+
+        total_bytes = sum(load.bytes for load in self.loads.values())
+        total_seconds = sum(load.estimated_dispatch_seconds for load in self.loads.values())
+
+        shares = {}
+        for project_id, load in self.loads.items():
+            share = load.bytes / total_bytes if total_bytes else 0.0
+            if total_seconds:
+                share = (share + load.estimated_dispatch_seconds / total_seconds) / 2
+            shares[project_id] = share
+
+        # Reduce the load in proportion to the pressure, starting with the
+        # projects with the largest share.
+        fair_share = get_fair_share(shares.values(), 1.0 / self.pressure)
+
+        # The decayed sum of a constant rate of events approaches the rate
+        # times the mean lifetime of the decay.
+        mean_lifetime = STATS_HALF_LIFE / math.log(2)
+        window = mean_lifetime * (1 - math.exp(-(now - self.__started) / mean_lifetime))
+
+        budgets = {}
+        for project_id, share in shares.items():
+            if share > fair_share:
+                rate = self.loads[project_id].events / window * fair_share / share
+                budgets[project_id] = TokenBucket(rate, max(1.0, rate * BUDGET_BURST), now)
+
+        self.budgets = budgets
+
+    def update(self, now: float) -> None:
+        elapsed = now - self.__last_update
+        self.__last_update = now
+
+        self.__decay(elapsed)
+
+        queue_depth = self.__get_queue_depth()
+        lag, self.__lag = self.__lag, 0.0
+
+        self.pressure = max(
+            queue_depth / options.get("store.admission-control-queue-threshold"),
+            lag / options.get("store.admission-control-lag-threshold"),
+        )
+        self.__update_budgets(now)
+
+        metrics.timing("ingest_consumer.admission.queue_depth", queue_depth)
+        metrics.timing("ingest_consumer.admission.lag", lag)
+        metrics.timing("ingest_consumer.admission.pressure", self.pressure)
+        metrics.timing("ingest_consumer.admission.throttled_projects", len(self.budgets))
+
+    def admit(self, message: Any, project: Any, data: Any) -> bool:
+        """
+        Returns whether the event of an ingest message should be processed, or
+        tracks the outcome of the event if it is shed. ``data`` is the parsed
+        payload of the message.
+        """
+        if not options.get("store.admission-control-enabled"):
+            return True
+
+        now = self.clock()
+        if self.__last_update is None:
+            self.__started = self.__last_update = now
+        elif now - self.__last_update >= UPDATE_INTERVAL:
+            self.update(now)
+
+        self.__lag = max(self.__lag, now - float(message["start_time"]))
+
+        load = self.loads.get(project.id)
+        if load is None:
+            load = self.loads[project.id] = ProjectLoad()
+        load.events += 1
+        load.bytes += len(message["payload"])
+
+        budget = self.budgets.get(project.id)
+        if budget is None or budget.consume(now):
+            return True
+
+        metrics.incr("ingest_consumer.admission.shed", skip_internal=False)
+        track_outcome(
+            org_id=project.organization_id,
+            project_id=project.id,
+            key_id=None,
+            outcome=Outcome.RATE_LIMITED,
+            reason=OUTCOME_REASON,
+            event_id=message["event_id"],
+            category=DataCategory.from_event_type(data.get("type")),
+        )
+        return False
+
+    def record_dispatch(self, project: Any, duration: float) -> None:
+        """
+        Records the time the consumer spent dispatching an admitted event to
+        the processing pipeline.
+        """
+        load = self.loads.get(project.id)
+        if load is not None:
+            load.dispatched += 1
+            load.dispatch_seconds += duration
@@ -0,0 +1,22 @@
+"""
+Decoding of event payloads in the worker processes of the staged ingest
+consumer (see ``sentry.ingest.ingest_consumer.StagedIngestConsumerWorker``.)
+
+The worker processes are started with the "spawn" method, as the consumer
+has started the threads of librdkafka by the time they are needed. This
+module is imported on its own in those processes, so it must not depend on
+Django being configured.
+"""
+
+import time
+from typing import Any, Sequence, Tuple
+
+from sentry.utils import json
+
+
+def decode_payloads(payloads: Sequence[bytes]) -> Tuple[Sequence[Any], float]:
+    """
+    Decode JSON payloads, returning them along with the time it took.
+    """
+    start = time.time()
+    return [json.loads(payload) for payload in payloads], time.time() - start
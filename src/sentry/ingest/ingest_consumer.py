@@ -1,10 +1,14 @@
 import functools
 import logging
+import multiprocessing
 import random
-from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import (
     Any,
     Callable,
+    Deque,
     Mapping,
     MutableMapping,
     MutableSequence,
@@ -25,6 +29,8 @@ from sentry import eventstore, features
 from sentry.attachments import CachedAttachment, attachment_cache
 from sentry.event_manager import save_attachment
 from sentry.eventstore.processing import event_processing_store
+from sentry.ingest.admission import AdmissionController
+from sentry.ingest.decoding import decode_payloads
 from sentry.ingest.types import ConsumerType
 from sentry.ingest.userreport import Conflict, save_userreport
 from sentry.killswitches import killswitch_matches_context
@@ -35,6 +41,7 @@ from sentry.utils import json, metrics
 from sentry.utils.batching_kafka_consumer import AbstractBatchWorker
 from sentry.utils.cache import cache_key_for_event
 from sentry.utils.dates import to_datetime
+from sentry.utils.iterators import chunked
 from sentry.utils.kafka import create_batching_kafka_consumer
 from sentry.utils.sdk import mark_scope_as_unsafe
 
@@ -43,6 +50,15 @@ logger = logging.getLogger(__name__)
 
 CACHE_TIMEOUT = 3600
 
+# Maximum number of events written to the processing store in a single
+# request when storing events concurrently.
+STORE_CHUNK_SIZE = 100
+
+# Number of events passed between the stages of the staged consumer at once.
+# Smaller chunks allow for more overlap between the stages, at the cost of
+# more requests to the processing store.
+STAGE_CHUNK_SIZE = 10
+
 
 T = TypeVar("T")
 
@@ -56,14 +72,13 @@ Message = Any
 
 
 class IngestConsumerWorker(AbstractBatchWorker):
-    def __init__(self, process_event_executor: Optional[ThreadPoolExecutor] = None) -> None:
+    def __init__(
+        self,
+        process_event_executor: Optional[ThreadPoolExecutor] = None,
+        admission: Optional[AdmissionController] = None,
+    ) -> None:
         self.__process_event_executor = process_event_executor
-        if self.__process_event_executor is None:
-            self.__process_event = process_event
-        else:
-            self.__process_event = functools.partial(
-                process_event_async, self.__process_event_executor
-            )
+        self.admission = admission
 
     def process_message(self, message) -> Message:
         message = msgpack.unpackb(message.value(), use_list=False)
@@ -76,6 +91,7 @@ class IngestConsumerWorker(AbstractBatchWorker):
 
     def _flush_batch(self, batch: Sequence[Message]):
         attachment_chunks = []
+        events = []
 
         # Processing functions may be either synchronous or asynchronous.
         # Functions that return an ``AsyncResult`` may perform a combination of
@@ -101,7 +117,7 @@ class IngestConsumerWorker(AbstractBatchWorker):
                 projects_to_fetch.add(message["project_id"])
 
                 if message_type == "event":
-                    other_messages.append((self.__process_event, message))
+                    events.append(message)
                 elif message_type == "attachment_chunk":
                     attachment_chunks.append(message)
                 elif message_type == "attachment":
@@ -123,6 +139,12 @@ class IngestConsumerWorker(AbstractBatchWorker):
                 for attachment_chunk in attachment_chunks:
                     process_attachment_chunk(attachment_chunk, projects=projects)
 
+        if events:
+            # Events are processed together, so that deduplication and
+            # storage require a constant number of requests per batch.
+            with metrics.timer("ingest_consumer.process_event_batch"):
+                self._process_events(events, projects)
+
         if other_messages:
             with metrics.timer("ingest_consumer.process_other_messages_batch"):
                 # Keep a mapping of futures to their metadata so that we can
@@ -140,11 +162,67 @@ class IngestConsumerWorker(AbstractBatchWorker):
                 for future in as_completed(results.keys()):
                     results[future].callback(future)
 
+    def _process_events(self, events: Sequence[Message], projects: Mapping[int, Project]) -> None:
+        process_event_batch(
+            events, projects, executor=self.__process_event_executor, admission=self.admission
+        )
+
     def shutdown(self):
         if self.__process_event_executor is not None:
             self.__process_event_executor.shutdown()
 
 
+class StagedIngestConsumerWorker(IngestConsumerWorker):
+    """
+    Processes the events of a batch in a pipeline of stages:
+
+    1. Filtering that doesn't require the payload (deduplication,
+       killswitches) happens on the consumer thread.
+    2. Payloads are deserialized in chunks in the ``decode_executor`` process
+       pool, which isn't limited by the GIL.
+    3. Each decoded chunk is written to the processing store by the
+       ``storage_executor`` thread pool as soon as it is available.
+    4. Stored chunks are dispatched on the consumer thread in the order of
+       the batch, while later chunks are still being decoded and stored.
+
+    The batch is only considered flushed once every chunk has been
+    dispatched, so Kafka offsets are never committed for events that have
+    not been processed yet.
+
+    Decoded payloads are pickled back to the consumer, and unpickling them
+    still costs about half as much as decoding them on the consumer thread.
+    This only pays off when the process pool has CPUs to itself, see
+    ``tests/sentry/ingest/test_benchmark.py``.
+    """
+
+    def __init__(
+        self,
+        decode_executor: ProcessPoolExecutor,
+        storage_executor: ThreadPoolExecutor,
+        chunk_size: int = STAGE_CHUNK_SIZE,
+        admission: Optional[AdmissionController] = None,
+    ) -> None:
+        super().__init__(admission=admission)
+        self.__decode_executor = decode_executor
+        self.__storage_executor = storage_executor
+        self.__chunk_size = chunk_size
+
+    def _process_events(self, events: Sequence[Message], projects: Mapping[int, Project]) -> None:
+        process_event_batch_staged(
+            events,
+            projects,
+            self.__decode_executor,
+            self.__storage_executor,
+            chunk_size=self.__chunk_size,
+            admission=self.admission,
+        )
+
+    def shutdown(self):
+        super().shutdown()
+        self.__decode_executor.shutdown()
+        self.__storage_executor.shutdown()
+
+
 def trace_func(**span_kwargs):
     def wrapper(f):
         @functools.wraps(f)
@@ -169,9 +247,27 @@ def _do_process_event(message: Message, projects: Mapping[int, Project]) -> None
     data, callback = result
     callback(_store_event(data))
 
+    # remember for an 1 hour that we saved this event (deduplication protection)
+    cache.set(_get_deduplication_key(message), "", CACHE_TIMEOUT)
+
+
+def _get_deduplication_key(message: Message) -> str:
+    return f"ev:{int(message['project_id'])}:{message['event_id']}"
+
+
+def _log_duplicate(message: Message) -> None:
+    logger.warning(
+        "pre-process-forwarder detected a duplicated event" " with id:%s for project:%s.",
+        message["event_id"],
+        int(message["project_id"]),
+    )
+
 
 def _load_event(
-    message: Message, projects: Mapping[int, Project]
+    message: Message,
+    projects: Mapping[int, Project],
+    check_duplicate: bool = True,
+    admission: Optional[AdmissionController] = None,
 ) -> Optional[Tuple[Any, Callable[[str], None]]]:
     """
     Perform some initial filtering and deserialize the message payload. If the
@@ -179,12 +275,38 @@ def _load_event(
     function that can be called with the event's storage key to resume
     processing after the event has been persisted and is available to be read by
     other processing components.
+
+    The caller is responsible for marking the event as processed once the
+    callback has completed. Callers that have already checked the
+    deduplication key of the event can skip the check by passing
+    ``check_duplicate=False``.
+
+    If an ``admission`` controller is given, it decides whether the event is
+    shed to reduce load, after all killswitches have been checked.
+    """
+    project = _filter_event(message, projects, check_duplicate=check_duplicate)
+    if project is None:
+        return None
+
+    # Parse the JSON payload. This is required to compute the cache key and
+    # call process_event. The payload will be put into Kafka raw, to avoid
+    # serializing it again.
+    # XXX: Do not use CanonicalKeyDict here. This may break preprocess_event
+    # which assumes that data passed in is a raw dictionary.
+    data = json.loads(message["payload"])
+
+    return _prepare_event(message, project, data, admission=admission)
+
+
+def _filter_event(
+    message: Message, projects: Mapping[int, Project], check_duplicate: bool = True
+) -> Optional[Project]:
+    """
+    Perform the filtering that does not require the deserialized payload.
+    Returns the project of the event if it should be processed further.
     """
-    payload = message["payload"]
-    start_time = float(message["start_time"])
     event_id = message["event_id"]
     project_id = int(message["project_id"])
-    remote_addr = message.get("remote_addr")
     attachments = message.get("attachments") or ()
 
     sentry_sdk.set_extra("event_id", event_id)
@@ -207,14 +329,9 @@ def _load_event(
     # This code has been ripped from the old python store endpoint. We're
     # keeping it around because it does provide some protection against
     # reprocessing good events if a single consumer is in a restart loop.
-    deduplication_key = f"ev:{project_id}:{event_id}"
-    if cache.get(deduplication_key) is not None:
-        logger.warning(
-            "pre-process-forwarder detected a duplicated event" " with id:%s for project:%s.",
-            event_id,
-            project_id,
-        )
-        return  # message already processed do not reprocess
+    if check_duplicate and cache.get(_get_deduplication_key(message)) is not None:
+        _log_duplicate(message)
+        return None  # message already processed do not reprocess
 
     if killswitch_matches_context(
         "store.load-shed-pipeline-projects",
@@ -226,20 +343,30 @@ def _load_event(
     ):
         # This killswitch is for the worst of scenarios and should probably not
         # cause additional load on our logging infrastructure
-        return
+        return None
 
     try:
         project = projects[project_id]
     except KeyError:
         logger.error("Project for ingested event does not exist: %s", project_id)
-        return
+        return None
 
-    # Parse the JSON payload. This is required to compute the cache key and
-    # call process_event. The payload will be put into Kafka raw, to avoid
-    # serializing it again.
-    # XXX: Do not use CanonicalKeyDict here. This may break preprocess_event
-    # which assumes that data passed in is a raw dictionary.
-    data = json.loads(payload)
+    return project
+
+
+def _prepare_event(
+    message: Message, project: Project, data: Any, admission: Optional[AdmissionController] = None
+) -> Optional[Tuple[Any, Callable[[str], None]]]:
+    """
+    Perform the filtering that requires the deserialized payload, and return
+    the payload along with the function to resume processing with (see
+    ``_load_event``.)
+    """
+    start_time = float(message["start_time"])
+    event_id = message["event_id"]
+    project_id = int(message["project_id"])
+    remote_addr = message.get("remote_addr")
+    attachments = message.get("attachments") or ()
 
     if project_id == settings.SENTRY_PROJECT:
         metrics.incr(
@@ -257,9 +384,15 @@ def _load_event(
             "event_id": event_id,
         },
     ):
-        return
+        return None
+
+    # Only events that no killswitch drops count towards the load.
+    if admission is not None and not admission.admit(message, project, data):
+        return None
 
     def dispatch_task(cache_key: str) -> None:
+        start = time.time()
+
         if attachments:
             with sentry_sdk.start_span(op="ingest_consumer.set_attachment_cache"):
                 attachment_objects = [
@@ -283,12 +416,12 @@ def _load_event(
                 project=project,
             )
 
-        # remember for an 1 hour that we saved this event (deduplication protection)
-        cache.set(deduplication_key, "", CACHE_TIMEOUT)
-
         # emit event_accepted once everything is done
         event_accepted.send_robust(ip=remote_addr, data=data, project=project, sender=process_event)
 
+        if admission is not None:
+            admission.record_dispatch(project, time.time() - start)
+
     return data, dispatch_task
 
 
@@ -296,23 +429,171 @@ def _store_event(data) -> str:
     return event_processing_store.store(data)
 
 
+def _store_events(
+    events: Sequence[Any], executor: Optional[ThreadPoolExecutor] = None
+) -> Sequence[str]:
+    if executor is None or len(events) <= STORE_CHUNK_SIZE:
+        return event_processing_store.store_many(events)
+
+    futures = [
+        executor.submit(event_processing_store.store_many, chunk)
+        for chunk in chunked(events, STORE_CHUNK_SIZE)
+    ]
+    return [key for future in futures for key in future.result()]
+
+
 @trace_func(name="ingest_consumer.process_event")
 def process_event(message: Message, projects: Mapping[int, Project]) -> None:
     return _do_process_event(message, projects)
 
 
-def process_event_async(
-    executor: ThreadPoolExecutor, message: Message, projects: Mapping[int, Project]
-) -> Optional["AsyncResult[str]"]:
-    result = _load_event(message, projects)
-    if result is None:
-        return None
+@trace_func(name="ingest_consumer.process_event_batch")
+def process_event_batch(
+    messages: Sequence[Message],
+    projects: Mapping[int, Project],
+    executor: Optional[ThreadPoolExecutor] = None,
+    admission: Optional[AdmissionController] = None,
+) -> None:
+    """
+    Process multiple event messages. This behaves like calling
+    ``process_event`` for every message, but checks the deduplication keys,
+    stores the event payloads and marks the events as processed with a single
+    request each (the payloads are written in chunks of ``STORE_CHUNK_SIZE``
+    events in parallel if an executor is provided.)
+    """
+    metrics.timing("ingest_consumer.process_event_batch.size", len(messages))
+
+    deduplication_keys = [_get_deduplication_key(message) for message in messages]
+    with metrics.timer("ingest_consumer.process_event_batch.deduplicate"):
+        seen = set(cache.get_many(deduplication_keys))
+
+    loaded = []
+    with metrics.timer("ingest_consumer.process_event_batch.load_events"):
+        for message, deduplication_key in zip(messages, deduplication_keys):
+            # Duplicates may also be contained in the batch itself.
+            if deduplication_key in seen:
+                _log_duplicate(message)
+                continue
+            seen.add(deduplication_key)
+
+            result = _load_event(message, projects, check_duplicate=False, admission=admission)
+            if result is not None:
+                loaded.append((deduplication_key, result))
+
+    if not loaded:
+        return
 
-    data, callback = result
-    return AsyncResult(
-        executor.submit(_store_event, data),
-        lambda future: callback(future.result()),
-    )
+    with metrics.timer("ingest_consumer.process_event_batch.store_events"):
+        cache_keys = _store_events([data for _, (data, _) in loaded], executor)
+
+    processed = []
+    try:
+        with metrics.timer("ingest_consumer.process_event_batch.dispatch_tasks"):
+            for (deduplication_key, (_, callback)), cache_key in zip(loaded, cache_keys):
+                callback(cache_key)
+                processed.append(deduplication_key)
+    finally:
+        # remember for an 1 hour that we saved these events (deduplication
+        # protection), also when dispatching a later event of the batch failed
+        _mark_processed(processed)
+
+
+def _mark_processed(deduplication_keys: Sequence[str]) -> None:
+    if deduplication_keys:
+        with metrics.timer("ingest_consumer.process_event_batch.mark_processed"):
+            cache.set_many({key: "" for key in deduplication_keys}, CACHE_TIMEOUT)
+
+
+def _timed_store_events(events: Sequence[Any]) -> Tuple[Sequence[str], float]:
+    start = time.time()
+    return event_processing_store.store_many(events), time.time() - start
+
+
+@trace_func(name="ingest_consumer.process_event_batch_staged")
+def process_event_batch_staged(
+    messages: Sequence[Message],
+    projects: Mapping[int, Project],
+    decode_executor: ProcessPoolExecutor,
+    storage_executor: ThreadPoolExecutor,
+    chunk_size: int = STAGE_CHUNK_SIZE,
+    admission: Optional[AdmissionController] = None,
+) -> None:
+    """
+    Process multiple event messages like ``process_event_batch``, but decode
+    and store the events in chunks using a pipeline of executors. See
+    ``StagedIngestConsumerWorker`` for details.
+    """
+    metrics.timing("ingest_consumer.process_event_batch.size", len(messages))
+
+    # Stage 1: filter the events on the consumer thread.
+    deduplication_keys = [_get_deduplication_key(message) for message in messages]
+    with metrics.timer("ingest_consumer.staged.filter.duration"):
+        seen = set(cache.get_many(deduplication_keys))
+        accepted = []
+        for message, deduplication_key in zip(messages, deduplication_keys):
+            if deduplication_key in seen:
+                _log_duplicate(message)
+                continue
+            seen.add(deduplication_key)
+
+            project = _filter_event(message, projects, check_duplicate=False)
+            if project is not None:
+                accepted.append((deduplication_key, project, message))
+
+    # Stage 2: submit all chunks for decoding at once, the process pool
+    # bounds the parallelism.
+    decoding: Deque[Tuple[Sequence[Tuple[str, Project, Message]], float, "Future[Any]"]] = deque()
+    for chunk in chunked(accepted, chunk_size):
+        future = decode_executor.submit(
+            decode_payloads, [message["payload"] for _, _, message in chunk]
+        )
+        decoding.append((chunk, time.time(), future))
+
+    storing: Deque[Tuple[Sequence[Tuple[str, Any]], float, "Future[Any]"]] = deque()
+    processed: MutableSequence[str] = []
+
+    # Stage 4: dispatch stored chunks in order. Unless ``block`` is set, only
+    # chunks that have been stored already are dispatched.
+    def dispatch(block: bool) -> None:
+        while storing and (block or storing[0][2].done()):
+            loaded, submitted, future = storing.popleft()
+            cache_keys, duration = future.result()
+            metrics.timing("ingest_consumer.staged.store.duration", duration)
+            metrics.timing("ingest_consumer.staged.store.latency", time.time() - submitted)
+
+            with metrics.timer("ingest_consumer.staged.dispatch.duration"):
+                for (deduplication_key, (_, callback)), cache_key in zip(loaded, cache_keys):
+                    callback(cache_key)
+                    processed.append(deduplication_key)
+
+    try:
+        # Stage 3: store decoded chunks in the order of the batch.
+        while decoding:
+            chunk, submitted, future = decoding.popleft()
+            payloads, duration = future.result()
+            metrics.timing("ingest_consumer.staged.decode.duration", duration)
+            metrics.timing("ingest_consumer.staged.decode.latency", time.time() - submitted)
+
+            loaded = []
+            for (deduplication_key, project, message), data in zip(chunk, payloads):
+                result = _prepare_event(message, project, data, admission=admission)
+                if result is not None:
+                    loaded.append((deduplication_key, result))
+
+            if loaded:
+                metrics.timing("ingest_consumer.staged.store.queue_depth", len(storing))
+                future = storage_executor.submit(
+                    _timed_store_events, [data for _, (data, _) in loaded]
+                )
+                storing.append((loaded, time.time(), future))
+
+            dispatch(block=False)
+
+        dispatch(block=True)
+    finally:
+        # remember for an 1 hour that we saved these events (deduplication
+        # protection), also when a later chunk of the batch failed
+        _mark_processed(processed)
 
 
 @trace_func(name="ingest_consumer.process_attachment_chunk")
@@ -403,14 +684,38 @@ def process_userreport(message, projects) -> None:
 
 
 def get_ingest_consumer(
-    consumer_types, once=False, executor: Optional[ThreadPoolExecutor] = None, **options
+    consumer_types,
+    once=False,
+    executor: Optional[ThreadPoolExecutor] = None,
+    staged: bool = False,
+    decode_processes: Optional[int] = None,
+    **options,
 ):
     """
     Handles events coming via a kafka queue.
 
     The events should have already been processed (normalized... ) upstream (by Relay).
+
+    If ``staged`` is set, events are decoded by a pool of ``decode_processes``
+    processes and stored using the ``executor`` (see
+    ``StagedIngestConsumerWorker``.)
     """
     topic_names = {ConsumerType.get_topic_name(consumer_type) for consumer_type in consumer_types}
-    return create_batching_kafka_consumer(
-        topic_names=topic_names, worker=IngestConsumerWorker(executor), **options
-    )
+
+    # Only sheds load if enabled with the ``store.admission-control-enabled``
+    # option.
+    admission = AdmissionController()
+
+    worker: IngestConsumerWorker
+    if staged:
+        # The consumer starts the threads of librdkafka before the process
+        # pool starts its processes, so they must not be forked.
+        worker = StagedIngestConsumerWorker(
+            ProcessPoolExecutor(decode_processes, mp_context=multiprocessing.get_context("spawn")),
+            executor if executor is not None else ThreadPoolExecutor(),
+            admission=admission,
+        )
+    else:
+        worker = IngestConsumerWorker(executor, admission=admission)
+
+    return create_batching_kafka_consumer(topic_names=topic_names, worker=worker, **options)
@@ -9,7 +9,7 @@ features and more performant.
 
 import copy
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from sentry import options
 from sentry.utils import metrics
@@ -103,11 +103,72 @@ def normalize_value(
     return rv
 
 
+class CompiledKillswitch:
+    """
+    A normalized killswitch config, indexed for matching. Conditions are
+    grouped by the fields they test, and the values of each group are kept in
+    a set. Matching a context therefore takes one lookup per distinct set of
+    fields, regardless of the number of conditions.
+    """
+
+    def __init__(self, option_value: KillswitchConfig) -> None:
+        self.conditions: Dict[Tuple[str, ...], Set[Tuple[str, ...]]] = {}
+        for condition in option_value:
+            fields = tuple(sorted(condition))
+            values = tuple(condition[field] for field in fields)
+            self.conditions.setdefault(fields, set()).add(values)  # type: ignore
+
+    def matches(self, context: Context) -> bool:
+        for fields, values in self.conditions.items():
+            key = []
+            for field in fields:
+                value = context.get(field)
+                if value is None:
+                    break
+                key.append(str(value))
+            else:
+                if tuple(key) in values:
+                    return True
+
+        return False
+
+
+# Killswitch name -> (raw option value, compiled killswitch)
+_compiled_killswitches: Dict[str, Tuple[Any, CompiledKillswitch]] = {}
+
+
+def compile_value(
+    killswitch_name: str, raw_option_value: LegacyKillswitchConfig
+) -> CompiledKillswitch:
+    return CompiledKillswitch(normalize_value(killswitch_name, copy.deepcopy(raw_option_value)))
+
+
+def _get_compiled_killswitch(killswitch_name: str) -> CompiledKillswitch:
+    option_value = options.get(killswitch_name)
+
+    cached = _compiled_killswitches.get(killswitch_name)
+    if cached is not None:
+        cached_value, compiled = cached
+        # The options store returns the same object until its local cache
+        # expires, so the comparison of the values is rarely needed.
+        if cached_value is option_value:
+            return compiled
+        if cached_value == option_value:
+            _compiled_killswitches[killswitch_name] = (option_value, compiled)
+            return compiled
+
+    metrics.incr("killswitches.compile", tags={"killswitch_name": killswitch_name})
+    compiled = compile_value(killswitch_name, option_value)
+    # The value is normalized on a copy, so it can be kept for the comparison
+    # above.
+    _compiled_killswitches[killswitch_name] = (option_value, compiled)
+    return compiled
+
+
 def killswitch_matches_context(killswitch_name: str, context: Context) -> bool:
     assert killswitch_name in ALL_KILLSWITCH_OPTIONS
     assert set(ALL_KILLSWITCH_OPTIONS[killswitch_name].fields) == set(context)
-    option_value = options.get(killswitch_name)
-    rv = _value_matches(killswitch_name, option_value, context)
+    rv = _get_compiled_killswitch(killswitch_name).matches(context)
     metrics.incr(
         "killswitches.run",
         tags={"killswitch_name": killswitch_name, "decision": "matched" if rv else "passed"},
@@ -119,23 +180,7 @@ def killswitch_matches_context(killswitch_name: str, context: Context) -> bool:
 def _value_matches(
     killswitch_name: str, raw_option_value: LegacyKillswitchConfig, context: Context
 ) -> bool:
-    option_value = normalize_value(killswitch_name, raw_option_value)
-
-    for condition in option_value:
-        for field, matching_value in condition.items():
-            if matching_value is None:
-                continue
-
-            value = context.get(field)
-            if value is None:
-                break
-
-            if str(value) != matching_value:
-                break
-        else:
-            return True
-
-    return False
+    return compile_value(killswitch_name, raw_option_value).matches(context)
 
 
 def print_conditions(killswitch_name: str, raw_option_value: LegacyKillswitchConfig) -> str:
@@ -256,7 +256,7 @@ def process_minidump(data):
 
     symbolicator = Symbolicator(project=project, event_id=data["event_id"])
 
-    response = symbolicator.process_minidump(minidump.data)
+    response = symbolicator.process_minidump(minidump)
 
     if _handle_response_status(data, response):
         _merge_full_response(data, response)
@@ -274,7 +274,7 @@ def process_applecrashreport(data):
 
     symbolicator = Symbolicator(project=project, event_id=data["event_id"])
 
-    response = symbolicator.process_applecrashreport(report.data)
+    response = symbolicator.process_applecrashreport(report)
 
     if _handle_response_status(data, response):
         _merge_full_response(data, response)
@@ -3,6 +3,7 @@ import logging
 import random
 import sys
 import time
+import uuid
 from urllib.parse import urljoin
 
 import jsonschema
@@ -16,6 +17,7 @@ from sentry.auth.system import get_system_token
 from sentry.cache import default_cache
 from sentry.models import Organization
 from sentry.net.http import Session
+from sentry.tasks.base import track_memory_usage
 from sentry.tasks.store import RetrySymbolication
 from sentry.utils import json, metrics
 
@@ -556,19 +558,24 @@ class SymbolicatorSession:
 
         return self._create_task("symbolicate", json=json)
 
-    def upload_minidump(self, minidump):
-        return self._create_task(
-            path="minidump",
-            data={"sources": json.dumps(self.sources), "options": json.dumps(self.options)},
-            files={"upload_file_minidump": minidump},
+    def _upload_attachment(self, path, name, attachment):
+        body = MultipartBody(
+            fields={"sources": json.dumps(self.sources), "options": json.dumps(self.options)},
+            files={name: attachment},
         )
 
+        with track_memory_usage(
+            "attachments.memory_change", tags={"type": attachment.type, "operation": path}
+        ):
+            return self._create_task(
+                path=path, data=body, headers={"Content-Type": body.content_type}
+            )
+
+    def upload_minidump(self, minidump):
+        return self._upload_attachment("minidump", "upload_file_minidump", minidump)
+
     def upload_applecrashreport(self, report):
-        return self._create_task(
-            path="applecrashreport",
-            data={"sources": json.dumps(self.sources), "options": json.dumps(self.options)},
-            files={"apple_crash_report": report},
-        )
+        return self._upload_attachment("applecrashreport", "apple_crash_report", report)
 
     def query_task(self, task_id):
         task_url = f"requests/{task_id}"
@@ -585,6 +592,44 @@ class SymbolicatorSession:
         return self._request("get", "healthcheck")
 
 
+class MultipartBody:
+    """
+    A ``multipart/form-data`` request body that streams the data of cached
+    attachments, instead of loading them into memory. Requests send it with
+    chunked transfer encoding.
+
+    The body can be iterated multiple times, so requests can be retried.
+    """
+
+    def __init__(self, fields, files):
+        self.boundary = uuid.uuid4().hex
+        self.fields = fields
+        self.files = files
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _part_header(self, name, filename=None):
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        return f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode()
+
+    def __iter__(self):
+        for name, value in self.fields.items():
+            yield self._part_header(name)
+            yield value.encode("utf-8")
+            yield b"\r\n"
+
+        for name, attachment in self.files.items():
+            yield self._part_header(name, filename=name)
+            yield from attachment.iter_chunks()
+            yield b"\r\n"
+
+        yield f"--{self.boundary}--\r\n".encode()
+
+
 def reverse_aliases_map(builtin_sources):
     """Returns a map of source IDs to their original un-aliased source ID.
 
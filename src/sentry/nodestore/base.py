@@ -1,9 +1,13 @@
-from threading import local
+import time
+from collections import OrderedDict
+from threading import Lock, local
+from weakref import WeakKeyDictionary
 
 import sentry_sdk
 from django.core.cache import InvalidCacheBackendError, caches
 
-from sentry.utils import json
+from sentry import options
+from sentry.utils import json, metrics
 from sentry.utils.cache import memoize
 from sentry.utils.services import Service
 
@@ -23,6 +27,132 @@ json_dumps = json.JSONEncoder(
 json_loads = json._default_decoder.decode
 
 
+def _copy_node(value):
+    """
+    Copies the containers of a decoded JSON payload, so that the copy can be
+    mutated without affecting the original.
+    """
+    if isinstance(value, dict):
+        return {k: _copy_node(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_node(v) for v in value]
+    return value
+
+
+def _copy_node_with_size(value):
+    """
+    Like ``_copy_node``, but also returns an estimate of the size of the
+    payload encoded as JSON, for payloads whose encoded size is not known.
+    """
+    if isinstance(value, dict):
+        copy = {}
+        size = 1 + len(value)
+        for k, v in value.items():
+            copy[k], item_size = _copy_node_with_size(v)
+            size += len(k) + 3 + item_size
+        return copy, size
+    if isinstance(value, list):
+        copy = []
+        size = 1 + len(value)
+        for v in value:
+            item, item_size = _copy_node_with_size(v)
+            copy.append(item)
+            size += item_size
+        return copy, size
+    if isinstance(value, str):
+        return value, len(value) + 2
+    return value, 5
+
+
+class NodeCache:
+    """
+    A per-process LRU cache of decoded node payloads, bounded by the total
+    size of the payloads in bytes (as stored in nodestore, not in memory.)
+    Payloads promoted from the shared cache are sized by an estimate.
+
+    Payloads are copied on the way in and out, as callers are free to mutate
+    the data they get from nodestore.
+
+    Deletes and writes only invalidate the cache of the process they happen
+    in, so payloads expire ``ttl`` seconds after they were stored, which
+    bounds how long other processes can serve stale data.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def get_many(self, id_list):
+        rv = {}
+        now = time.monotonic()
+        with self.lock:
+            for id in id_list:
+                item = self.items.get(id)
+                if item is None:
+                    continue
+                if item[2] <= now:
+                    del self.items[id]
+                    self.size -= item[1]
+                    continue
+                self.items.move_to_end(id)
+                rv[id] = item[0]
+
+        if rv:
+            metrics.incr("nodestore.lru.hit", amount=len(rv))
+        if len(rv) < len(id_list):
+            metrics.incr("nodestore.lru.miss", amount=len(id_list) - len(rv))
+        return {id: _copy_node(value) for id, value in rv.items()}
+
+    def set_many(self, items):
+        """
+        Store payloads, passed as ``{id: (value, size)}``. If the size is
+        ``None``, it is estimated while copying the payload.
+        """
+        copies = []
+        for id, (value, size) in items.items():
+            if not value or (size is not None and size > self.max_size):
+                continue
+            if size is None:
+                value, size = _copy_node_with_size(value)
+                if size > self.max_size:
+                    continue
+            else:
+                value = _copy_node(value)
+            copies.append((id, value, size))
+
+        evicted = 0
+        expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            for id, value, size in copies:
+                previous = self.items.pop(id, None)
+                if previous is not None:
+                    self.size -= previous[1]
+                self.items[id] = (value, size, expires_at)
+                self.size += size
+
+            while self.size > self.max_size:
+                _, (_, size, _) = self.items.popitem(last=False)
+                self.size -= size
+                evicted += 1
+
+        if evicted:
+            metrics.incr("nodestore.lru.evicted", amount=evicted)
+
+    def delete_many(self, id_list):
+        with self.lock:
+            for id in id_list:
+                previous = self.items.pop(id, None)
+                if previous is not None:
+                    self.size -= previous[1]
+
+
+# ``NodeStorage`` is thread local, the LRU caches are shared by all threads.
+_node_caches = WeakKeyDictionary()
+
+
 class NodeStorage(local, Service):
     """
     Nodestore is a key-value store that is used to store event payloads. It comes in two flavors:
@@ -64,7 +194,9 @@ class NodeStorage(local, Service):
         "get",
         "get_multi",
         "set",
+        "set_multi",
         "set_subkeys",
+        "set_subkeys_multi",
         "cleanup",
         "validate",
         "bootstrap",
@@ -137,7 +269,7 @@ class NodeStorage(local, Service):
             rv = self._decode(bytes_data, subkey=subkey)
             if subkey is None:
                 # set cache item only after we know decoding did not fail
-                self._set_cache_item(id, rv)
+                self._set_cache_item(id, rv, size=len(bytes_data) if bytes_data else None)
 
             span.set_tag("result", "from_service")
             if bytes_data:
@@ -174,16 +306,21 @@ class NodeStorage(local, Service):
                     span.set_tag("result", "from_cache")
                     return cache_items
 
-                uncached_ids = [id for id in id_list if id not in cache_items]
+                uncached_ids = list(
+                    OrderedDict.fromkeys(id for id in id_list if id not in cache_items)
+                )
             else:
                 uncached_ids = id_list
 
-            items = {
-                id: self._decode(value, subkey=subkey)
-                for id, value in self._get_bytes_multi(uncached_ids).items()
-            }
+            span.set_tag("num_uncached_ids", len(uncached_ids))
+
+            bytes_items = self._get_bytes_multi(uncached_ids) if uncached_ids else {}
+            items = {id: self._decode(value, subkey=subkey) for id, value in bytes_items.items()}
             if subkey is None:
-                self._set_cache_items(items)
+                self._set_cache_items(
+                    items,
+                    sizes={id: len(value) for id, value in bytes_items.items() if value},
+                )
                 items.update(cache_items)
 
             span.set_tag("result", "from_service")
@@ -241,7 +378,51 @@ class NodeStorage(local, Service):
             bytes_data = self._encode(data)
             self._set_bytes(id, bytes_data, ttl=ttl)
             # set cache only after encoding and write to nodestore has succeeded
-            self._set_cache_item(id, cache_item)
+            self._set_cache_item(id, cache_item, size=len(bytes_data))
+
+    def _set_bytes_multi(self, items, ttl=None):
+        """
+        >>> nodestore._set_bytes_multi({
+        ...    'key1': b"{'foo': 'bar'}",
+        ...    'key2': b"{'foo': 'baz'}",
+        ... })
+        """
+        for id, data in items.items():
+            self._set_bytes(id, data, ttl=ttl)
+
+    def set_multi(self, items, ttl=None):
+        """
+        Set values for multiple ids. Like ``set``, this deletes existing
+        subkeys.
+
+        Note: This is not guaranteed to be atomic and may result in a partial
+        write.
+
+        >>> nodestore.set_multi({'key1': {'foo': 'bar'}, 'key2': {'foo': 'baz'}})
+        """
+        return self.set_subkeys_multi({id: {None: data} for id, data in items.items()}, ttl=ttl)
+
+    def set_subkeys_multi(self, items, ttl=None):
+        """
+        Set values and their subkeys for multiple ids, in a single write where
+        the backend supports it.
+
+        >>> nodestore.set_subkeys_multi({
+        ...    'key1': {None: {'foo': 'bar'}, "reprocessing": {'foo': 'bam'}},
+        ...    'key2': {None: {'foo': 'baz'}},
+        ... })
+        """
+        with sentry_sdk.start_span(op="nodestore.set_subkeys_multi") as span:
+            span.set_tag("num_ids", len(items))
+
+            cache_items = {id: data.get(None) for id, data in items.items()}
+            bytes_items = {id: self._encode(data) for id, data in items.items()}
+            self._set_bytes_multi(bytes_items, ttl=ttl)
+            # set cache only after encoding and write to nodestore has succeeded
+            self._set_cache_items(
+                {id: data for id, data in cache_items.items() if data},
+                sizes={id: len(data) for id, data in bytes_items.items()},
+            )
 
     def cleanup(self, cutoff_timestamp):
         raise NotImplementedError
@@ -250,30 +431,66 @@ class NodeStorage(local, Service):
         raise NotImplementedError
 
     def _get_cache_item(self, id):
-        if self.cache:
-            return self.cache.get(id)
+        return self._get_cache_items([id]).get(id)
 
     def _get_cache_items(self, id_list):
-        if self.cache:
-            return self.cache.get_many(id_list)
-        return {}
-
-    def _set_cache_item(self, id, data):
-        if self.cache and data:
-            self.cache.set(id, data)
+        lru_cache = self.lru_cache
+        if lru_cache is None:
+            if self.cache:
+                return self.cache.get_many(id_list)
+            return {}
+
+        items = lru_cache.get_many(id_list)
+        if self.cache and len(items) < len(id_list):
+            cache_items = self.cache.get_many([id for id in id_list if id not in items])
+            # Payloads found in the shared cache are promoted to the local
+            # cache. Their encoded size is not known, so it is estimated.
+            lru_cache.set_many({id: (value, None) for id, value in cache_items.items()})
+            items.update(cache_items)
+        return items
+
+    def _set_cache_item(self, id, data, size=None):
+        if data:
+            self._set_cache_items({id: data}, sizes={id: size} if size is not None else None)
+
+    def _set_cache_items(self, items, sizes=None):
+        lru_cache = self.lru_cache
+        if lru_cache is not None:
+            sizes = sizes or {}
+            lru_cache.set_many({id: (value, sizes.get(id)) for id, value in items.items()})
 
-    def _set_cache_items(self, items):
         if self.cache:
             self.cache.set_many(items)
 
     def _delete_cache_item(self, id):
-        if self.cache:
-            self.cache.delete(id)
+        self._delete_cache_items([id])
 
     def _delete_cache_items(self, id_list):
+        lru_cache = self.lru_cache
+        if lru_cache is not None:
+            lru_cache.delete_many(id_list)
+
         if self.cache:
             self.cache.delete_many([id for id in id_list])
 
+    @property
+    def lru_cache(self):
+        """
+        The per-process ``NodeCache`` of this nodestore, or ``None`` when
+        disabled through the ``nodedata.lru-cache-size`` option.
+        """
+        max_size = options.get("nodedata.lru-cache-size")
+        if not max_size:
+            return None
+
+        ttl = options.get("nodedata.lru-cache-ttl")
+        lru_cache = _node_caches.get(self)
+        if lru_cache is None:
+            lru_cache = _node_caches.setdefault(self, NodeCache(max_size, ttl))
+        lru_cache.max_size = max_size
+        lru_cache.ttl = ttl
+        return lru_cache
+
     @memoize
     def cache(self):
         try:
@@ -3,6 +3,7 @@ import os
 import sentry_sdk
 
 from sentry.nodestore.base import NodeStorage
+from sentry.nodestore.compression import get_dictionary_codec
 from sentry.utils.kvstore.bigtable import BigtableKVStorage
 
 
@@ -17,7 +18,11 @@ class BigtableNodeStorage(NodeStorage):
     :param default_ttl: How many days keys should be stored (and considered
         valid for reading + returning)
     :param compression: A boolean whether to enable zlib-compression, or the
-        string "zstd" to use zstd.
+        string "zstd" to use zstd, or "zstd-dict" to use zstd with trained
+        dictionaries.
+    :param compression_dictionaries: A mapping of event platform (or
+        "default") to the path of a trained dictionary. These are also needed
+        to read nodes written with "zstd-dict" compression.
 
     >>> BigtableNodeStorage(
     ...     project='some-project',
@@ -38,6 +43,7 @@ class BigtableNodeStorage(NodeStorage):
         automatic_expiry=False,
         default_ttl=None,
         compression=False,
+        compression_dictionaries=None,
         **client_options,
     ):
         if compression is True:
@@ -52,6 +58,7 @@ class BigtableNodeStorage(NodeStorage):
             default_ttl=default_ttl,
             compression=compression,
             client_options=client_options,
+            dictionary_codec=get_dictionary_codec(compression_dictionaries),
         )
         self.automatic_expiry = automatic_expiry
         self.skip_deletes = automatic_expiry and "_SENTRY_CLEANUP" in os.environ
@@ -67,6 +74,9 @@ class BigtableNodeStorage(NodeStorage):
     def _set_bytes(self, id, data, ttl=None):
         self.store.set(id, data, ttl)
 
+    def _set_bytes_multi(self, items, ttl=None):
+        self.store.set_many(list(items.items()), ttl)
+
     def delete(self, id):
         if self.skip_deletes:
             return
@@ -1,11 +1,15 @@
+import base64
 import logging
 import math
 import pickle
 
+from django.db import connections, router
 from django.utils import timezone
 
 from sentry.db.models import create_or_update
 from sentry.nodestore.base import NodeStorage
+from sentry.nodestore.compression import get_dictionary_codec
+from sentry.utils.iterators import chunked
 from sentry.utils.strings import compress, decompress
 
 from .models import Node
@@ -14,6 +18,43 @@ logger = logging.getLogger("sentry")
 
 
 class DjangoNodeStorage(NodeStorage):
+    """
+    A Django-based backend for storing node data.
+
+    :param compression: ``None`` to compress with zlib, or ``"zstd-dict"``
+        to compress with trained zstd dictionaries.
+    :param compression_dictionaries: A mapping of event platform (or
+        ``"default"``) to the path of a trained dictionary. These are also
+        needed to read nodes written with "zstd-dict" compression.
+    """
+
+    # Nodes compressed with dictionaries are stored with this prefix, which is
+    # not part of the base64 alphabet used by ``compress``.
+    zstd_dict_prefix = "zd:"
+
+    # The maximum number of rows written by a single statement.
+    bulk_insert_size = 100
+
+    def __init__(self, compression=None, compression_dictionaries=None):
+        if compression not in (None, "zstd-dict"):
+            raise ValueError('"compression" must be None or "zstd-dict"')
+
+        self.compression = compression
+        self.dictionary_codec = get_dictionary_codec(compression_dictionaries)
+
+    def _compress(self, data):
+        if self.compression == "zstd-dict":
+            encoded = base64.b64encode(self.dictionary_codec.encode(data)).decode("utf-8")
+            return self.zstd_dict_prefix + encoded
+        return compress(data)
+
+    def _decompress(self, data):
+        if isinstance(data, str) and data.startswith(self.zstd_dict_prefix):
+            return self.dictionary_codec.decode(
+                base64.b64decode(data[len(self.zstd_dict_prefix) :])
+            )
+        return decompress(data)
+
     def delete(self, id):
         Node.objects.filter(id=id).delete()
         self._delete_cache_item(id)
@@ -37,19 +78,53 @@ class DjangoNodeStorage(NodeStorage):
     def _get_bytes(self, id):
         try:
             data = Node.objects.get(id=id).data
-            return decompress(data)
+            return self._decompress(data)
         except Node.DoesNotExist:
             return None
 
     def _get_bytes_multi(self, id_list):
-        return {n.id: decompress(n.data) for n in Node.objects.filter(id__in=id_list)}
+        return {n.id: self._decompress(n.data) for n in Node.objects.filter(id__in=id_list)}
 
     def delete_multi(self, id_list):
         Node.objects.filter(id__in=id_list).delete()
         self._delete_cache_items(id_list)
 
     def _set_bytes(self, id, data, ttl=None):
-        create_or_update(Node, id=id, values={"data": compress(data), "timestamp": timezone.now()})
+        create_or_update(
+            Node, id=id, values={"data": self._compress(data), "timestamp": timezone.now()}
+        )
+
+    def _set_bytes_multi(self, items, ttl=None):
+        if len(items) == 1:
+            for id, data in items.items():
+                self._set_bytes(id, data, ttl=ttl)
+            return
+
+        using = router.db_for_write(Node)
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+
+        sql = (
+            "INSERT INTO {table} ({id}, {data}, {timestamp}) VALUES {{values}} "
+            "ON CONFLICT ({id}) DO UPDATE "
+            "SET {data} = EXCLUDED.{data}, {timestamp} = EXCLUDED.{timestamp}"
+        ).format(
+            table=quote_name(Node._meta.db_table),
+            id=quote_name(Node._meta.get_field("id").column),
+            data=quote_name(Node._meta.get_field("data").column),
+            timestamp=quote_name(Node._meta.get_field("timestamp").column),
+        )
+
+        timestamp = timezone.now()
+        # Rows are written in a stable order to avoid deadlocks between
+        # concurrent writers.
+        rows = [(id, self._compress(data), timestamp) for id, data in sorted(items.items())]
+        with connection.cursor() as cursor:
+            for chunk in chunked(rows, self.bulk_insert_size):
+                cursor.execute(
+                    sql.format(values=", ".join(["(%s, %s, %s)"] * len(chunk))),
+                    [value for row in chunk for value in row],
+                )
 
     def cleanup(self, cutoff_timestamp):
         from sentry.db.deletion import BulkDeleteQuery
@@ -270,6 +270,11 @@ register("outcomes.tsdb-in-consumer-sample-rate", default=0.0)  # unused
 # Node data save rate
 register("nodedata.cache-sample-rate", default=0.0, flags=FLAG_PRIORITIZE_DISK)
 register("nodedata.cache-on-save", default=False, flags=FLAG_PRIORITIZE_DISK)
+# Size in bytes of the per-process LRU cache of node payloads (0 disables it)
+register("nodedata.lru-cache-size", default=0, flags=FLAG_PRIORITIZE_DISK)
+# Seconds after which payloads in the per-process LRU cache expire, as other
+# processes don't invalidate them
+register("nodedata.lru-cache-ttl", default=60, flags=FLAG_PRIORITIZE_DISK)
 
 # Use nodestore for eventstore.get_events
 register("eventstore.use-nodestore", default=False, flags=FLAG_PRIORITIZE_DISK)
@@ -328,6 +333,9 @@ register("store.background-grouping-sample-rate", default=0.0)
 # True if background grouping should run before secondary and primary grouping
 register("store.background-grouping-before", default=False)
 
+# Reuse the hashes of events with identical grouping inputs within a worker
+register("store.grouping-hash-cache-enabled", default=True)
+
 # Killswitch for dropping events in ingest consumer (after parsing them)
 register("store.load-shed-parsed-pipeline-projects", type=Any, default=[])
 
@@ -337,6 +345,19 @@ register("store.load-shed-process-event-projects", type=Any, default=[])
 # Killswitch for dropping events in symbolicate_event
 register("store.load-shed-symbolicate-event-projects", type=Any, default=[])
 
+# Automatic load shedding in ingest consumer (see sentry.ingest.admission)
+register("store.admission-control-enabled", default=False)
+# Processing queues whose total size is watched for load shedding
+register(
+    "store.admission-control-queues",
+    type=Sequence,
+    default=["events.process_event", "events.save_event"],
+)
+# Total size of the watched queues at which events start to be shed
+register("store.admission-control-queue-threshold", default=50000)
+# Lag of ingest consumer in seconds at which events start to be shed
+register("store.admission-control-lag-threshold", default=300.0)
+
 # Store release files bundled as zip files
 register("processing.save-release-archives", default=False)
 
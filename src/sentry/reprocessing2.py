@@ -90,6 +90,7 @@ from sentry.eventstore.models import Event
 from sentry.eventstore.processing import event_processing_store
 from sentry.utils import json, snuba
 from sentry.utils.cache import cache_key_for_event
+from sentry.utils.iterators import chunked
 from sentry.utils.redis import redis_clusters
 from sentry.utils.safe import get_path, set_path
 
@@ -97,6 +98,9 @@ logger = logging.getLogger("sentry.reprocessing")
 
 _REDIS_SYNC_TTL = 3600 * 24
 
+# Number of attachment chunks copied into the attachment cache at once.
+_ATTACHMENT_CHUNK_BATCH_SIZE = 16
+
 
 # Note: Event attachments and group reports are migrated in save_event.
 GROUP_MODELS_TO_MIGRATE = DIRECT_GROUP_RELATED_MODELS + (models.Activity,)
@@ -252,21 +256,21 @@ def _copy_attachment_into_cache(attachment_id, attachment, file, cache_key, cach
     fp = file.getfile()
     chunk_index = 0
     size = 0
-    while True:
-        chunk = fp.read(settings.SENTRY_REPROCESSING_ATTACHMENT_CHUNK_SIZE)
-        if not chunk:
-            break
 
-        size += len(chunk)
+    chunks = iter(lambda: fp.read(settings.SENTRY_REPROCESSING_ATTACHMENT_CHUNK_SIZE), b"")
+
+    # Write chunks in batches to limit both the number of requests to the
+    # cache and the amount of data held in memory.
+    for batch in chunked(enumerate(chunks), _ATTACHMENT_CHUNK_BATCH_SIZE):
+        size += sum(len(chunk) for _, chunk in batch)
 
-        attachment_cache.set_chunk(
+        attachment_cache.set_chunks(
             key=cache_key,
             id=attachment_id,
-            chunk_index=chunk_index,
-            chunk_data=chunk,
+            chunks=batch,
             timeout=cache_timeout,
         )
-        chunk_index += 1
+        chunk_index += len(batch)
 
     assert size == file.size
 
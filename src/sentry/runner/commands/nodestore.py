@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+import click
+
+from sentry.runner.decorators import configuration
+
+
+@click.group()
+def nodestore():
+    "Tools for interacting with nodestore."
+
+
+@nodestore.command("train-dictionary")
+@click.argument("outfile", type=click.File("wb"), required=True)
+@click.option(
+    "--project", "project_ids", type=int, multiple=True, required=True, help="Project to sample."
+)
+@click.option("--platform", default=None, help="Only sample events of this platform.")
+@click.option("--days", default=7, show_default=True, help="Sample events of the last N days.")
+@click.option("--samples", default=1000, show_default=True, help="Number of events to sample.")
+@click.option(
+    "--size", default=112640, show_default=True, help="Maximum size of the dictionary in bytes."
+)
+@configuration
+def train_dictionary(outfile, project_ids, platform, days, samples, size):
+    """
+    Train a zstd compression dictionary from sampled events.
+
+        sentry nodestore train-dictionary --project 1 --platform python ./python.dict
+
+    The dictionary is used for nodes written with "zstd-dict" compression
+    when it is configured in the nodestore options:
+
+        SENTRY_NODESTORE_OPTIONS = {
+            "compression": "zstd-dict",
+            "compression_dictionaries": {"python": "/etc/sentry/python.dict"},
+        }
+
+    Dictionaries need to remain configured for as long as nodes compressed
+    with them exist.
+    """
+    from django.utils import timezone
+
+    from sentry import eventstore
+    from sentry.nodestore.base import json_dumps
+    from sentry.nodestore.compression import train_dictionary
+
+    end = timezone.now()
+    conditions = [["platform", "=", platform]] if platform else []
+    events = eventstore.get_events(
+        filter=eventstore.Filter(
+            conditions=conditions,
+            project_ids=list(project_ids),
+            start=end - timedelta(days=days),
+            end=end,
+        ),
+        limit=samples,
+        referrer="runner.nodestore.train-dictionary",
+    )
+    eventstore.bind_nodes(events, "data")
+
+    payloads = [json_dumps(dict(event.data)).encode("utf8") for event in events if event.data]
+    if not payloads:
+        click.echo("No events found!", err=True)
+        raise click.Abort()
+
+    click.echo(f"Training dictionary from {len(payloads)} events...", err=True)
+    try:
+        dictionary = train_dictionary(payloads, size)
+    except Exception as e:
+        click.echo(f"Training failed, try sampling more events: {e}", err=True)
+        raise click.Abort()
+
+    outfile.write(dictionary)
+    click.echo(f"Wrote {len(dictionary)} bytes.", err=True)
@@ -319,6 +319,29 @@ def cron(**options):
     type=click.Choice(["earliest", "latest"]),
     help="Position in the commit log topic to begin reading from when no prior offset has been recorded.",
 )
+@click.option(
+    "--parallel",
+    is_flag=True,
+    default=False,
+    help="Process the messages of each assigned partition in a separate thread.",
+)
+@click.option(
+    "--dispatch-batch-size",
+    default=100,
+    type=int,
+    help="How many messages of a partition to dispatch tasks for at once when processing partitions in parallel.",
+)
+@click.option(
+    "--post-process-workers",
+    default=None,
+    type=int,
+    help="Post-process events with this many threads in the forwarder instead of dispatching tasks. Implies --parallel.",
+)
+@click.option(
+    "--dead-letter-topic",
+    default=None,
+    help="Topic to produce messages to that could not be post-processed with --post-process-workers.",
+)
 @log_options()
 @configuration
 def post_process_forwarder(**options):
@@ -332,6 +355,10 @@ def post_process_forwarder(**options):
             synchronize_commit_group=options["synchronize_commit_group"],
             commit_batch_size=options["commit_batch_size"],
             initial_offset_reset=options["initial_offset_reset"],
+            parallel=options["parallel"],
+            dispatch_batch_size=options["dispatch_batch_size"],
+            post_process_workers=options["post_process_workers"],
+            dead_letter_topic=options["dead_letter_topic"],
         )
     except ForwarderNotRequired:
         sys.stdout.write(
@@ -472,6 +499,18 @@ def batching_kafka_options(group):
     default=None,
     help="Thread pool size (only utilitized for message types that support concurrent processing)",
 )
+@click.option(
+    "--staged",
+    default=False,
+    is_flag=True,
+    help="Decode events in a process pool and store them in the thread pool (see --concurrency) in parallel, while keeping offset commits in order.",
+)
+@click.option(
+    "--decode-processes",
+    type=int,
+    default=None,
+    help="Process pool size for decoding events with --staged. Defaults to the number of CPUs.",
+)
 @configuration
 def ingest_consumer(consumer_types, all_consumer_types, **options):
     """
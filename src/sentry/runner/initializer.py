@@ -208,6 +208,12 @@ def bootstrap_options(settings, config=None):
                 setattr(settings, options_mapper[k], v)
 
 
+def configure_json(settings):
+    from sentry.utils import json
+
+    json.set_backend(settings.SENTRY_JSON_BACKEND)
+
+
 def configure_structlog():
     """
     Make structlog comply with all of our options.
@@ -306,6 +312,8 @@ def initialize_app(config, skip_service_validation=False):
 
     bootstrap_options(settings, config["options"])
 
+    configure_json(settings)
+
     configure_structlog()
 
     # Commonly setups don't correctly configure themselves for production envs
@@ -20,6 +20,7 @@ matrix.
 The public API consists of three main methods:
 
 - INCR: used to record observations of items,
+- INCREX: like INCR, but also sets expiration times on new sketches,
 - ESTIMATE: used to query the number of times a specific item has been seen,
 - RANKED: used to query the top N items that have been recorded in a sketch.
 
@@ -49,6 +50,11 @@ sketches with depth 5, width 64 and index capacity of 50:
 
     EVALSHA $SHA 4 1:i 1:e 2:i 2:e INCR 5 64 50 1 foo 2 bar
 
+To do the same, setting the first sketch to expire at 100 and the second
+sketch to expire at 200 if they don't have an expiration time yet:
+
+    EVALSHA $SHA 4 1:i 1:e 2:i 2:e INCREX 5 64 50 100 200 1 foo 2 bar
+
 To query the top 10 items from the first sketch:
 
     EVALSHA $SHA 2 1:i 1:e RANKED 5 64 50 10
@@ -497,6 +503,37 @@ return Router:new({
         end
     ),
 
+    --[[
+    Increment the number of observations for each item in all sketches, and
+    set the expiration time of every sketch key that does not have one yet.
+    The items are preceded by one expiration time for each sketch.
+    ]]--
+    INCREX = Command:new(
+        function (sketches, arguments)
+            local items = {}
+            for i = #sketches + 1, #arguments, 2 do
+                local delta = tonumber(arguments[i])
+                assert(delta > 0, 'The increment value must be positive and nonzero.')
+
+                local value = arguments[i + 1]
+                table.insert(items, {value, delta})
+            end
+
+            local results = {}
+            for i, sketch in ipairs(sketches) do
+                results[i] = sketch:increment(items)
+                -- The estimation matrix is only created once the index is
+                -- full, so this has to be checked on every increment.
+                for _, key in ipairs({sketch.index, sketch.estimates}) do
+                    if redis.call('TTL', key) == -1 then
+                        redis.call('EXPIREAT', key, arguments[i])
+                    end
+                end
+            end
+            return results
+        end
+    ),
+
     --[[
     Estimate the number of observations for each item in all sketches,
     returning a sequence containing scores for items in the order that they
@@ -0,0 +1,35 @@
+-- Apply a batch of counter increments to TSDB counter hashes. Values provided
+-- as ``KEYS`` are the hash keys of the counter buckets, values provided as
+-- ``ARGV`` describe the operations for each key, in the same order as the
+-- keys: the expiration time (as a Unix timestamp), the number of fields to
+-- increment, followed by a field name and increment for each field.
+--
+-- For example, to increment field ``1`` by 2 and field ``2`` by 1 in the
+-- bucket ``foo`` expiring at ``100``, and field ``1`` by 1 in the bucket
+-- ``bar`` expiring at ``200``, the ``KEYS`` and ``ARGV`` values would be as
+-- follows:
+--
+--   KEYS = {"foo", "bar"}
+--   ARGV = {100, 2, 1, 2, 2, 1, 200, 1, 1, 1}
+--
+-- The expiration time is only set if the bucket does not have one yet, which
+-- usually means it has just been created. (All writers compute the same
+-- expiration time for a bucket, so there is no need to update it.)
+
+local offset = 1
+for _, key in ipairs(KEYS) do
+    local expiry = ARGV[offset]
+    local fields = tonumber(ARGV[offset + 1])
+    offset = offset + 2
+
+    for _ = 1, fields do
+        redis.call('HINCRBY', key, ARGV[offset], ARGV[offset + 1])
+        offset = offset + 2
+    end
+
+    if redis.call('TTL', key) == -1 then
+        redis.call('EXPIREAT', key, expiry)
+    end
+end
+
+assert(offset == #ARGV + 1, "incorrect number of arguments provided")
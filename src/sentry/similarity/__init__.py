@@ -7,6 +7,7 @@ from sentry.interfaces.stacktrace import Frame
 from sentry.similarity.backends.dummy import DummyIndexBackend
 from sentry.similarity.backends.metrics import MetricsWrapper
 from sentry.similarity.backends.redis import RedisScriptMinHashIndexBackend
+from sentry.similarity.backends.sqlite import SQLiteMinHashIndexBackend
 from sentry.similarity.encoder import Encoder
 from sentry.similarity.features import (
     ExceptionFeature,
@@ -60,6 +61,15 @@ def get_frame_attributes(frame):
 
 
 def _make_index_backend(cluster, namespace="sim:1"):
+    path = getattr(settings, "SENTRY_SIMILARITY_INDEX_SQLITE_PATH", None)
+    if path is not None:
+        return MetricsWrapper(
+            SQLiteMinHashIndexBackend(
+                path, namespace, MinHashSignatureBuilder(16, 0xFFFF), 8, 60 * 60 * 24 * 30, 3, 5000
+            ),
+            scope_tag_name=None,
+        )
+
     if isinstance(cluster, str):
         cluster_id = cluster
 
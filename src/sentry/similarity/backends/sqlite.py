@@ -0,0 +1,588 @@
+"""
+Similarity index backend that keeps MinHash band buckets in an embedded SQLite
+database, for installations without a Redis cluster to spare for similarity.
+
+The data model and the search results are the same as those of the
+``RedisScriptMinHashIndexBackend`` (see ``sentry/scripts/similarity/index.lua``):
+
+- bucket frequencies count how often a key has been recorded in every bucket
+  of a band, and are used to compute the similarity of two keys,
+- bucket memberships record which keys have been recorded in a bucket during
+  an interval, and are used to retrieve the candidates of a search.
+
+Data exported by either backend can be imported into the other one.
+
+Queries ignore data past its retention, but it is only removed from the
+database by ``expire``.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import msgpack
+from django.utils.encoding import force_text
+
+from sentry.similarity.backends.abstract import AbstractIndexBackend
+from sentry.utils.iterators import chunked
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frequencies (
+    namespace TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    idx TEXT NOT NULL,
+    key TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (namespace, scope, idx, key, band, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS expirations (
+    namespace TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    idx TEXT NOT NULL,
+    key TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,
+    PRIMARY KEY (namespace, scope, idx, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS expirations_expires_at ON expirations (namespace, expires_at);
+
+CREATE TABLE IF NOT EXISTS memberships (
+    namespace TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    idx TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (namespace, scope, idx, band, bucket, period, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS memberships_key ON memberships (namespace, scope, idx, key);
+
+CREATE INDEX IF NOT EXISTS memberships_period ON memberships (namespace, period);
+"""
+
+SCAN_QUERY = """
+SELECT scope, key FROM expirations
+WHERE namespace = :namespace AND scope GLOB :scope AND idx = :idx {condition}
+UNION
+SELECT scope, key FROM memberships
+WHERE namespace = :namespace AND scope GLOB :scope AND idx = :idx {condition}
+ORDER BY scope, key
+LIMIT :batch
+"""
+
+# Number of keys to get the frequencies of in a single query, below the default
+# maximum number of variables of a statement.
+FREQUENCIES_BATCH_SIZE = 500
+
+
+def scale_to_total(values):
+    total = sum(values.values())
+    return {key: value / total for key, value in values.items()}
+
+
+def get_manhattan_distance(target, other):
+    return sum(abs(target.get(key, 0) - other.get(key, 0)) for key in target.keys() | other.keys())
+
+
+def get_similarity(target, other):
+    """
+    Returns the similarity of the bucket frequencies of two keys, in the same
+    way as the Lua script does.
+    """
+    if not target[0] and not other[0]:
+        return None  # both items don't have the feature (no comparison)
+    elif not target[0] or not other[0]:
+        return 0  # one item doesn't have the feature (totally dissimilar)
+
+    similarities = [
+        # Distances of the scaled frequencies are between 0 and 2.
+        1 - get_manhattan_distance(scale_to_total(a), scale_to_total(b)) / 2
+        for a, b in zip(target, other)
+    ]
+    # The script returns scores formatted with ``%f``.
+    return round(sum(similarities) / len(similarities), 6)
+
+
+def get_ranking_key(key, index_hits):
+    """
+    Returns the key that candidates are ranked by before the limit of a search
+    is applied. Like the Lua script, which uses the length of a table of hits
+    by index, only hits from the first index up to the first index without
+    hits are taken into account.
+    """
+    hits = []
+    while len(hits) in index_hits:
+        hits.append(index_hits[len(hits)])
+
+    if not hits:
+        # The script ranks candidates without any of these hits last.
+        return (1, 0, 0, key)
+
+    return (
+        0,
+        sum(hits) / len(hits) * -1,  # average hits, descending
+        len(hits) * -1,  # number of indexes with hits, descending
+        key,  # lexicographical sort on key, ascending
+    )
+
+
+def get_comparison_key(result):
+    key, scores = result
+
+    scores = [score for score in scores if score is not None]
+
+    return (
+        sum(scores) / len(scores) * -1,  # average score, descending
+        len(scores) * -1,  # number of indexes with scores, descending
+        key,  # lexicographical sort on key, ascending
+    )
+
+
+class SQLiteMinHashIndexBackend(AbstractIndexBackend):
+    """
+    Every thread (and process) uses its own connection to the database at
+    ``path``, which means that an in-memory database (``":memory:"``) is not
+    shared between threads either.
+    """
+
+    def __init__(
+        self,
+        path,
+        namespace,
+        signature_builder,
+        bands,
+        interval,
+        retention,
+        candidate_set_limit,
+        timeout=5.0,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.signature_builder = signature_builder
+        self.bands = bands
+        self.interval = interval
+        self.retention = retention
+        self.candidate_set_limit = candidate_set_limit
+        self.timeout = timeout
+
+        self.__local = threading.local()
+
+    @property
+    def connection(self):
+        # Connections cannot be used across forks.
+        pid = os.getpid()
+        if getattr(self.__local, "pid", None) != pid:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(SCHEMA)
+            self.__local.connection = connection
+            self.__local.pid = pid
+        return self.__local.connection
+
+    def __get_periods(self, timestamp):
+        # Bucket memberships are kept for the current and ``retention``
+        # previous intervals.
+        current = int(timestamp // self.interval)
+        return current - self.retention, current
+
+    def _build_frequencies(self, features):
+        if not features:
+            return [{} for _ in range(self.bands)]
+
+        signature = self.signature_builder(features)
+        assert len(signature) % self.bands == 0
+        return [
+            {",".join(map("{}".format, bucket)): 1}
+            for bucket in chunked(signature, len(signature) // self.bands)
+        ]
+
+    def __get_frequencies(self, scope, idx, keys, timestamp):
+        results = {key: [{} for _ in range(self.bands)] for key in keys}
+        for chunk in chunked(results, FREQUENCIES_BATCH_SIZE):
+            # The unary plus keeps SQLite from scanning the expiration index
+            # rather than looking up the keys.
+            placeholders = ", ".join("?" * len(chunk))
+            for key, band, bucket, count in self.connection.execute(
+                f"""
+                SELECT key, band, bucket, count FROM frequencies
+                JOIN expirations USING (namespace, scope, idx, key)
+                WHERE namespace = ? AND scope = ? AND idx = ? AND key IN ({placeholders})
+                AND +expires_at > ?
+                """,
+                (self.namespace, scope, idx, *chunk, timestamp),
+            ):
+                results[key][band][bucket] = count
+        return results
+
+    def __set_frequencies(self, scope, idx, key, frequencies, expires_at, timestamp):
+        connection = self.connection
+        arguments = (self.namespace, scope, idx, key)
+
+        # Counts past their retention are not added to.
+        connection.execute(
+            """
+            DELETE FROM frequencies
+            WHERE namespace = ? AND scope = ? AND idx = ? AND key = ? AND EXISTS (
+                SELECT 1 FROM expirations
+                WHERE namespace = frequencies.namespace AND scope = frequencies.scope
+                AND idx = frequencies.idx AND key = frequencies.key AND expires_at <= ?
+            )
+            """,
+            arguments + (timestamp,),
+        )
+
+        rows = [
+            arguments + (band, bucket, count)
+            for band, buckets in enumerate(frequencies)
+            for bucket, count in buckets.items()
+        ]
+        if not rows:
+            connection.execute(
+                """
+                UPDATE expirations SET expires_at = ?
+                WHERE namespace = ? AND scope = ? AND idx = ? AND key = ? AND expires_at > ?
+                """,
+                (expires_at,) + arguments + (timestamp,),
+            )
+            return
+
+        connection.executemany(
+            """
+            INSERT INTO frequencies VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (namespace, scope, idx, key, band, bucket)
+            DO UPDATE SET count = count + excluded.count
+            """,
+            rows,
+        )
+        connection.execute(
+            """
+            INSERT INTO expirations VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (namespace, scope, idx, key) DO UPDATE SET expires_at = excluded.expires_at
+            """,
+            arguments + (expires_at,),
+        )
+
+    def __add_memberships(self, scope, idx, key, memberships):
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO memberships VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (self.namespace, scope, idx, band, bucket, period, key)
+                for band, bucket, period in memberships
+            ],
+        )
+
+    def __delete(self, scope, idx, key):
+        arguments = (self.namespace, scope, idx, key)
+        for table in ("frequencies", "expirations", "memberships"):
+            self.connection.execute(
+                f"DELETE FROM {table} WHERE namespace = ? AND scope = ? AND idx = ? AND key = ?",
+                arguments,
+            )
+
+    def __fetch_candidates(self, scope, idx, frequencies, timestamp):
+        """
+        Returns the number of bands in which other keys share a bucket with
+        the frequencies.
+        """
+        lower, upper = self.__get_periods(timestamp)
+
+        candidates = {}
+        for band, buckets in enumerate(frequencies):
+            for bucket in buckets:
+                for (key,) in self.connection.execute(
+                    """
+                    SELECT DISTINCT key FROM memberships
+                    WHERE namespace = ? AND scope = ? AND idx = ? AND band = ? AND bucket = ?
+                    AND period BETWEEN ? AND ?
+                    LIMIT ?
+                    """,
+                    (
+                        self.namespace,
+                        scope,
+                        idx,
+                        band,
+                        bucket,
+                        lower,
+                        upper,
+                        self.candidate_set_limit,
+                    ),
+                ):
+                    candidates.setdefault(key, set()).add(band)
+
+        return {key: len(bands) for key, bands in candidates.items()}
+
+    def __search(self, scope, parameters, limit, timestamp):
+        possible_candidates = {}
+        for i, (idx, threshold, frequencies) in enumerate(parameters):
+            for candidate, hits in self.__fetch_candidates(
+                scope, idx, frequencies, timestamp
+            ).items():
+                if hits >= threshold:
+                    possible_candidates.setdefault(candidate, {})[i] = hits
+
+        candidates = list(possible_candidates)
+        if limit is not None and limit >= 0 and len(candidates) > limit:
+            candidates.sort(key=lambda key: get_ranking_key(key, possible_candidates[key]))
+            candidates = candidates[:limit]
+
+        candidate_frequencies = [
+            self.__get_frequencies(scope, idx, candidates, timestamp) for idx, _, _ in parameters
+        ]
+
+        results = []
+        for key in candidates:
+            scores = [
+                get_similarity(frequencies, candidate_frequencies[i][key])
+                for i, (_, _, frequencies) in enumerate(parameters)
+            ]
+            results.append((key, scores))
+
+        return sorted(results, key=get_comparison_key)
+
+    def classify(self, scope, items, limit=None, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        parameters = [
+            (force_text(idx), threshold, self._build_frequencies(features))
+            for idx, threshold, features in items
+        ]
+        return self.__search(force_text(scope), parameters, limit, timestamp)
+
+    def compare(self, scope, key, items, limit=None, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        scope, key = force_text(scope), force_text(key)
+        parameters = []
+        for idx, threshold in items:
+            idx = force_text(idx)
+            parameters.append(
+                (idx, threshold, self.__get_frequencies(scope, idx, [key], timestamp)[key])
+            )
+        return self.__search(scope, parameters, limit, timestamp)
+
+    def record(self, scope, key, items, timestamp=None):
+        if not items:
+            return  # nothing to do
+
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        scope, key = force_text(scope), force_text(key)
+        _, period = self.__get_periods(timestamp)
+        expires_at = timestamp + self.interval * self.retention
+
+        with self.connection:
+            for idx, features in items:
+                idx = force_text(idx)
+                frequencies = self._build_frequencies(features)
+                self.__set_frequencies(scope, idx, key, frequencies, expires_at, timestamp)
+                self.__add_memberships(
+                    scope,
+                    idx,
+                    key,
+                    [
+                        (band, bucket, period)
+                        for band, buckets in enumerate(frequencies)
+                        for bucket in buckets
+                    ],
+                )
+
+    def merge(self, scope, destination, items, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        scope, destination = force_text(scope), force_text(destination)
+        connection = self.connection
+
+        with connection:
+            for idx, source in items:
+                idx, source = force_text(idx), force_text(source)
+                assert source != destination, "cannot merge destination into itself"
+
+                row = connection.execute(
+                    """
+                    SELECT expires_at FROM expirations
+                    WHERE namespace = ? AND scope = ? AND idx = ? AND key = ? AND expires_at > ?
+                    """,
+                    (self.namespace, scope, idx, source, timestamp),
+                ).fetchone()
+                if row is None:
+                    continue  # nothing to do
+
+                (expires_at,) = row
+                destination_row = connection.execute(
+                    """
+                    SELECT expires_at FROM expirations
+                    WHERE namespace = ? AND scope = ? AND idx = ? AND key = ? AND expires_at > ?
+                    """,
+                    (self.namespace, scope, idx, destination, timestamp),
+                ).fetchone()
+                if destination_row is not None:
+                    expires_at = max(expires_at, destination_row[0])
+
+                self.__set_frequencies(
+                    scope,
+                    idx,
+                    destination,
+                    self.__get_frequencies(scope, idx, [source], timestamp)[source],
+                    expires_at,
+                    timestamp,
+                )
+
+                connection.execute(
+                    """
+                    INSERT OR IGNORE INTO memberships
+                    SELECT namespace, scope, idx, band, bucket, period, ? FROM memberships
+                    WHERE namespace = ? AND scope = ? AND idx = ? AND key = ?
+                    """,
+                    (destination, self.namespace, scope, idx, source),
+                )
+                self.__delete(scope, idx, source)
+
+    def delete(self, scope, items, timestamp=None):
+        scope = force_text(scope)
+        with self.connection:
+            for idx, key in items:
+                self.__delete(scope, force_text(idx), force_text(key))
+
+    def scan(self, scope, indices, batch=1000, timestamp=None):
+        """
+        Yields the indices with chunks of up to ``batch`` ``(scope, key)``
+        pairs that have data in them. ``scope`` is a glob pattern, like the
+        pattern used to scan the keys of the Redis backend.
+        """
+        for idx in indices:
+            arguments = {
+                "namespace": self.namespace,
+                "scope": force_text(scope),
+                "idx": force_text(idx),
+                "batch": batch,
+            }
+
+            condition = ""
+            while True:
+                chunk = self.connection.execute(
+                    SCAN_QUERY.format(condition=condition), arguments
+                ).fetchall()
+
+                yield idx, chunk
+
+                if len(chunk) < batch:
+                    break
+
+                condition = "AND (scope, key) > (:last_scope, :last_key)"
+                arguments["last_scope"], arguments["last_key"] = chunk[-1]
+
+    def flush(self, scope, indices, batch=1000, timestamp=None):
+        for idx, chunk in self.scan(scope, indices, batch, timestamp):
+            if chunk:
+                with self.connection:
+                    for key_scope, key in chunk:
+                        self.__delete(key_scope, force_text(idx), key)
+
+    def expire(self, timestamp=None):
+        """
+        Removes the data of all scopes that is past its retention, to compact
+        the database.
+        """
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        lower, _ = self.__get_periods(timestamp)
+
+        with self.connection as connection:
+            connection.execute(
+                """
+                DELETE FROM frequencies WHERE (namespace, scope, idx, key) IN (
+                    SELECT namespace, scope, idx, key FROM expirations
+                    WHERE namespace = ? AND expires_at <= ?
+                )
+                """,
+                (self.namespace, timestamp),
+            )
+            connection.execute(
+                "DELETE FROM expirations WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, timestamp),
+            )
+            connection.execute(
+                "DELETE FROM memberships WHERE namespace = ? AND period < ?",
+                (self.namespace, lower),
+            )
+
+    def export(self, scope, items, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        scope = force_text(scope)
+        lower, upper = self.__get_periods(timestamp)
+
+        results = []
+        for idx, key in items:
+            idx, key = force_text(idx), force_text(key)
+
+            row = self.connection.execute(
+                """
+                SELECT expires_at FROM expirations
+                WHERE namespace = ? AND scope = ? AND idx = ? AND key = ? AND expires_at > ?
+                """,
+                (self.namespace, scope, idx, key, timestamp),
+            ).fetchone()
+            if row is None:
+                results.append(msgpack.packb([]))
+                continue
+
+            data = [
+                {bucket: [count, []] for bucket, count in buckets.items()}
+                for buckets in self.__get_frequencies(scope, idx, [key], timestamp)[key]
+            ]
+            for band, bucket, period in self.connection.execute(
+                """
+                SELECT band, bucket, period FROM memberships
+                WHERE namespace = ? AND scope = ? AND idx = ? AND key = ?
+                AND period BETWEEN ? AND ?
+                ORDER BY period
+                """,
+                (self.namespace, scope, idx, key, lower, upper),
+            ):
+                value = data[band].get(bucket)
+                if value is not None:
+                    value[1].append(period)
+
+            results.append(msgpack.packb([data, row[0]]))
+
+        return results
+
+    def import_(self, scope, items, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        scope = force_text(scope)
+
+        with self.connection:
+            for idx, key, data in items:
+                idx, key = force_text(idx), force_text(key)
+
+                data = msgpack.unpackb(data, raw=False)
+                if not data:
+                    continue
+
+                data, expires_at = data
+
+                frequencies = [{} for _ in range(self.bands)]
+                memberships = []
+                for band, buckets in enumerate(data):
+                    # Empty tables are packed as arrays by the Lua script.
+                    for bucket, (count, periods) in (buckets or {}).items():
+                        frequencies[band][bucket] = count
+                        memberships.extend((band, bucket, period) for period in periods)
+
+                self.__set_frequencies(scope, idx, key, frequencies, expires_at, timestamp)
+                self.__add_memberships(scope, idx, key, memberships)
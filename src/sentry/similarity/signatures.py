@@ -1,6 +1,15 @@
+import random
+
 import mmh3
 
-from sentry.utils.compat import map
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Mersenne prime used as modulus for universal hashing. Products of two
+# values below it fit into 64 bit integers.
+UNIVERSAL_HASH_PRIME = (1 << 31) - 1
 
 
 class MinHashSignatureBuilder:
@@ -9,9 +18,56 @@ class MinHashSignatureBuilder:
         self.rows = rows
 
     def __call__(self, features):
-        return map(
-            lambda column: min(
-                map(lambda feature: mmh3.hash(feature, column) % self.rows, features)
-            ),
-            range(self.columns),
-        )
+        # Duplicate features do not change the minimum of any column.
+        features = set(features)
+        rows = self.rows
+        hash_ = mmh3.hash
+        return [
+            min([hash_(feature, column) % rows for feature in features])
+            for column in range(self.columns)
+        ]
+
+
+class UniversalMinHashSignatureBuilder:
+    """
+    Builds MinHash signatures of ``columns`` values between 0 and ``rows``,
+    like ``MinHashSignatureBuilder``, but hashes every feature only once.
+    The hash functions of the columns are derived from that hash by
+    universal hashing, ``(a * x + b) mod p``, with coefficients generated from
+    ``seed``.
+
+    The computation of all columns is vectorized if NumPy, an optional
+    dependency (the ``numpy`` extra), is installed. Without it, this is about
+    as fast as ``MinHashSignatureBuilder``. The signatures are the same either
+    way, but they are not compatible with the signatures of
+    ``MinHashSignatureBuilder``: an index cannot switch between both without
+    being rebuilt.
+    """
+
+    def __init__(self, columns, rows, seed=0):
+        assert rows <= UNIVERSAL_HASH_PRIME
+        self.columns = columns
+        self.rows = rows
+
+        rng = random.Random(seed)
+        self.coefficients = [
+            (rng.randrange(1, UNIVERSAL_HASH_PRIME), rng.randrange(0, UNIVERSAL_HASH_PRIME))
+            for _ in range(columns)
+        ]
+
+        if numpy is not None:
+            self.__a = numpy.array([a for a, _ in self.coefficients], dtype=numpy.uint64)
+            self.__b = numpy.array([b for _, b in self.coefficients], dtype=numpy.uint64)
+
+    def __call__(self, features):
+        values = {mmh3.hash(feature, 0, False) % UNIVERSAL_HASH_PRIME for feature in features}
+
+        if numpy is None:
+            return [
+                min([(a * x + b) % UNIVERSAL_HASH_PRIME for x in values]) % self.rows
+                for a, b in self.coefficients
+            ]
+
+        x = numpy.fromiter(values, dtype=numpy.uint64, count=len(values))
+        hashes = (numpy.outer(self.__a, x) + self.__b[:, None]) % UNIVERSAL_HASH_PRIME
+        return (hashes.min(axis=1) % self.rows).tolist()
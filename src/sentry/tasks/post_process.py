@@ -184,24 +184,47 @@ def post_process_group(
     """
     from sentry.eventstore.models import Event
     from sentry.eventstore.processing import event_processing_store
+
+    # We use the data being present/missing in the processing store
+    # to ensure that we don't duplicate work should the forwarding consumers
+    # need to rewind history.
+    data = event_processing_store.get(cache_key)
+    if not data:
+        logger.info(
+            "post_process.skipped",
+            extra={"cache_key": cache_key, "reason": "missing_cache"},
+        )
+        return
+    event = Event(
+        project_id=data["project"], event_id=data["event_id"], group_id=group_id, data=data
+    )
+
+    post_process_event(
+        event,
+        is_new,
+        is_regression,
+        is_new_group_environment,
+        cache_key,
+        primary_hash=kwargs.get("primary_hash"),
+    )
+
+
+def post_process_event(
+    event, is_new, is_regression, is_new_group_environment, cache_key, primary_hash=None
+):
+    """
+    Fires post processing hooks for the group of an event, and removes the
+    event from the processing store under ``cache_key`` afterwards.
+
+    Unlike ``post_process_group``, this does not check if the event is still
+    in the processing store, so the caller has to ensure that events are not
+    processed twice.
+    """
+    from sentry.eventstore.processing import event_processing_store
     from sentry.reprocessing2 import is_reprocessed_event
     from sentry.utils import snuba
 
     with snuba.options_override({"consistent": True}):
-        # We use the data being present/missing in the processing store
-        # to ensure that we don't duplicate work should the forwarding consumers
-        # need to rewind history.
-        data = event_processing_store.get(cache_key)
-        if not data:
-            logger.info(
-                "post_process.skipped",
-                extra={"cache_key": cache_key, "reason": "missing_cache"},
-            )
-            return
-        event = Event(
-            project_id=data["project"], event_id=data["event_id"], group_id=group_id, data=data
-        )
-
         set_current_event_project(event.project_id)
 
         is_transaction_event = not bool(event.group_id)
@@ -362,7 +385,7 @@ def post_process_group(
                 sender=post_process_group,
                 project=event.project,
                 event=event,
-                primary_hash=kwargs.get("primary_hash"),
+                primary_hash=primary_hash,
             )
 
         with metrics.timer("tasks.post_process.delete_event_cache"):
@@ -233,12 +233,12 @@ def build_project_series(start__stop, project):
         status=GroupStatus.RESOLVED, resolved_at__gte=start, resolved_at__lt=stop
     ).values_list("id", flat=True)
 
-    tsdb_range_resolved = _query_tsdb_groups_chunked(tsdb.get_range, issue_ids, start, stop, rollup)
-    resolved_series = reduce(
-        merge_series,
-        map(clean, tsdb_range_resolved.values()),
-        clean([(timestamp, 0) for timestamp in series]),
-    )
+    resolved_series = clean([(timestamp, 0) for timestamp in series])
+    for chunk in chunked(issue_ids, BATCH_SIZE):
+        resolved_series = merge_series(
+            resolved_series,
+            clean(tsdb.get_timeseries_sums(tsdb.models.group, chunk, start, stop, rollup=rollup)),
+        )
 
     total_series = clean(
         tsdb.get_range(tsdb.models.project, [project.id], start, stop, rollup=rollup)[project.id]
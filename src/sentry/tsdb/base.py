@@ -1,4 +1,5 @@
 import collections
+from array import array
 from collections import OrderedDict
 from datetime import timedelta
 from enum import Enum
@@ -96,11 +97,72 @@ class TSDBModel(Enum):
     sentry_app_component_interacted = 801
 
 
+class TimeSeriesMatrix:
+    """
+    Counter values of many keys over the same series of rollup buckets.
+
+    Every row is an ``array`` holding the counts of one key, with a column
+    for every timestamp in ``timestamps``. This can be reduced directly,
+    without building the ``(timestamp, count)`` tuples of ``get_range``.
+
+    NumPy is only an optional dependency (the ``numpy`` extra), so the rows
+    are standard library arrays rather than a NumPy matrix.
+    """
+
+    def __init__(self, keys, timestamps):
+        self.keys = list(OrderedDict.fromkeys(keys))
+        self.timestamps = list(timestamps)
+        self.rows = [array("q", [0]) * len(self.timestamps) for _ in self.keys]
+
+    @classmethod
+    def from_range(cls, values, timestamps=()):
+        """
+        Creates a matrix from the return value of ``get_range``.
+        """
+        timestamps = set(timestamps)
+        for points in values.values():
+            timestamps.update(timestamp for timestamp, _ in points)
+
+        matrix = cls(values.keys(), sorted(timestamps))
+        columns = {timestamp: column for column, timestamp in enumerate(matrix.timestamps)}
+        for row, key in zip(matrix.rows, matrix.keys):
+            for timestamp, count in values[key]:
+                row[columns[timestamp]] += count
+        return matrix
+
+    def get_row(self, key):
+        return self.rows[self.keys.index(key)]
+
+    def get_sums(self):
+        """
+        Returns a mapping of key => total count across all buckets.
+        """
+        return {key: sum(row) for key, row in zip(self.keys, self.rows)}
+
+    def get_column_sums(self):
+        """
+        Returns the series of ``(timestamp, count)`` summed across all keys.
+        """
+        totals = array("q", [0]) * len(self.timestamps)
+        for row in self.rows:
+            for column, count in enumerate(row):
+                totals[column] += count
+        return list(zip(self.timestamps, totals))
+
+    def to_range(self):
+        """
+        Returns the matrix in the format of ``get_range``.
+        """
+        return {key: list(zip(self.timestamps, row)) for key, row in zip(self.keys, self.rows)}
+
+
 class BaseTSDB(Service):
     __read_methods__ = frozenset(
         [
             "get_range",
+            "get_range_matrix",
             "get_sums",
+            "get_timeseries_sums",
             "get_distinct_counts_series",
             "get_distinct_counts_totals",
             "get_distinct_counts_union",
@@ -374,6 +436,35 @@ class BaseTSDB(Service):
         sum_set = {key: sum(p for _, p in points) for (key, points) in range_set.items()}
         return sum_set
 
+    def get_range_matrix(self, model, keys, start, end, rollup=None, environment_ids=None):
+        """
+        Like ``get_range``, but returns a ``TimeSeriesMatrix``.
+
+        >>> now = timezone.now()
+        >>> get_range_matrix(TSDBModel.group, [1, 2, 3],
+        >>>                  start=now - timedelta(days=1),
+        >>>                  end=now).get_sums()
+        """
+        _, series = self.get_optimal_rollup_series(start, end, rollup)
+        return TimeSeriesMatrix.from_range(
+            self.get_range(model, keys, start, end, rollup, environment_ids=environment_ids),
+            series,
+        )
+
+    def get_timeseries_sums(self, model, keys, start, end, rollup=None, environment_id=None):
+        """
+        Returns a single series of ``(timestamp, count)`` summed across all
+        keys.
+        """
+        return self.get_range_matrix(
+            model,
+            keys,
+            start,
+            end,
+            rollup,
+            environment_ids=[environment_id] if environment_id is not None else None,
+        ).get_column_sums()
+
     def rollup(self, values, rollup):
         """
         Given a set of values (as returned from ``get_range``), roll them up
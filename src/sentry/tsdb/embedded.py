@@ -0,0 +1,781 @@
+import atexit
+import fcntl
+import logging
+import math
+import os
+import pickle
+import tempfile
+import threading
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+from operator import itemgetter
+
+import mmh3
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+
+from sentry.tsdb.base import BaseTSDB, TimeSeriesMatrix
+from sentry.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SketchParameters = namedtuple("SketchParameters", "depth width capacity")
+
+SNAPSHOT_VERSION = 1
+
+
+class CounterRing:
+    """
+    Fixed size ring buffer of counters for a single rollup.
+
+    Every slot stores the rollup index (``epoch // rollup``) it was last
+    written for, so that slots belonging to an older cycle of the ring read
+    as zero and are reset when they are written to again.
+    """
+
+    __slots__ = ("indexes", "values")
+
+    def __init__(self, samples):
+        self.indexes = array("q", [-1]) * samples
+        self.values = array("q", [0]) * samples
+
+    def incr(self, index, count):
+        slot = index % len(self.indexes)
+        current = self.indexes[slot]
+        if current != index:
+            if current > index:
+                # This sample is older than the retention window.
+                return
+            self.indexes[slot] = index
+            self.values[slot] = 0
+        self.values[slot] += count
+
+    def get(self, index):
+        slot = index % len(self.indexes)
+        return self.values[slot] if self.indexes[slot] == index else 0
+
+    def pop(self, index):
+        slot = index % len(self.indexes)
+        if self.indexes[slot] != index:
+            return 0
+        value = self.values[slot]
+        self.indexes[slot] = -1
+        self.values[slot] = 0
+        return value
+
+    def items(self):
+        for index, value in zip(self.indexes, self.values):
+            if index >= 0:
+                yield index, value
+
+
+class SketchRing:
+    """
+    Lazily allocated buckets of sketches for a single rollup. Buckets that
+    fall out of the retention window are dropped as newer buckets are added.
+    """
+
+    __slots__ = ("samples", "buckets", "latest")
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.buckets = {}
+        self.latest = -1
+
+    def get(self, index):
+        return self.buckets.get(index)
+
+    def get_or_create(self, index, factory):
+        if index <= self.latest - self.samples:
+            return None
+
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = factory()
+            if index > self.latest:
+                self.latest = index
+                horizon = index - self.samples
+                for expired in [i for i in self.buckets if i <= horizon]:
+                    del self.buckets[expired]
+        return bucket
+
+    def pop(self, index):
+        return self.buckets.pop(index, None)
+
+    def items(self):
+        return list(self.buckets.items())
+
+
+class DistinctCounter:
+    """
+    Approximate distinct counter.
+
+    The 64 bit hashes of the values are kept as they are until storing them
+    would take more space than the HyperLogLog registers, at which point the
+    counter is converted to a HyperLogLog with ``2 ** precision`` registers.
+    """
+
+    __slots__ = ("precision", "hashes", "registers")
+
+    def __init__(self, precision):
+        self.precision = precision
+        self.hashes = array("Q")
+        self.registers = None
+
+    def add(self, hashes):
+        for value in hashes:
+            if self.registers is not None:
+                self.__update(value)
+            elif value not in self.hashes:
+                self.hashes.append(value)
+                if len(self.hashes) * self.hashes.itemsize > (1 << self.precision):
+                    self.__convert()
+
+    def __convert(self):
+        self.registers = bytearray(1 << self.precision)
+        for value in self.hashes:
+            self.__update(value)
+        self.hashes = array("Q")
+
+    def __update(self, value):
+        bits = 64 - self.precision
+        register = value >> bits
+        rank = bits - (value & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def merge(self, other):
+        if other.registers is None:
+            self.add(other.hashes)
+            return
+
+        if self.registers is None:
+            self.__convert()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        if self.registers is None:
+            return len(self.hashes)
+
+        m = len(self.registers)
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class FrequencySketch:
+    """
+    Frequency table, similar to the ``cmsketch.lua`` script used by the
+    ``RedisTSDB``.
+
+    Scores are kept exactly while there are at most ``capacity`` members.
+    After that, scores are estimated with a Count-Min sketch (using the
+    conservative update rule) and only the top ``capacity`` members are
+    retained in the index.
+    """
+
+    __slots__ = ("parameters", "index", "estimators")
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.index = {}
+        self.estimators = None
+
+    def __coordinates(self, member):
+        depth, width, _ = self.parameters
+        member = force_bytes(member)
+        return [d * width + mmh3.hash(member, d, signed=False) % width for d in range(depth)]
+
+    def __estimate(self, coordinates):
+        return min(self.estimators[c] for c in coordinates)
+
+    def __convert(self):
+        depth, width, capacity = self.parameters
+        self.estimators = array("d", [0.0]) * (depth * width)
+        for member, score in self.index.items():
+            for c in self.__coordinates(member):
+                self.estimators[c] = max(self.estimators[c], score)
+        self.index = dict(self.most_common(capacity))
+
+    def incr(self, member, score):
+        if self.estimators is None:
+            self.index[member] = self.index.get(member, 0.0) + score
+            if len(self.index) > self.parameters.capacity:
+                self.__convert()
+            return
+
+        coordinates = self.__coordinates(member)
+        value = self.index.get(member)
+        if value is None:
+            value = self.__estimate(coordinates)
+        value += score
+
+        for c in coordinates:
+            if self.estimators[c] < value:
+                self.estimators[c] = value
+
+        if member in self.index or len(self.index) < self.parameters.capacity:
+            self.index[member] = value
+        else:
+            minimum = min(self.index, key=self.index.__getitem__)
+            if value > self.index[minimum]:
+                del self.index[minimum]
+                self.index[member] = value
+
+    def merge(self, other):
+        if other.estimators is None:
+            for member, score in other.index.items():
+                self.incr(member, score)
+            return
+
+        if self.estimators is None:
+            self.__convert()
+
+        for c, value in enumerate(other.estimators):
+            self.estimators[c] += value
+
+        members = set(self.index) | set(other.index)
+        self.index = dict(
+            sorted(
+                ((member, self.__estimate(self.__coordinates(member))) for member in members),
+                key=itemgetter(1),
+                reverse=True,
+            )[: self.parameters.capacity]
+        )
+
+    def estimate(self, member):
+        score = self.index.get(member)
+        if score is not None:
+            return score
+        if self.estimators is None:
+            return 0.0
+        return self.__estimate(self.__coordinates(member))
+
+    def most_common(self, limit=None):
+        return sorted(self.index.items(), key=itemgetter(1), reverse=True)[:limit]
+
+
+class LRUStore:
+    """
+    Mapping of ``(model, key, environment_id)`` to the per-rollup rings of
+    that key. The least recently used keys are evicted when there are more
+    than ``max_keys`` of them.
+    """
+
+    def __init__(self, name, max_keys):
+        self.name = name
+        self.max_keys = max_keys
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        rings = self.items.get(key)
+        if rings is not None:
+            self.items.move_to_end(key)
+        return rings
+
+    def get_or_create(self, key, factory):
+        rings = self.get(key)
+        if rings is None:
+            rings = self.items[key] = factory()
+            if len(self.items) > self.max_keys:
+                self.items.popitem(last=False)
+                metrics.incr("tsdb.embedded.evicted", tags={"store": self.name})
+        return rings
+
+    def pop(self, key):
+        return self.items.pop(key, None)
+
+
+class EmbeddedTSDB(BaseTSDB):
+    """
+    A memory bounded, in-process time-series storage.
+
+    This is intended for single node installations, where it avoids the need
+    for Redis. Unlike the ``InMemoryTSDB``, memory usage is bounded:
+
+    - counters are stored in fixed size ring buffers for every rollup,
+    - distinct counters use HyperLogLog once they grow,
+    - frequency tables use Count-Min sketches once they grow,
+    - and every store holds at most ``max_keys`` keys, evicting the least
+      recently used keys first.
+
+    When ``snapshot_path`` is set, the data is written to that file when the
+    process exits and restored from it when the backend is created. Every
+    process keeps its own data, so only a single process may use a snapshot
+    path: it is locked for as long as the backend is open. Backends created
+    while the path is locked (such as those of the other processes sharing
+    the same options) log a warning and run without a snapshot. Processes
+    forked from the owner never write the snapshot.
+    """
+
+    DEFAULT_SKETCH_PARAMETERS = SketchParameters(3, 128, 50)
+
+    def __init__(
+        self,
+        max_keys=10000,
+        precision=10,
+        sketch_parameters=None,
+        snapshot_path=None,
+        **options,
+    ):
+        super().__init__(**options)
+        self.max_keys = max_keys
+        self.precision = precision
+        self.sketch_parameters = (
+            SketchParameters(*sketch_parameters)
+            if sketch_parameters is not None
+            else self.DEFAULT_SKETCH_PARAMETERS
+        )
+        self.snapshot_path = snapshot_path
+        self.lock = threading.RLock()
+        self.flush()
+
+        self.snapshot_lock = None
+        if self.snapshot_path is not None:
+            self.snapshot_lock = self.__acquire_snapshot_lock()
+        if self.snapshot_lock is not None:
+            self.owner = os.getpid()
+            self.restore()
+            atexit.register(self.close)
+
+    def __acquire_snapshot_lock(self):
+        """
+        Returns the locked lock file of ``snapshot_path``, or ``None`` if
+        another backend holds the lock.
+        """
+        f = open(f"{self.snapshot_path}.lock", "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            logger.warning(
+                "tsdb.embedded.snapshot-locked",
+                extra={"snapshot_path": self.snapshot_path, "pid": os.getpid()},
+            )
+            return None
+        except Exception:
+            f.close()
+            raise
+        return f
+
+    def close(self):
+        """
+        Write the snapshot, if this process owns it, and release the lock on
+        ``snapshot_path``.
+        """
+        if self.snapshot_lock is None:
+            return
+
+        atexit.unregister(self.close)
+        try:
+            if os.getpid() == self.owner:
+                self.snapshot()
+        finally:
+            self.snapshot_lock.close()
+            self.snapshot_lock = None
+
+    def flush(self):
+        with self.lock:
+            self.counters = LRUStore("counters", self.max_keys)
+            self.sets = LRUStore("sets", self.max_keys)
+            self.frequencies = LRUStore("frequencies", self.max_keys)
+
+    def snapshot(self):
+        """
+        Write all data to ``snapshot_path``.
+        """
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        with self.lock:
+            state = {
+                "version": SNAPSHOT_VERSION,
+                "rollups": list(self.rollups.items()),
+                "counters": self.counters.items,
+                "sets": self.sets.items,
+                "frequencies": self.frequencies.items,
+            }
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+                try:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception:
+                    os.unlink(f.name)
+                    raise
+        os.replace(f.name, self.snapshot_path)
+
+    def restore(self):
+        """
+        Load the data written by ``snapshot``, if there is any.
+        """
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            logger.warning("tsdb.embedded.restore-failed", exc_info=True)
+            return
+
+        if state.get("version") != SNAPSHOT_VERSION or state.get("rollups") != list(
+            self.rollups.items()
+        ):
+            logger.warning("tsdb.embedded.snapshot-mismatch")
+            return
+
+        with self.lock:
+            for store in (self.counters, self.sets, self.frequencies):
+                for key, rings in state[store.name].items():
+                    store.get_or_create(key, lambda: rings)
+
+    def __make_counter_rings(self):
+        return {rollup: CounterRing(samples) for rollup, samples in self.rollups.items()}
+
+    def __make_sketch_rings(self):
+        return {rollup: SketchRing(samples) for rollup, samples in self.rollups.items()}
+
+    def __make_distinct_counter(self):
+        return DistinctCounter(self.precision)
+
+    def __make_frequency_sketch(self):
+        return FrequencySketch(self.sketch_parameters)
+
+    def __get_ring(self, store, model, key, environment_id, rollup):
+        rings = store.get((model, key, environment_id))
+        if rings is None:
+            return None
+        return rings.get(rollup)
+
+    def __get_environment_ids(self, environment_ids):
+        return (set(environment_ids) if environment_ids is not None else set()).union([None])
+
+    def incr(self, model, key, timestamp=None, count=1, environment_id=None):
+        self.validate_arguments([model], [environment_id])
+
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        with self.lock:
+            for environment_id in {environment_id, None}:
+                rings = self.counters.get_or_create(
+                    (model, key, environment_id), self.__make_counter_rings
+                )
+                for rollup, ring in rings.items():
+                    ring.incr(self.normalize_to_rollup(timestamp, rollup), count)
+
+    def merge(self, model, destination, sources, timestamp=None, environment_ids=None):
+        environment_ids = self.__get_environment_ids(environment_ids)
+
+        self.validate_arguments([model], environment_ids)
+
+        with self.lock:
+            for environment_id in environment_ids:
+                for source in sources:
+                    source_rings = self.counters.pop((model, source, environment_id))
+                    if source_rings is None:
+                        continue
+                    rings = self.counters.get_or_create(
+                        (model, destination, environment_id), self.__make_counter_rings
+                    )
+                    for rollup, ring in source_rings.items():
+                        for index, count in ring.items():
+                            rings[rollup].incr(index, count)
+
+    def delete(self, models, keys, start=None, end=None, timestamp=None, environment_ids=None):
+        environment_ids = self.__get_environment_ids(environment_ids)
+
+        self.validate_arguments(models, environment_ids)
+
+        self.__delete(self.counters, models, keys, start, end, timestamp, environment_ids)
+
+    def __delete(self, store, models, keys, start, end, timestamp, environment_ids):
+        rollups = self.get_active_series(start, end, timestamp)
+
+        with self.lock:
+            for rollup, series in rollups.items():
+                indexes = [self.normalize_to_rollup(timestamp, rollup) for timestamp in series]
+                for model in models:
+                    for key in keys:
+                        for environment_id in environment_ids:
+                            ring = self.__get_ring(store, model, key, environment_id, rollup)
+                            if ring is None:
+                                continue
+                            for index in indexes:
+                                ring.pop(index)
+
+    def get_range(
+        self, model, keys, start, end, rollup=None, environment_ids=None, use_cache=False
+    ):
+        return self.get_range_matrix(
+            model, keys, start, end, rollup, environment_ids=environment_ids
+        ).to_range()
+
+    def get_sums(self, model, keys, start, end, rollup=None, environment_id=None, use_cache=False):
+        return self.get_range_matrix(
+            model,
+            keys,
+            start,
+            end,
+            rollup,
+            environment_ids=[environment_id] if environment_id is not None else None,
+        ).get_sums()
+
+    def get_range_matrix(self, model, keys, start, end, rollup=None, environment_ids=None):
+        self.validate_arguments([model], environment_ids if environment_ids is not None else [None])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+        indexes = [self.normalize_ts_to_rollup(timestamp, rollup) for timestamp in series]
+
+        matrix = TimeSeriesMatrix(keys, series)
+        with self.lock:
+            for key, row in zip(matrix.keys, matrix.rows):
+                for environment_id in environment_ids or [None]:
+                    ring = self.__get_ring(self.counters, model, key, environment_id, rollup)
+                    if ring is None:
+                        continue
+                    for column, index in enumerate(indexes):
+                        row[column] += ring.get(index)
+        return matrix
+
+    def record(self, model, key, values, timestamp=None, environment_id=None):
+        self.record_multi([(model, key, values)], timestamp, environment_id=environment_id)
+
+    def record_multi(self, items, timestamp=None, environment_id=None):
+        self.validate_arguments([model for model, key, values in items], [environment_id])
+
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        indexes = [(rollup, self.normalize_to_rollup(timestamp, rollup)) for rollup in self.rollups]
+
+        with self.lock:
+            for model, key, values in items:
+                hashes = [mmh3.hash64(force_bytes(value), signed=False)[0] for value in values]
+                for environment_id in {environment_id, None}:
+                    rings = self.sets.get_or_create(
+                        (model, key, environment_id), self.__make_sketch_rings
+                    )
+                    for rollup, index in indexes:
+                        counter = rings[rollup].get_or_create(index, self.__make_distinct_counter)
+                        if counter is not None:
+                            counter.add(hashes)
+
+    def __get_sketches(self, store, model, key, environment_id, rollup, series):
+        ring = self.__get_ring(store, model, key, environment_id, rollup)
+        for timestamp in series:
+            yield timestamp, (
+                ring.get(self.normalize_ts_to_rollup(timestamp, rollup))
+                if ring is not None
+                else None
+            )
+
+    def get_distinct_counts_series(
+        self, model, keys, start, end=None, rollup=None, environment_id=None
+    ):
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        results = {}
+        with self.lock:
+            for key in keys:
+                results[key] = [
+                    (timestamp, counter.count() if counter is not None else 0)
+                    for timestamp, counter in self.__get_sketches(
+                        self.sets, model, key, environment_id, rollup, series
+                    )
+                ]
+        return results
+
+    def __get_distinct_union(self, model, keys, rollup, series, environment_id):
+        union = self.__make_distinct_counter()
+        for key in keys:
+            for _, counter in self.__get_sketches(
+                self.sets, model, key, environment_id, rollup, series
+            ):
+                if counter is not None:
+                    union.merge(counter)
+        return union
+
+    def get_distinct_counts_totals(
+        self, model, keys, start, end=None, rollup=None, environment_id=None, use_cache=False
+    ):
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        with self.lock:
+            return {
+                key: self.__get_distinct_union(model, [key], rollup, series, environment_id).count()
+                for key in keys
+            }
+
+    def get_distinct_counts_union(
+        self, model, keys, start, end=None, rollup=None, environment_id=None
+    ):
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        with self.lock:
+            return self.__get_distinct_union(model, keys, rollup, series, environment_id).count()
+
+    def __merge_sketches(self, store, factory, model, destination, sources, environment_ids):
+        with self.lock:
+            for environment_id in environment_ids:
+                for source in sources:
+                    source_rings = store.pop((model, source, environment_id))
+                    if source_rings is None:
+                        continue
+                    rings = store.get_or_create(
+                        (model, destination, environment_id), self.__make_sketch_rings
+                    )
+                    for rollup, ring in source_rings.items():
+                        for index, sketch in ring.items():
+                            bucket = rings[rollup].get_or_create(index, factory)
+                            if bucket is not None:
+                                bucket.merge(sketch)
+
+    def merge_distinct_counts(
+        self, model, destination, sources, timestamp=None, environment_ids=None
+    ):
+        environment_ids = self.__get_environment_ids(environment_ids)
+
+        self.validate_arguments([model], environment_ids)
+
+        self.__merge_sketches(
+            self.sets, self.__make_distinct_counter, model, destination, sources, environment_ids
+        )
+
+    def delete_distinct_counts(
+        self, models, keys, start=None, end=None, timestamp=None, environment_ids=None
+    ):
+        environment_ids = self.__get_environment_ids(environment_ids)
+
+        self.validate_arguments(models, environment_ids)
+
+        self.__delete(self.sets, models, keys, start, end, timestamp, environment_ids)
+
+    def record_frequency_multi(self, requests, timestamp=None, environment_id=None):
+        self.validate_arguments([model for model, request in requests], [environment_id])
+
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        indexes = [(rollup, self.normalize_to_rollup(timestamp, rollup)) for rollup in self.rollups]
+
+        with self.lock:
+            for model, request in requests:
+                for key, items in request.items():
+                    items = {k: float(v) for k, v in items.items()}
+                    for environment_id in {environment_id, None}:
+                        rings = self.frequencies.get_or_create(
+                            (model, key, environment_id), self.__make_sketch_rings
+                        )
+                        for rollup, index in indexes:
+                            sketch = rings[rollup].get_or_create(
+                                index, self.__make_frequency_sketch
+                            )
+                            if sketch is None:
+                                continue
+                            for member, score in items.items():
+                                sketch.incr(member, score)
+
+    def get_most_frequent(
+        self, model, keys, start, end=None, rollup=None, limit=None, environment_id=None
+    ):
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        results = {}
+        with self.lock:
+            for key in keys:
+                result = Counter()
+                for _, sketch in self.__get_sketches(
+                    self.frequencies, model, key, environment_id, rollup, series
+                ):
+                    if sketch is not None:
+                        result.update(sketch.index)
+                results[key] = result.most_common(limit)
+        return results
+
+    def get_most_frequent_series(
+        self, model, keys, start, end=None, rollup=None, limit=None, environment_id=None
+    ):
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        results = {}
+        with self.lock:
+            for key in keys:
+                results[key] = [
+                    (timestamp, dict(sketch.most_common(limit)) if sketch is not None else {})
+                    for timestamp, sketch in self.__get_sketches(
+                        self.frequencies, model, key, environment_id, rollup, series
+                    )
+                ]
+        return results
+
+    def get_frequency_series(self, model, items, start, end=None, rollup=None, environment_id=None):
+        self.validate_arguments([model], [environment_id])
+
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        results = {}
+        with self.lock:
+            for key, members in items.items():
+                results[key] = [
+                    (
+                        timestamp,
+                        {
+                            member: sketch.estimate(member) if sketch is not None else 0.0
+                            for member in members
+                        },
+                    )
+                    for timestamp, sketch in self.__get_sketches(
+                        self.frequencies, model, key, environment_id, rollup, series
+                    )
+                ]
+        return results
+
+    def get_frequency_totals(self, model, items, start, end=None, rollup=None, environment_id=None):
+        self.validate_arguments([model], [environment_id])
+
+        results = {}
+        for key, series in self.get_frequency_series(
+            model, items, start, end, rollup, environment_id
+        ).items():
+            result = results[key] = {}
+            for timestamp, scores in series:
+                for member, score in scores.items():
+                    result[member] = result.get(member, 0.0) + score
+
+        return results
+
+    def merge_frequencies(self, model, destination, sources, timestamp=None, environment_ids=None):
+        environment_ids = self.__get_environment_ids(environment_ids)
+
+        self.validate_arguments([model], environment_ids)
+
+        self.__merge_sketches(
+            self.frequencies,
+            self.__make_frequency_sketch,
+            model,
+            destination,
+            sources,
+            environment_ids,
+        )
+
+    def delete_frequencies(
+        self, models, keys, start=None, end=None, timestamp=None, environment_ids=None
+    ):
+        environment_ids = self.__get_environment_ids(environment_ids)
+
+        self.validate_arguments(models, environment_ids)
+
+        self.__delete(self.frequencies, models, keys, start, end, timestamp, environment_ids)
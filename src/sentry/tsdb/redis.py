@@ -11,7 +11,7 @@ from django.utils import timezone
 from django.utils.encoding import force_bytes
 from pkg_resources import resource_string
 
-from sentry.tsdb.base import BaseTSDB
+from sentry.tsdb.base import BaseTSDB, TimeSeriesMatrix
 from sentry.utils.compat import crc32, map, zip
 from sentry.utils.dates import to_datetime, to_timestamp
 from sentry.utils.redis import SentryScript, check_cluster_versions, get_cluster_from_options
@@ -23,6 +23,8 @@ SketchParameters = namedtuple("SketchParameters", "depth width capacity")
 
 CountMinScript = SentryScript(None, resource_string("sentry", "scripts/tsdb/cmsketch.lua"))
 
+CounterScript = SentryScript(None, resource_string("sentry", "scripts/tsdb/counters.lua"))
+
 
 class SuppressionWrapper:
     """\
@@ -103,6 +105,11 @@ class RedisTSDB(BaseTSDB):
     frequency table can be displayed as percentages of the whole data set.
     (Additional documentation and the bulk of the logic for implementing the
     frequency table API can be found in the ``cmsketch.lua`` script.)
+
+    When ``enable_scripted_writes`` is set, counter increments are applied by
+    a single ``counters.lua`` call per host and frequency table updates set
+    their expiration from within ``cmsketch.lua``. Expiration times are then
+    only set once for every bucket, instead of with every write.
     """
 
     DEFAULT_SKETCH_PARAMETERS = SketchParameters(3, 128, 50)
@@ -112,6 +119,7 @@ class RedisTSDB(BaseTSDB):
         self.prefix = prefix
         self.vnodes = vnodes
         self.enable_frequency_sketches = options.pop("enable_frequency_sketches", False)
+        self.enable_scripted_writes = options.pop("enable_scripted_writes", False)
         super().__init__(**options)
 
     def validate(self):
@@ -164,6 +172,17 @@ class RedisTSDB(BaseTSDB):
 
         Returns a 2-tuple that contains the hash key and the hash field.
         """
+        vnode, hash_field = self.make_counter_field(key, environment_id)
+        return (
+            self.make_counter_hash_key(model, self.normalize_to_rollup(timestamp, rollup), vnode),
+            hash_field,
+        )
+
+    def make_counter_field(self, key, environment_id):
+        """
+        Returns a 2-tuple that contains the vnode and the hash field of a
+        counter key, which are the same for all rollups and buckets.
+        """
         model_key = self.get_model_key(key)
 
         if isinstance(model_key, int):
@@ -171,14 +190,11 @@ class RedisTSDB(BaseTSDB):
         else:
             vnode = crc32(force_bytes(model_key)) % self.vnodes
 
-        return (
-            "{prefix}{model}:{epoch}:{vnode}".format(
-                prefix=self.prefix,
-                model=model.value,
-                epoch=self.normalize_to_rollup(timestamp, rollup),
-                vnode=vnode,
-            ),
-            self.add_environment_parameter(model_key, environment_id),
+        return vnode, self.add_environment_parameter(model_key, environment_id)
+
+    def make_counter_hash_key(self, model, epoch, vnode):
+        return "{prefix}{model}:{epoch}:{vnode}".format(
+            prefix=self.prefix, model=model.value, epoch=epoch, vnode=vnode
         )
 
     def get_model_key(self, key):
@@ -222,44 +238,74 @@ class RedisTSDB(BaseTSDB):
             default_timestamp = timezone.now()
 
         for (cluster, durable), environment_ids in self.get_cluster_groups({None, environment_id}):
-            manager = cluster.map()
-            if not durable:
-                manager = SuppressionWrapper(manager)
-
-            with manager as client:
-                # (hash_key, hash_field) -> count
-                key_operations = defaultdict(lambda: 0)
-                # (hash_key) -> "max expiration encountered"
-                key_expiries = defaultdict(lambda: 0.0)
-
-                for rollup, max_values in self.rollups.items():
-                    for item in items:
-                        if len(item) == 2:
-                            model, key = item
-                            options = {}
-                        else:
-                            model, key, options = item
-
-                        count = options.get("count", default_count)
-                        timestamp = options.get("timestamp", default_timestamp)
+            # (hash_key, hash_field) -> count
+            key_operations = defaultdict(lambda: 0)
+            # (hash_key) -> "max expiration encountered"
+            key_expiries = defaultdict(lambda: 0.0)
+
+            for rollup, max_values in self.rollups.items():
+                for item in items:
+                    if len(item) == 2:
+                        model, key = item
+                        options = {}
+                    else:
+                        model, key, options = item
+
+                    count = options.get("count", default_count)
+                    timestamp = options.get("timestamp", default_timestamp)
+
+                    expiry = self.calculate_expiry(rollup, max_values, timestamp)
+
+                    for environment_id in environment_ids:
+                        hash_key, hash_field = self.make_counter_key(
+                            model, rollup, timestamp, key, environment_id
+                        )
 
-                        expiry = self.calculate_expiry(rollup, max_values, timestamp)
+                        if key_expiries[hash_key] < expiry:
+                            key_expiries[hash_key] = expiry
 
-                        for environment_id in environment_ids:
-                            hash_key, hash_field = self.make_counter_key(
-                                model, rollup, timestamp, key, environment_id
-                            )
+                        key_operations[(hash_key, hash_field)] += count
 
-                            if key_expiries[hash_key] < expiry:
-                                key_expiries[hash_key] = expiry
+            if self.enable_scripted_writes:
+                try:
+                    self._incr_counters_scripted(cluster, key_operations, key_expiries)
+                except Exception:
+                    if durable:
+                        raise
+                continue
 
-                            key_operations[(hash_key, hash_field)] += count
+            manager = cluster.map()
+            if not durable:
+                manager = SuppressionWrapper(manager)
 
+            with manager as client:
                 for (hash_key, hash_field), count in key_operations.items():
                     client.hincrby(hash_key, hash_field, count)
                     if key_expiries.get(hash_key):
                         client.expireat(hash_key, key_expiries.pop(hash_key))
 
+    def _incr_counters_scripted(self, cluster, key_operations, key_expiries):
+        """
+        Applies counter increments with one ``counters.lua`` call per host.
+        """
+        router = cluster.get_router()
+
+        # host -> hash_key -> [(hash_field, count)]
+        hosts = defaultdict(lambda: defaultdict(list))
+        for (hash_key, hash_field), count in key_operations.items():
+            hosts[router.get_host_for_key(hash_key)][hash_key].append((hash_field, count))
+
+        for host, operations in hosts.items():
+            keys = []
+            arguments = []
+            for hash_key, fields in operations.items():
+                keys.append(hash_key)
+                arguments.extend((int(key_expiries[hash_key]), len(fields)))
+                for hash_field, count in fields:
+                    arguments.extend((hash_field, count))
+
+            CounterScript(keys, arguments, client=cluster.get_local_client(host))
+
     def get_range(
         self, model, keys, start, end, rollup=None, environment_ids=None, use_cache=False
     ):
@@ -271,6 +317,25 @@ class RedisTSDB(BaseTSDB):
         >>>          start=now - timedelta(days=1),
         >>>          end=now)
         """
+        return self.get_range_matrix(
+            model, keys, start, end, rollup, environment_ids=environment_ids
+        ).to_range()
+
+    def get_sums(self, model, keys, start, end, rollup=None, environment_id=None, use_cache=False):
+        return self.get_range_matrix(
+            model,
+            keys,
+            start,
+            end,
+            rollup,
+            environment_ids=[environment_id] if environment_id is not None else None,
+        ).get_sums()
+
+    def get_range_matrix(self, model, keys, start, end, rollup=None, environment_ids=None):
+        """
+        Fetches the counters of all keys with one ``HMGET`` per bucket and
+        vnode, rather than one ``HGET`` per key and bucket.
+        """
         # redis backend doesn't support multiple envs
         if environment_ids is not None and len(environment_ids) > 1:
             raise NotImplementedError
@@ -279,27 +344,31 @@ class RedisTSDB(BaseTSDB):
         self.validate_arguments([model], [environment_id])
 
         rollup, series = self.get_optimal_rollup_series(start, end, rollup)
-        series = map(to_datetime, series)
+        matrix = TimeSeriesMatrix(keys, series)
+
+        # vnode -> [(row, hash_field)]
+        fields_by_vnode = defaultdict(list)
+        for row, key in enumerate(matrix.keys):
+            vnode, hash_field = self.make_counter_field(key, environment_id)
+            fields_by_vnode[vnode].append((row, hash_field))
 
-        results = []
+        responses = []
         cluster, _ = self.get_cluster(environment_id)
         with cluster.map() as client:
-            for key in keys:
-                for timestamp in series:
-                    hash_key, hash_field = self.make_counter_key(
-                        model, rollup, timestamp, key, environment_id
-                    )
-                    results.append(
-                        (to_timestamp(timestamp), key, client.hget(hash_key, hash_field))
+            for column, timestamp in enumerate(series):
+                epoch = self.normalize_ts_to_rollup(timestamp, rollup)
+                for vnode, fields in fields_by_vnode.items():
+                    hash_key = self.make_counter_hash_key(model, epoch, vnode)
+                    responses.append(
+                        (column, fields, client.hmget(hash_key, [f for _, f in fields]))
                     )
 
-        results_by_key = defaultdict(dict)
-        for epoch, key, count in results:
-            results_by_key[key][epoch] = int(count.value or 0)
+        for column, fields, response in responses:
+            for (row, _), count in zip(fields, response.value):
+                if count is not None:
+                    matrix.rows[row][column] = int(count)
 
-        for key, points in results_by_key.items():
-            results_by_key[key] = sorted(points.items())
-        return dict(results_by_key)
+        return matrix
 
     def merge(self, model, destination, sources, timestamp=None, environment_ids=None):
         environment_ids = (set(environment_ids) if environment_ids is not None else set()).union(
@@ -668,23 +737,33 @@ class RedisTSDB(BaseTSDB):
                     # Figure out all of the keys we need to be incrementing, as
                     # well as their expiration policies.
                     for rollup, max_values in self.rollups.items():
+                        expiry = self.calculate_expiry(rollup, max_values, timestamp)
                         for environment_id in environment_ids:
                             chunk = self.make_frequency_table_keys(
                                 model, rollup, ts, key, environment_id
                             )
                             keys.extend(chunk)
+                            for k in chunk:
+                                expirations[k] = expiry
 
-                        expiry = self.calculate_expiry(rollup, max_values, timestamp)
-                        for k in chunk:
-                            expirations[k] = expiry
+                    # Since we're essentially merging dictionaries, we need to
+                    # append this to any value that already exists at the key.
+                    cmds = commands.setdefault(key, [])
+
+                    if self.enable_scripted_writes:
+                        # ``INCREX`` takes one expiration time for each sketch,
+                        # i.e. for every index/estimates pair of keys.
+                        arguments = ["INCREX"] + list(self.DEFAULT_SKETCH_PARAMETERS)
+                        arguments.extend(int(expirations[k]) for k in keys[::2])
+                        for member, score in items.items():
+                            arguments.extend((score, member))
+                        cmds.append((CountMinScript, keys, arguments))
+                        continue
 
                     arguments = ["INCR"] + list(self.DEFAULT_SKETCH_PARAMETERS)
                     for member, score in items.items():
                         arguments.extend((score, member))
 
-                    # Since we're essentially merging dictionaries, we need to
-                    # append this to any value that already exists at the key.
-                    cmds = commands.setdefault(key, [])
                     cmds.append((CountMinScript, keys, arguments))
                     for k, t in expirations.items():
                         cmds.append(("EXPIREAT", k, t))
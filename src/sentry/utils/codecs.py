@@ -1,6 +1,8 @@
+import struct
+import threading
 import zlib
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, cast
+from typing import Any, Callable, Dict, Generic, Mapping, Optional, TypeVar, cast
 
 import zstandard
 
@@ -92,3 +94,106 @@ class ZstdCodec(Codec[bytes, bytes]):
 
     def decode(self, value: bytes) -> bytes:
         return cast(bytes, zstandard.ZstdDecompressor().decompress(value))
+
+
+class ZstdDictCodec(Codec[bytes, bytes]):
+    """
+    Zstandard compression using trained dictionaries.
+
+    Dictionaries are provided by name (for example, the platform of the
+    events they were trained on.) The optional ``select`` function is called
+    with the value being encoded to pick the dictionary name, falling back
+    to the ``default`` dictionary, or no dictionary at all.
+
+    Encoded values are prefixed with the ID of the dictionary they were
+    compressed with (0 if none), so they can still be decoded after the
+    dictionaries used for compression have changed, as long as the old
+    dictionaries are still provided.
+    """
+
+    prefix = struct.Struct("<I")
+
+    def __init__(
+        self,
+        dictionaries: Optional[Mapping[str, bytes]] = None,
+        default: Optional[str] = None,
+        select: Optional[Callable[[bytes], Optional[str]]] = None,
+        level: int = 3,
+    ) -> None:
+        self.default = default
+        self.select = select
+        self.level = level
+        self.dictionaries: Dict[str, zstandard.ZstdCompressionDict] = {}
+        self.dictionaries_by_id: Dict[int, zstandard.ZstdCompressionDict] = {}
+        for name, data in (dictionaries or {}).items():
+            dictionary = zstandard.ZstdCompressionDict(data)
+            if not dictionary.dict_id():
+                raise ValueError(f"{name!r} is not a trained dictionary")
+            dictionary.precompute_compress(level=level)
+            self.dictionaries[name] = dictionary
+            self.dictionaries_by_id[dictionary.dict_id()] = dictionary
+
+        if default is not None and default not in self.dictionaries:
+            raise ValueError(f"unknown default compression dictionary: {default!r}")
+
+        # Compressors and decompressors are created once per dictionary, but
+        # they cannot be used by multiple threads at the same time.
+        self.__local = threading.local()
+
+    def get_dictionary(self, value: bytes) -> Optional[zstandard.ZstdCompressionDict]:
+        dictionary = None
+        if self.select is not None:
+            name = self.select(value)
+            if name is not None:
+                dictionary = self.dictionaries.get(name)
+        if dictionary is None and self.default is not None:
+            dictionary = self.dictionaries[self.default]
+        return dictionary
+
+    def __get_compressor(self, dictionary: Optional[zstandard.ZstdCompressionDict]) -> Any:
+        compressors = getattr(self.__local, "compressors", None)
+        if compressors is None:
+            compressors = self.__local.compressors = {}
+
+        dict_id = dictionary.dict_id() if dictionary is not None else 0
+        compressor = compressors.get(dict_id)
+        if compressor is None:
+            if dictionary is None:
+                compressor = zstandard.ZstdCompressor(level=self.level)
+            else:
+                # The frame does not need to repeat the dictionary ID of the
+                # prefix.
+                compressor = zstandard.ZstdCompressor(
+                    level=self.level, dict_data=dictionary, write_dict_id=False
+                )
+            compressors[dict_id] = compressor
+        return compressor
+
+    def __get_decompressor(self, dict_id: int) -> Any:
+        decompressors = getattr(self.__local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self.__local.decompressors = {}
+
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if not dict_id:
+                decompressor = zstandard.ZstdDecompressor()
+            else:
+                try:
+                    dictionary = self.dictionaries_by_id[dict_id]
+                except KeyError:
+                    raise ValueError(f"unknown compression dictionary: {dict_id}")
+                decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+            decompressors[dict_id] = decompressor
+        return decompressor
+
+    def encode(self, value: bytes) -> bytes:
+        dictionary = self.get_dictionary(value)
+        dict_id = dictionary.dict_id() if dictionary is not None else 0
+        compressor = self.__get_compressor(dictionary)
+        return self.prefix.pack(dict_id) + cast(bytes, compressor.compress(value))
+
+    def decode(self, value: bytes) -> bytes:
+        (dict_id,) = self.prefix.unpack_from(value)
+        frame = memoryview(value)[self.prefix.size :]
+        return cast(bytes, self.__get_decompressor(dict_id).decompress(frame))
@@ -8,7 +8,7 @@ import datetime
 import decimal
 import uuid
 from enum import Enum
-from typing import Any
+from typing import Any, Callable
 
 import sentry_sdk
 from django.utils.encoding import force_text
@@ -19,6 +19,11 @@ from simplejson import JSONDecodeError, JSONEncoder, _default_decoder  # NOQA
 
 from bitfield.types import BitHandler
 
+try:
+    import rapidjson
+except ImportError:
+    rapidjson = None
+
 
 def better_default_encoder(o):
     if isinstance(o, uuid.UUID):
@@ -89,7 +94,113 @@ _default_escaped_encoder = JSONEncoderForHTML(
 JSONData = Any  # https://github.com/python/typing/issues/182
 
 
+if rapidjson is not None:
+
+    class _RapidJSONEncoder(rapidjson.Encoder):
+        def default(self, o):
+            # Mirror ``namedtuple_as_object`` of the default encoder.
+            _asdict = getattr(o, "_asdict", None)
+            if callable(_asdict):
+                return _asdict()
+            # Only lists are iterated natively, see ``iterable_mode``.
+            if isinstance(o, tuple):
+                return list(o)
+            return better_default_encoder(o)
+
+    _rapidjson_encoder = _RapidJSONEncoder(
+        ensure_ascii=True,
+        # Encode as numbers, like ``use_decimal`` does.
+        number_mode=rapidjson.NM_DECIMAL,
+        # Dates and times are left to ``better_default_encoder``, since they
+        # are formatted differently.
+        datetime_mode=rapidjson.DM_NONE,
+        uuid_mode=rapidjson.UM_HEX,
+        # Other iterables (such as lazy strings) would be encoded as arrays.
+        iterable_mode=rapidjson.IM_ONLY_LISTS,
+    )
+
+
+# Encoder and decoder functions of the fast backend (see ``set_backend``.)
+_fast_encode = None
+_fast_decode = None
+
+
+def set_backend(name: str) -> None:
+    """
+    Selects the backend used by ``dump(s)`` and ``load(s)``:
+
+    ``simplejson``
+        The default backend.
+
+    ``rapidjson``
+        Uses python-rapidjson if it is installed. Values that can't be handled
+        by it (out of range floats, dictionaries with non-string keys) fall
+        back to the default backend. Output only differs from the default
+        backend in how some characters are escaped.
+
+    The HTML safe encoder always uses the default backend.
+    """
+    global _fast_encode, _fast_decode
+
+    if name == "simplejson":
+        _fast_encode = _fast_decode = None
+    elif name == "rapidjson":
+        if rapidjson is None:
+            raise ImportError("The rapidjson JSON backend requires python-rapidjson.")
+        _fast_encode = _rapidjson_encoder
+        _fast_decode = rapidjson.loads
+    else:
+        raise ValueError(f"Unknown JSON backend: {name!r}")
+
+
+def get_encoder(name: str) -> Callable[[JSONData], str]:
+    """
+    Returns a function that encodes values with the given backend regardless
+    of the one selected with ``set_backend``, for callers that always want
+    the faster backend (see ``set_backend`` for the available names.)
+    """
+    if name == "simplejson":
+        return _default_encoder.encode
+    elif name == "rapidjson":
+        if rapidjson is None:
+            raise ImportError("The rapidjson JSON backend requires python-rapidjson.")
+
+        def encode(value: JSONData) -> str:
+            try:
+                return _rapidjson_encoder(value)
+            except (TypeError, ValueError, OverflowError):
+                return _default_encoder.encode(value)
+
+        return encode
+    else:
+        raise ValueError(f"Unknown JSON backend: {name!r}")
+
+
+def _encode(value: JSONData) -> str:
+    if _fast_encode is not None:
+        try:
+            return _fast_encode(value)
+        except (TypeError, ValueError, OverflowError):
+            # Raise errors from the default encoder for unsupported values.
+            pass
+    return _default_encoder.encode(value)
+
+
+def _decode(value: str) -> JSONData:
+    if _fast_decode is not None:
+        try:
+            return _fast_decode(value)
+        except ValueError:
+            # Raise ``JSONDecodeError`` for invalid documents.
+            pass
+    return _default_decoder.decode(value)
+
+
 def dump(value: JSONData, fp, **kwargs):
+    if _fast_encode is not None:
+        fp.write(_encode(value))
+        return
+
     for chunk in _default_encoder.iterencode(value):
         fp.write(chunk)
 
@@ -98,7 +209,7 @@ def dumps(value: JSONData, escape: bool = False, **kwargs) -> str:
     # Legacy use. Do not use. Use dumps_htmlsafe
     if escape:
         return _default_escaped_encoder.encode(value)
-    return _default_encoder.encode(value)
+    return _encode(value)
 
 
 def load(fp, **kwargs) -> JSONData:
@@ -107,7 +218,7 @@ def load(fp, **kwargs) -> JSONData:
 
 def loads(value: str, **kwargs) -> JSONData:
     with sentry_sdk.start_span(op="sentry.utils.json.loads"):
-        return _default_decoder.decode(value)
+        return _decode(value)
 
 
 def dumps_htmlsafe(value):
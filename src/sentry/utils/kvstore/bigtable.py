@@ -8,11 +8,12 @@ from typing import Any, Iterator, Mapping, Optional, Sequence, Tuple, cast
 from django.utils import timezone
 from google.api_core import exceptions, retry
 from google.cloud import bigtable
+from google.cloud.bigtable.row import DirectRow
 from google.cloud.bigtable.row_data import PartialRowData
 from google.cloud.bigtable.row_set import RowSet
 from google.cloud.bigtable.table import Table
 
-from sentry.utils.codecs import Codec, ZlibCodec, ZstdCodec
+from sentry.utils.codecs import Codec, ZlibCodec, ZstdCodec, ZstdDictCodec
 from sentry.utils.kvstore.abstract import KVStorage
 
 logger = logging.getLogger(__name__)
@@ -51,10 +52,12 @@ class BigtableKVStorage(KVStorage[str, bytes]):
         # behavior is explicitly undefined if both bits are set on a record.
         COMPRESSED_ZLIB = 1 << 0
         COMPRESSED_ZSTD = 1 << 1
+        COMPRESSED_ZSTD_DICT = 1 << 2
 
     compression_strategies: Mapping[str, Tuple[Flags, Codec[bytes, bytes]]] = {
         "zlib": (Flags.COMPRESSED_ZLIB, ZlibCodec()),
         "zstd": (Flags.COMPRESSED_ZSTD, ZstdCodec()),
+        "zstd-dict": (Flags.COMPRESSED_ZSTD_DICT, ZstdDictCodec()),
     }
 
     def __init__(
@@ -66,11 +69,20 @@ class BigtableKVStorage(KVStorage[str, bytes]):
         default_ttl: Optional[timedelta] = None,
         compression: Optional[str] = None,
         app_profile: Optional[str] = None,
+        dictionary_codec: Optional[ZstdDictCodec] = None,
     ) -> None:
         client_options = client_options if client_options is not None else {}
         if "admin" in client_options:
             raise ValueError('"admin" cannot be provided as a client option')
 
+        # The dictionaries are needed to read values written with the
+        # "zstd-dict" strategy, even if another strategy is used for writes.
+        if dictionary_codec is not None:
+            self.compression_strategies = {
+                **self.compression_strategies,
+                "zstd-dict": (self.Flags.COMPRESSED_ZSTD_DICT, dictionary_codec),
+            }
+
         if compression is not None and compression not in self.compression_strategies:
             raise ValueError(f'"compression" must be one of {self.compression_strategies.keys()!r}')
 
@@ -170,9 +182,31 @@ class BigtableKVStorage(KVStorage[str, bytes]):
         return value
 
     def set(self, key: str, value: bytes, ttl: Optional[timedelta] = None) -> None:
+        row = self.__make_row(self._get_table(), key, value, ttl)
+
+        status = row.commit()
+        if status.code != 0:
+            raise BigtableError(status.code, status.message)
+
+    def set_many(self, items: Sequence[Tuple[str, bytes]], ttl: Optional[timedelta] = None) -> None:
+        table = self._get_table()
+
+        rows = [self.__make_row(table, key, value, ttl) for key, value in items]
+
+        errors = []
+        for status in table.mutate_rows(rows):
+            if status.code != 0:
+                errors.append(BigtableError(status.code, status.message))
+
+        if errors:
+            raise BigtableError(errors)
+
+    def __make_row(
+        self, table: Table, key: str, value: bytes, ttl: Optional[timedelta] = None
+    ) -> DirectRow:
         # XXX: There is a type mismatch here -- ``direct_row`` expects
         # ``bytes`` but we are providing it with ``str``.
-        row = self._get_table().direct_row(key)
+        row = table.direct_row(key)
 
         # Call to delete is just a state mutation, and in this case is just
         # used to clear all columns so the entire row will be replaced.
@@ -230,9 +264,7 @@ class BigtableKVStorage(KVStorage[str, bytes]):
 
         row.set_cell(self.column_family, self.data_column, value, timestamp=ts)
 
-        status = row.commit()
-        if status.code != 0:
-            raise BigtableError(status.code, status.message)
+        return row
 
     def delete(self, key: str) -> None:
         # XXX: There is a type mismatch here -- ``direct_row`` expects
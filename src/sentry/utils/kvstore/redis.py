@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import Optional
+from typing import Optional, Sequence, Tuple
 
 from redis import Redis
 
@@ -21,6 +21,12 @@ class RedisKVStorage(KVStorage[str, bytes]):
     def set(self, key: str, value: bytes, ttl: Optional[timedelta] = None) -> None:
         self.client.set(key.encode("utf8"), value, ex=ttl)
 
+    def set_many(self, items: Sequence[Tuple[str, bytes]], ttl: Optional[timedelta] = None) -> None:
+        with self.client.pipeline(transaction=False) as pipeline:
+            for key, value in items:
+                pipeline.set(key.encode("utf8"), value, ex=ttl)
+            pipeline.execute()
+
     def delete(self, key: str) -> None:
         self.client.delete(key.encode("utf8"))
 
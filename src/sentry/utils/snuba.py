@@ -2,6 +2,7 @@ import functools
 import logging
 import os
 import re
+import threading
 import time
 from collections import OrderedDict, namedtuple
 from concurrent.futures import ThreadPoolExecutor
@@ -63,12 +64,45 @@ SPAN_OP_BREAKDOWNS_FIELD_RE = re.compile(r"^spans\.([a-zA-Z0-9-_.]+)$")
 # Matches span op breakdown snuba key
 SPAN_OP_BREAKDOWNS_KEY_RE = re.compile(r"^ops\.([a-zA-Z0-9-_.]+)$")
 
-# Global Snuba request option override dictionary. Only intended
-# to be used with the `options_override` contextmanager below.
-# NOT THREAD SAFE!
-OVERRIDE_OPTIONS = {
-    "consistent": os.environ.get("SENTRY_SNUBA_CONSISTENT", "false").lower() in ("true", "1")
-}
+
+class ThreadLocalOptions(MutableMapping):
+    """
+    Mapping of options that every thread modifies separately, starting from
+    the ``defaults``.
+    """
+
+    def __init__(self, defaults):
+        self.defaults = defaults
+        self.__local = threading.local()
+
+    @property
+    def __options(self):
+        options = getattr(self.__local, "options", None)
+        if options is None:
+            options = self.__local.options = dict(self.defaults)
+        return options
+
+    def __getitem__(self, key):
+        return self.__options[key]
+
+    def __setitem__(self, key, value):
+        self.__options[key] = value
+
+    def __delitem__(self, key):
+        del self.__options[key]
+
+    def __iter__(self):
+        return iter(self.__options)
+
+    def __len__(self):
+        return len(self.__options)
+
+
+# Snuba request option overrides of the current thread. Only intended to be
+# used with the `options_override` contextmanager below.
+OVERRIDE_OPTIONS = ThreadLocalOptions(
+    {"consistent": os.environ.get("SENTRY_SNUBA_CONSISTENT", "false").lower() in ("true", "1")}
+)
 
 # Show the snuba query params and the corresponding sql or errors in the server logs
 SNUBA_INFO = os.environ.get("SENTRY_SNUBA_INFO", "false").lower() in ("true", "1")
@@ -256,11 +290,9 @@ def timer(name, prefix="snuba.client"):
 @contextmanager
 def options_override(overrides):
     """\
-    NOT THREAD SAFE!
-
     Adds to OVERRIDE_OPTIONS, restoring previous values and removing
     keys that didn't previously exist on exit, so that calls to this
-    can be nested.
+    can be nested. Overrides only apply to the current thread.
     """
     previous = {}
     delete = []
@@ -1,6 +1,13 @@
 import copy
 
-from sentry.attachments.base import BaseAttachmentCache, CachedAttachment
+import pytest
+
+from sentry.attachments.base import (
+    STREAM_CHUNK_SIZE,
+    BaseAttachmentCache,
+    CachedAttachment,
+    MissingAttachmentChunks,
+)
 
 
 class InMemoryCache:
@@ -13,11 +20,16 @@ class InMemoryCache:
         self.data = {}
         #: Used to check for consistent usage of `raw` param
         self.raw_map = {}
+        self.get_many_calls = 0
 
     def get(self, key, raw=False):
         assert key not in self.raw_map or raw == self.raw_map[key]
         return copy.deepcopy(self.data.get(key))
 
+    def get_many(self, keys, raw=False):
+        self.get_many_calls += 1
+        return {key: self.get(key, raw=raw) for key in keys if key in self.data}
+
     def set(self, key, value, timeout=None, raw=False):
         # Attachment chunks MUST be bytestrings. Josh please don't change this
         # to unicode.
@@ -25,6 +37,10 @@ class InMemoryCache:
         assert key not in self.raw_map or raw == self.raw_map[key]
         self.data[key] = value
 
+    def set_many(self, items, timeout=None, raw=False):
+        for key, value in items:
+            self.set(key, value, timeout, raw=raw)
+
     def delete(self, key):
         del self.data[key]
 
@@ -110,3 +126,78 @@ def test_basic_rate_limited():
     assert att2.id == att.id == 0
     assert att2.data == att.data == b"Hello World! Bye."
     assert att2.rate_limited is True
+
+
+def test_streaming():
+    data = InMemoryCache()
+    cache = BaseAttachmentCache(data)
+
+    cache.set_chunk("c:foo", 123, 0, b"Hello World! ")
+    cache.set_chunk("c:foo", 123, 1, b"")
+    cache.set_chunk("c:foo", 123, 2, b"Bye.")
+
+    large = CachedAttachment(name="large.txt", data=b"x" * (STREAM_CHUNK_SIZE + 1))
+    cache.set("c:foo", [large, CachedAttachment(key="c:foo", id=123, name="lol.txt", chunks=3)])
+
+    large_att, att = cache.get("c:foo")
+
+    # Unchunked data is decompressed in pieces.
+    assert [len(chunk) for chunk in large_att.iter_chunks()] == [STREAM_CHUNK_SIZE, 1]
+
+    assert list(att.iter_chunks()) == [b"Hello World! ", b"Bye."]
+
+    f = att.open()
+    assert f.read(5) == b"Hello"
+    assert f.read(10) == b" World! By"
+    assert f.read() == b"e."
+    assert f.read(5) == b""
+
+
+def test_streaming_missing_chunks():
+    data = InMemoryCache()
+    cache = BaseAttachmentCache(data)
+
+    cache.set_chunk("c:foo", 123, 0, b"Hello World! ")
+
+    att = CachedAttachment(key="c:foo", id=123, name="lol.txt", chunks=2, cache=cache)
+
+    # Chunks are fetched lazily, so the error is raised while reading.
+    chunks = att.iter_chunks()
+    assert next(chunks) == b"Hello World! "
+    with pytest.raises(MissingAttachmentChunks):
+        next(chunks)
+
+
+def test_prefetch():
+    data = InMemoryCache()
+    cache = BaseAttachmentCache(data)
+
+    cache.set_chunks("c:foo", 123, enumerate([b"Hello World! ", b"", b"Bye."]))
+    cache.set_chunk("c:foo", 456, 0, b"Missing")
+
+    atts = [
+        CachedAttachment(key="c:foo", id=123, name="lol.txt", chunks=3, size=17),
+        CachedAttachment(key="c:foo", id=456, name="missing.txt", chunks=2, size=20),
+        CachedAttachment(key="c:foo", id=789, name="large.txt", chunks=1, size=100),
+        CachedAttachment(key="c:foo", id=1011, name="unknown.txt", chunks=1),
+        CachedAttachment(key="c:foo", id=1213, name="over.txt", chunks=1, size=20),
+    ]
+    cache.set("c:foo", atts)
+
+    att, missing, large, unknown, over = cache.get("c:foo")
+    cache.prefetch_data([att, missing, large, unknown, over], max_size=50, max_total_size=40)
+    assert data.get_many_calls == 1
+
+    # Prefetched chunks are not fetched again, even if they are gone.
+    data.data.clear()
+    assert att.data == b"Hello World! Bye."
+    with pytest.raises(MissingAttachmentChunks):
+        missing.data
+
+    # Attachments over the size limits, or of unknown size, are still read
+    # one chunk at a time.
+    assert large._prefetched_chunks is None
+    assert unknown._prefetched_chunks is None
+    assert over._prefetched_chunks is None
+    with pytest.raises(MissingAttachmentChunks):
+        large.data
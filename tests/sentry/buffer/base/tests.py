@@ -73,3 +73,46 @@ class BufferTest(TestCase):
         self.buf.process(Group, columns, filters, {"last_seen": the_date}, signal_only=True)
         group.refresh_from_db()
         assert group.times_seen == prev_times_seen
+
+    def test_process_batch_updates_existing_rows(self):
+        project = Project(id=1)
+        group1 = Group.objects.create(project=project)
+        group2 = Group.objects.create(project=project)
+        the_date = timezone.now() + timedelta(days=5)
+        self.buf.process_batch(
+            [
+                (Group, {"times_seen": 2}, {"id": group1.id}, {"last_seen": the_date}, None),
+                (Group, {"times_seen": 3}, {"id": group2.id}, {"last_seen": the_date}, None),
+            ]
+        )
+        group1_ = Group.objects.get(id=group1.id)
+        assert group1_.times_seen == group1.times_seen + 2
+        assert group1_.last_seen == the_date
+        assert group1_.score > group1.score
+        assert Group.objects.get(id=group2.id).times_seen == group2.times_seen + 3
+
+    def test_process_batch_creates_missing_rows(self):
+        group = Group.objects.create(project=Project(id=1))
+        self.buf.process_batch(
+            [
+                (Group, {"times_seen": 1}, {"id": group.id, "project_id": 1}, None, None),
+                (Group, {"times_seen": 1}, {"message": "foo bar", "project_id": 1}, None, None),
+            ]
+        )
+        assert Group.objects.get(id=group.id).times_seen == group.times_seen + 1
+        assert Group.objects.get(message="foo bar").times_seen == 2
+
+    @mock.patch("sentry.buffer.base.buffer_incr_complete")
+    def test_process_batch_sends_signal(self, buffer_incr_complete):
+        group = Group.objects.create(project=Project(id=1))
+        columns = {"times_seen": 1}
+        filters = {"id": group.id}
+        self.buf.process_batch([(Group, columns, filters, None, None)])
+        buffer_incr_complete.send_robust.assert_called_once_with(
+            model=Group,
+            columns=columns,
+            filters=filters,
+            extra=None,
+            created=False,
+            sender=Group,
+        )
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+from django.utils import timezone
+
+from sentry.buffer.redis import RedisBuffer
+from sentry.testutils.skips import requires_pytest_benchmark
+
+NOW = datetime(2017, 5, 3, 6, 6, 6, 123456, tzinfo=timezone.utc)
+
+# filters and extra values as written by ``_process_existing_aggregate``
+FILTERS = {"id": 1234567}
+EXTRA = {
+    "last_seen": NOW,
+    "data": {
+        "type": "error",
+        "metadata": {"type": "ZeroDivisionError", "value": "division by zero"},
+        "title": "ZeroDivisionError: division by zero",
+        "location": "app/views.py",
+        "last_received": 1493791566.123456,
+    },
+    "message": "ZeroDivisionError division by zero app/views.py",
+    "culprit": "app.views in index",
+    "level": 40,
+}
+
+
+@pytest.fixture
+def buf(request):
+    buf = RedisBuffer()
+    buf.pickle_writes = request.param == "pickle"
+    return buf
+
+
+def encode(buf):
+    return buf._encode_filters(FILTERS), [buf._encode_value(v) for v in EXTRA.values()]
+
+
+def decode(buf, filters, extra):
+    buf._decode_filters(filters)
+    for value in extra:
+        buf._decode_value(value)
+
+
+def as_bytes(value):
+    return value if isinstance(value, bytes) else value.encode("utf-8")
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("buf", ["pickle", "typed"], indirect=True)
+def test_benchmark_encode(buf, benchmark):
+    filters, extra = benchmark(encode, buf)
+    benchmark.extra_info["stored_bytes"] = len(filters) + sum(len(v) for v in extra)
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("buf", ["pickle", "typed"], indirect=True)
+def test_benchmark_decode(buf, benchmark):
+    filters, extra = encode(buf)
+    benchmark(decode, buf, as_bytes(filters), [as_bytes(v) for v in extra])
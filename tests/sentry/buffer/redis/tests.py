@@ -1,6 +1,7 @@
 import pickle
 from datetime import datetime
 
+import pytest
 from django.utils import timezone
 from django.utils.encoding import force_text
 
@@ -45,6 +46,52 @@ class RedisBufferTest(TestCase):
         client = self.buf.cluster.get_routing_client()
         assert client.zrange("b:p", 0, -1) == []
 
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_in_slices(self, process_incr):
+        self.buf.incr_batch_size = 2
+        self.buf.pending_slice_size = 2
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2, "baz": 3, "qux": 4, "quux": 5})
+        self.buf.process_pending()
+        assert process_incr.apply_async.mock_calls == [
+            mock.call(kwargs={"batch_keys": ["foo", "bar"]}),
+            mock.call(kwargs={"batch_keys": ["baz", "qux"]}),
+            mock.call(kwargs={"batch_keys": ["quux"]}),
+        ]
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == []
+
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_skips_new_keys(self, process_incr):
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2 ** 40})
+        self.buf.process_pending()
+        process_incr.apply_async.assert_called_once_with(kwargs={"batch_keys": ["foo"]})
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == [b"bar"]
+
+    def test_get_incr_batch_size(self):
+        buf = RedisBuffer(incr_batch_size=2, max_incr_batch_size=16, pending_backlog_threshold=100)
+        assert buf._get_incr_batch_size(0) == 2
+        assert buf._get_incr_batch_size(100) == 2
+        assert buf._get_incr_batch_size(101) == 4
+        assert buf._get_incr_batch_size(201) == 8
+        assert buf._get_incr_batch_size(10 ** 6) == 16
+
+        # without an upper bound the batch size is fixed
+        assert self.buf._get_incr_batch_size(10 ** 6) == self.buf.incr_batch_size
+
+    @mock.patch("sentry.buffer.redis.process_incr")
+    @mock.patch("sentry.buffer.redis.process_pending")
+    def test_process_pending_skips_empty_partitions(self, process_pending, process_incr):
+        self.buf.pending_partitions = 3
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p:1", {"foo": 1})
+
+        self.buf.process_pending()
+        process_pending.apply_async.assert_called_once_with(kwargs={"partition": 1})
+        assert not process_incr.apply_async.called
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.base.Buffer.process")
     def test_process_does_bubble_up_json(self, process):
@@ -86,6 +133,18 @@ class RedisBufferTest(TestCase):
         self.buf.process("foo")
         process.assert_called_once_with(Group, columns, filters, extra, signal_only)
 
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    @mock.patch("sentry.buffer.redis.process_incr", mock.Mock())
+    def test_incr_keeps_pending_score(self):
+        client = self.buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        with mock.patch("sentry.buffer.redis.time", return_value=1):
+            self.buf.incr(model, {"times_seen": 1}, {"pk": 1})
+        with mock.patch("sentry.buffer.redis.time", return_value=2):
+            self.buf.incr(model, {"times_seen": 1}, {"pk": 1})
+        assert client.zrange("b:p", 0, -1, withscores=True) == [(b"foo", 1.0)]
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.redis.process_incr", mock.Mock())
     def test_incr_saves_to_redis(self):
@@ -99,6 +158,45 @@ class RedisBufferTest(TestCase):
         result = client.hgetall("foo")
         # Force keys to strings
         result = {force_text(k): v for k, v in result.items()}
+        assert result == {
+            "e+foo": b'["s","bar"]',
+            "e+datetime": b'["d","1493791566.000000"]',
+            "f": b'{"pk":["i","1"],"datetime":["d","1493791566.000000"]}',
+            "i+times_seen": b"1",
+            "m": b"mock.mock.Mock",
+        }
+
+        pending = client.zrange("b:p", 0, -1)
+        assert pending == [b"foo"]
+        self.buf.incr(model, columns, filters, extra={"foo": "baz", "datetime": now})
+        result = client.hgetall("foo")
+        # Force keys to strings
+        result = {force_text(k): v for k, v in result.items()}
+        assert result == {
+            "e+foo": b'["s","baz"]',
+            "e+datetime": b'["d","1493791566.000000"]',
+            "f": b'{"pk":["i","1"],"datetime":["d","1493791566.000000"]}',
+            "i+times_seen": b"2",
+            "m": b"mock.mock.Mock",
+        }
+
+        pending = client.zrange("b:p", 0, -1)
+        assert pending == [b"foo"]
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    @mock.patch("sentry.buffer.redis.process_incr", mock.Mock())
+    def test_incr_saves_pickle_to_redis(self):
+        self.buf.pickle_writes = True
+        now = datetime(2017, 5, 3, 6, 6, 6, tzinfo=timezone.utc)
+        client = self.buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        columns = {"times_seen": 1}
+        filters = {"pk": 1, "datetime": now}
+        self.buf.incr(model, columns, filters, extra={"foo": "bar", "datetime": now})
+        result = client.hgetall("foo")
+        # Force keys to strings
+        result = {force_text(k): v for k, v in result.items()}
 
         f = result.pop("f")
         assert pickle.loads(f) == {"pk": 1, "datetime": now}
@@ -121,6 +219,101 @@ class RedisBufferTest(TestCase):
         pending = client.zrange("b:p", 0, -1)
         assert pending == [b"foo"]
 
+    def test_typed_encoding_roundtrip(self):
+        now = datetime(2017, 5, 3, 6, 6, 6, 123456, tzinfo=timezone.utc)
+        values = {
+            "none": None,
+            "str": "\u201d",
+            "datetime": now,
+            "bool": True,
+            "int": 2 ** 40,
+            "float": 0.1,
+            "dict": {"title": "foo", "last_received": 1.5, "tags": ["a", None]},
+        }
+        for value in values.values():
+            encoded = self.buf._encode_value(value)
+            assert encoded.startswith("[")
+            assert self.buf._decode_value(encoded.encode("utf-8")) == value
+
+        encoded = self.buf._encode_filters(values)
+        assert encoded.startswith("{")
+        assert self.buf._decode_filters(encoded.encode("utf-8")) == values
+
+    def test_typed_encoding_falls_back_to_pickle(self):
+        for value in ((1, 2), {1: "foo"}, {"foo": float("nan")}, Project(id=1)):
+            encoded = self.buf._encode_value(value)
+            assert isinstance(encoded, bytes)
+            decoded = self.buf._decode_value(encoded)
+            assert type(decoded) is type(value)
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    def test_incr_coalesces_in_memory(self):
+        buf = RedisBuffer(coalesce_max_size=3, coalesce_max_delay=60)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"pk": 1}
+
+        buf.incr(model, {"times_seen": 1}, filters, extra={"foo": "bar"})
+        buf.incr(model, {"times_seen": 2}, filters, extra={"foo": "baz"})
+        assert client.hgetall("foo") == {}
+        assert client.zrange("b:p", 0, -1) == []
+
+        # the third increment hits the size limit and flushes
+        buf.incr(model, {"times_seen": 3}, filters, signal_only=True)
+        result = {force_text(k): v for k, v in client.hgetall("foo").items()}
+        assert result == {
+            "e+foo": b'["s","baz"]',
+            "f": b'{"pk":["i","1"]}',
+            "i+times_seen": b"6",
+            "m": b"mock.mock.Mock",
+            "s": b"1",
+        }
+        assert client.zrange("b:p", 0, -1) == [b"foo"]
+        assert buf.coalescer.take() == ([], 0)
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    def test_flush_coalesced(self):
+        buf = RedisBuffer(coalesce_max_size=100, coalesce_max_delay=60)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+
+        buf.incr(model, {"times_seen": 1}, {"pk": 1})
+        buf.flush_coalesced(force=False)
+        assert client.hgetall("foo") == {}
+
+        buf.flush_coalesced()
+        result = {force_text(k): v for k, v in client.hgetall("foo").items()}
+        assert result["i+times_seen"] == b"1"
+        assert client.zrange("b:p", 0, -1) == [b"foo"]
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    def test_flush_coalesced_failure(self):
+        buf = RedisBuffer(coalesce_max_size=100, coalesce_max_delay=60)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+
+        buf.incr(model, {"times_seen": 1}, {"pk": 1}, extra={"foo": "bar"})
+        with mock.patch(
+            "redis.client.Pipeline.execute", side_effect=Exception("boom")
+        ), pytest.raises(Exception):
+            buf.flush_coalesced()
+        assert client.hgetall("foo") == {}
+
+        # the increments are retried by the next flush
+        buf.incr(model, {"times_seen": 2}, {"pk": 1}, extra={"foo": "baz"})
+        buf.flush_coalesced()
+        result = {force_text(k): v for k, v in client.hgetall("foo").items()}
+        assert result["i+times_seen"] == b"3"
+        assert result["e+foo"] == b'["s","baz"]'
+        assert buf.coalescer.take() == ([], 0)
+
+    def test_flush_coalesced_disabled(self):
+        assert self.buf.coalescer is None
+        self.buf.flush_coalesced()
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.redis.process_incr")
     @mock.patch("sentry.buffer.redis.process_pending")
@@ -167,6 +360,31 @@ class RedisBufferTest(TestCase):
         # Make sure we didn't queue up more
         assert len(process_pending.apply_async.mock_calls) == 2
 
+    @mock.patch("sentry.buffer.base.Buffer.process_batch")
+    def test_process_batch_flush(self, process_batch):
+        self.buf.batch_flush = True
+        client = self.buf.cluster.get_routing_client()
+        for key, pk in (("foo", "1"), ("bar", "2")):
+            client.hmset(
+                key,
+                {"f": '{"pk": ["i","%s"]}' % pk, "i+times_seen": "2", "m": "sentry.models.Group"},
+            )
+            client.zadd("b:p", {key: 1})
+        # a key that is locked by someone else is skipped
+        client.set("l:baz", "1")
+        client.hmset("baz", {"f": '{"pk": ["i","3"]}', "m": "sentry.models.Group"})
+
+        self.buf.process(batch_keys=["foo", "bar", "baz", "missing"])
+        process_batch.assert_called_once_with(
+            [
+                (Group, {"times_seen": 2}, {"pk": 1}, {}, None),
+                (Group, {"times_seen": 2}, {"pk": 2}, {}, None),
+            ]
+        )
+        assert client.exists("foo", "bar", "l:foo", "l:bar", "l:missing") == 0
+        assert client.exists("baz", "l:baz") == 2
+        assert client.zrange("b:p", 0, -1) == []
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.base.Buffer.process")
     def test_process_uses_signal_only(self, process):
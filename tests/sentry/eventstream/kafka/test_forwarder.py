@@ -0,0 +1,155 @@
+from collections import defaultdict
+
+from confluent_kafka import TopicPartition
+
+from sentry.eventstream.kafka.forwarder import ParallelPostProcessForwarder
+
+
+class FakeMessage:
+    def __init__(self, topic, partition, offset, value):
+        self.__topic = topic
+        self.__partition = partition
+        self.__offset = offset
+        self.__value = value
+
+    def topic(self):
+        return self.__topic
+
+    def partition(self):
+        return self.__partition
+
+    def offset(self):
+        return self.__offset
+
+    def value(self):
+        return self.__value
+
+    def timestamp(self):
+        return (0, -1)
+
+    def error(self):
+        return None
+
+
+class FakeConsumer:
+    """
+    Assigns all ``partitions`` on the first poll, returns ``messages`` and
+    then calls ``on_exhausted``.
+    """
+
+    def __init__(self, partitions, messages, on_exhausted, on_commit=None):
+        self.partitions = partitions
+        self.messages = list(messages)
+        self.on_exhausted = on_exhausted
+        self.on_commit = on_commit
+        self.commits = []
+        self.pending_commits = []
+        self.closed = False
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        self.on_assign = on_assign
+        self.on_revoke = on_revoke
+
+    def poll(self, timeout):
+        if self.partitions is not None:
+            self.on_assign(self, self.partitions)
+            self.partitions = None
+
+        # The callbacks of asynchronous commits are served by ``poll``.
+        while self.pending_commits:
+            self.on_commit(None, self.pending_commits.pop(0))
+
+        if not self.messages:
+            self.on_exhausted(self)
+            return None
+
+        return self.messages.pop(0)
+
+    def commit(self, offsets, asynchronous=True):
+        self.commits.append({(i.topic, i.partition): i.offset for i in offsets})
+        if asynchronous and self.on_commit is not None:
+            self.pending_commits.append(offsets)
+        return offsets
+
+    def close(self):
+        self.closed = True
+
+
+def test_parallel_forwarder():
+    messages = [FakeMessage("events", i % 2, i // 2, i) for i in range(100)]
+
+    processed = defaultdict(list)
+    batch_sizes = []
+
+    def process(batch):
+        batch_sizes.append(len(batch))
+        for message in batch:
+            processed[message.partition()].append(message.value())
+
+    forwarder = ParallelPostProcessForwarder(
+        None, "events", process, commit_batch_size=10, batch_size=7
+    )
+    forwarder.consumer = consumer = FakeConsumer(
+        [TopicPartition("events", 0), TopicPartition("events", 1)],
+        messages,
+        lambda consumer: forwarder.stop(),
+    )
+    forwarder.run()
+
+    # Messages are processed in order within each partition.
+    for partition in (0, 1):
+        assert processed[partition] == list(range(partition, 100, 2))
+    assert max(batch_sizes) <= 7
+
+    committed = {}
+    for offsets in consumer.commits:
+        committed.update(offsets)
+    assert committed == {("events", 0): 50, ("events", 1): 50}
+    assert consumer.closed
+
+
+def test_parallel_forwarder_revoke():
+    messages = [FakeMessage("events", 0, i, i) for i in range(5)]
+
+    processed = []
+
+    def on_exhausted(consumer):
+        if ("events", 0) in forwarder.workers:
+            consumer.on_revoke(consumer, [TopicPartition("events", 0)])
+        else:
+            forwarder.stop()
+
+    forwarder = ParallelPostProcessForwarder(
+        None, "events", lambda batch: processed.extend(batch), commit_batch_size=100
+    )
+    forwarder.consumer = consumer = FakeConsumer(
+        [TopicPartition("events", 0)], messages, on_exhausted
+    )
+    forwarder.run()
+
+    # All messages are processed and committed when the partition is revoked.
+    assert [message.value() for message in processed] == [0, 1, 2, 3, 4]
+    assert consumer.commits == [{("events", 0): 5}]
+    assert forwarder.offsets.get_offsets("events", 0) == (None, None)
+
+
+def test_parallel_forwarder_commit_interval():
+    messages = [FakeMessage("events", 0, i, i) for i in range(5)]
+
+    def on_exhausted(consumer):
+        if forwarder.committed_offsets.get(("events", 0)) == 5:
+            forwarder.stop()
+
+    forwarder = ParallelPostProcessForwarder(
+        None, "events", lambda batch: None, commit_batch_size=100, commit_interval=0
+    )
+    forwarder.consumer = consumer = FakeConsumer(
+        [TopicPartition("events", 0)], messages, on_exhausted, on_commit=forwarder.on_commit
+    )
+    forwarder.run()
+
+    # Offsets are committed while no messages are consumed, and are only
+    # recorded as committed once the commit has succeeded.
+    assert consumer.commits[-1] == {("events", 0): 5}
+    forwarder.on_commit(Exception("commit failed"), [TopicPartition("events", 0, 6)])
+    assert forwarder.committed_offsets == {("events", 0): 5}
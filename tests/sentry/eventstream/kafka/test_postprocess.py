@@ -0,0 +1,112 @@
+import pytest
+
+from sentry.eventstream.kafka.postprocess import PostProcessExecutor
+from sentry.utils.compat import mock
+
+
+def make_message(offset, value):
+    message = mock.Mock()
+    message.topic.return_value = "events"
+    message.partition.return_value = 0
+    message.offset.return_value = offset
+    message.key.return_value = b"1"
+    message.value.return_value = value
+    return message
+
+
+def get_task_kwargs_for_message(value):
+    if value is None:
+        return None
+
+    event = mock.Mock(project_id=1, event_id=value, group_id=2)
+    return {
+        "event": event,
+        "primary_hash": "acbd18db4cc2f85cedef654fccc4a4d8",
+        "is_new": True,
+        "is_regression": False,
+        "is_new_group_environment": True,
+    }
+
+
+@pytest.fixture
+def producer():
+    with mock.patch.object(
+        PostProcessExecutor, "producer", new_callable=mock.PropertyMock
+    ) as producer:
+        yield producer.return_value
+
+
+@pytest.fixture
+def processing_store():
+    with mock.patch("sentry.eventstream.kafka.postprocess.event_processing_store") as store:
+        store.get.side_effect = lambda cache_key: {
+            "project": 1,
+            "event_id": cache_key.split(":")[1],
+            "debug_meta": {"images": []},
+        }
+        yield store
+
+
+@pytest.fixture(autouse=True)
+def patch_get_task_kwargs(processing_store):
+    with mock.patch(
+        "sentry.eventstream.kafka.postprocess.get_task_kwargs_for_message",
+        get_task_kwargs_for_message,
+    ), mock.patch("sentry.eventstream.kafka.postprocess.close_old_connections"):
+        yield
+
+
+@mock.patch("sentry.eventstream.kafka.postprocess.post_process_event")
+def test_post_process(mock_post_process_event, producer):
+    executor = PostProcessExecutor(2)
+    executor([make_message(0, "a" * 32), make_message(1, None), make_message(2, "b" * 32)])
+    executor.shutdown()
+
+    assert sorted(call[0][4] for call in mock_post_process_event.call_args_list) == [
+        "e:{}:1".format("a" * 32),
+        "e:{}:1".format("b" * 32),
+    ]
+    assert not producer.produce.called
+
+    # The events are built from the processing store, not the pruned message.
+    event = mock_post_process_event.call_args_list[0][0][0]
+    assert event.group_id == 2
+    assert event.data["debug_meta"] == {"images": []}
+
+
+@mock.patch("sentry.eventstream.kafka.postprocess.post_process_event")
+def test_post_process_skips_processed_events(mock_post_process_event, producer, processing_store):
+    # The event has already been post-processed, before a restart for example.
+    processing_store.get.side_effect = None
+    processing_store.get.return_value = None
+
+    executor = PostProcessExecutor(1)
+    executor([make_message(0, "a" * 32)])
+    executor.shutdown()
+
+    processing_store.get.assert_called_once_with("e:{}:1".format("a" * 32))
+    assert not mock_post_process_event.called
+
+
+@mock.patch("sentry.eventstream.kafka.postprocess.post_process_event")
+def test_post_process_dead_letter(mock_post_process_event, producer):
+    mock_post_process_event.side_effect = Exception("boom")
+
+    executor = PostProcessExecutor(1, dead_letter_topic="events-dlq")
+    executor([make_message(5, "a" * 32)])
+
+    # Post-processing is not retried, as it is not idempotent.
+    assert mock_post_process_event.call_count == 1
+    producer.produce.assert_called_once_with(
+        "events-dlq",
+        key=b"1",
+        value="a" * 32,
+        headers={"partition": "0", "offset": "5", "topic": "events"},
+    )
+    producer.flush.assert_called_once_with()
+
+    # Without a dead letter topic, the error is raised.
+    executor = PostProcessExecutor(1)
+    with pytest.raises(Exception):
+        executor([make_message(6, "a" * 32)])
+    executor.shutdown()
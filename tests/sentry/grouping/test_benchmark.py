@@ -1,22 +1,16 @@
 import pytest
 
 from sentry.grouping.api import get_default_grouping_config_dict
+from sentry.grouping.component import GroupingComponent
+from sentry.grouping.enhancer import Enhancements
 from sentry.grouping.strategies.configurations import CONFIGURATIONS
+from sentry.testutils.skips import requires_pytest_benchmark
 from tests.sentry.grouping import grouping_input as grouping_inputs
 
 CONFIGS = {key: get_default_grouping_config_dict(key) for key in sorted(CONFIGURATIONS.keys())}
 
 
-def benchmark_available():
-    try:
-        import pytest_benchmark  # NOQA
-    except ModuleNotFoundError:
-        return False
-    else:
-        return True
-
-
-@pytest.mark.skipif(not benchmark_available(), reason="requires pytest-benchmark")
+@requires_pytest_benchmark
 @pytest.mark.parametrize(
     "config_name", sorted(CONFIGURATIONS.keys()), ids=lambda x: x.replace("-", "_")
 )
@@ -37,3 +31,43 @@ def run_configuration(grouping_input, config):
     event.project = None
 
     event.get_hashes()
+
+
+def make_enhancements(num_rules):
+    rules = []
+    for i in range(num_rules):
+        rules.append(
+            [
+                f"stack.module:com.example.service{i}.* +app",
+                f"stack.function:handle{i}              -group",
+                f"stack.abs_path:**/generated/Proxy{i}*.java -app",
+                f"family:native package:**/libservice{i}.so -app",
+            ][i % 4]
+        )
+    return Enhancements.from_config_string("\n".join(rules), bases=["common:v1"])
+
+
+def make_frames(depth):
+    return [
+        {
+            "function": f"handle{i}",
+            "module": f"com.example.service{i}.Handler",
+            "abs_path": f"/src/main/java/com/example/service{i}/Handler.java",
+            "in_app": i % 3 == 0,
+        }
+        for i in range(depth)
+    ]
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("num_rules", [10, 100, 1000])
+def test_benchmark_enhancements(num_rules, benchmark):
+    enhancements = make_enhancements(num_rules)
+    frames = make_frames(200)
+
+    def run():
+        enhancements.apply_modifications_to_frame(frames, "java", None)
+        components = [GroupingComponent(id="frame") for _ in frames]
+        enhancements.assemble_stacktrace_component(components, frames, "java")
+
+    benchmark(run)
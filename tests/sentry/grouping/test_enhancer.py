@@ -1,6 +1,7 @@
 import pytest
 
 from sentry.grouping.enhancer import Enhancements, InvalidEnhancerConfig, create_match_frame
+from sentry.grouping.enhancer.index import RuleIndex
 
 
 def dump_obj(obj):
@@ -400,3 +401,41 @@ def test_range_matching_direct():
         ],
         "python",
     )
+
+
+def test_rule_index():
+    enhancement = Enhancements.from_config_string(
+        """
+        function:foo                                +app
+        module:com.example.* function:*bar*         -app
+        path:**/vendor/*.js                         -app
+        !function:foo                               -group
+        [ function:foo ] | function:*               +group
+    """
+    )
+    match_frames = [
+        create_match_frame(frame, "java")
+        for frame in [
+            {"function": "foo", "module": "com.example.a"},
+            {"function": "foobar", "module": "com.example.b"},
+            {"function": "foobar", "module": "org.example"},
+            {"function": "main", "abs_path": "/app/Vendor/lib.js"},
+        ]
+    ]
+
+    index = RuleIndex(enhancement.rules)
+    assert index.get_candidate_frames(match_frames, {}) == [[0], [0, 1], [3], None, None]
+
+    # Candidates are only narrowed down, the results are the same.
+    for rule, frame_indices in zip(enhancement.rules, index.get_candidate_frames(match_frames, {})):
+        assert rule.get_matching_frame_actions(
+            match_frames, "java", cache={}, frame_indices=frame_indices
+        ) == rule.get_matching_frame_actions(match_frames, "java", cache={})
+
+
+def test_loads_cached():
+    dumped = Enhancements.from_config_string("function:foo +app", bases=["common:v1"]).dumps()
+
+    enhancement = Enhancements.loads_cached(dumped)
+    assert Enhancements.loads_cached(dumped) is enhancement
+    assert enhancement.dumps() == dumped
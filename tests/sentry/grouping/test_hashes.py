@@ -0,0 +1,64 @@
+import pytest
+
+from sentry import eventstore
+from sentry.grouping.api import get_default_grouping_config_dict, get_hashes_for_event
+from sentry.grouping.strategies.configurations import CONFIGURATIONS
+from sentry.testutils.helpers import override_options
+from sentry.utils.compat import mock
+from tests.sentry.grouping import with_grouping_input
+
+
+@with_grouping_input("grouping_input")
+@pytest.mark.parametrize("config_name", CONFIGURATIONS.keys(), ids=lambda x: x.replace("-", "_"))
+def test_cached_event_hashes(config_name, grouping_input):
+    grouping_config = get_default_grouping_config_dict(config_name)
+    evt = grouping_input.create_event(grouping_config)
+    evt.project = None
+
+    expected = evt.get_hashes(grouping_config)
+    assert get_hashes_for_event(evt, grouping_config) == expected
+
+    # Another event with the same data gets the hashes from the cache.
+    other = grouping_input.create_event(grouping_config)
+    other.project = None
+    with mock.patch.object(other, "get_hashes") as get_hashes:
+        assert get_hashes_for_event(other, grouping_config) == expected
+    assert not get_hashes.called
+
+
+def test_cached_event_hashes_inputs():
+    grouping_config = get_default_grouping_config_dict()
+
+    def create_event(**data):
+        data.setdefault("platform", "python")
+        data.setdefault("exception", {"values": [{"type": "ValueError", "value": "bad"}]})
+        evt = eventstore.create_event(data=data)
+        evt.project = None
+        return evt
+
+    events = [
+        create_event(),
+        create_event(exception={"values": [{"type": "KeyError", "value": "bad"}]}),
+        create_event(fingerprint=["{{ default }}", "foo"]),
+        create_event(fingerprint=["{{ tags.server_name }}"], tags=[["server_name", "a"]]),
+        create_event(fingerprint=["{{ tags.server_name }}"], tags=[["server_name", "b"]]),
+        create_event(checksum="a" * 32),
+    ]
+
+    hashes = [evt.get_hashes(grouping_config) for evt in events]
+    assert len({str(h) for h in hashes}) == len(events)
+
+    for evt, expected in zip(events, hashes):
+        assert get_hashes_for_event(evt, grouping_config) == expected
+        assert get_hashes_for_event(evt, grouping_config) == expected
+
+    # Irrelevant data does not affect the digest.
+    evt = create_event(extra={"foo": "bar"}, tags=[["server_name", "c"]])
+    with mock.patch.object(evt, "get_hashes") as get_hashes:
+        assert get_hashes_for_event(evt, grouping_config) == hashes[0]
+    assert not get_hashes.called
+
+    with override_options({"store.grouping-hash-cache-enabled": False}):
+        evt = create_event()
+        with mock.patch.object(evt, "get_hashes", return_value=([], [])):
+            assert get_hashes_for_event(evt, grouping_config) == ([], [])
@@ -0,0 +1,21 @@
+from sentry.grouping.utils import ParsedConfigCache
+from sentry.utils.compat import mock
+
+
+def test_parsed_config_cache():
+    cache = ParsedConfigCache("test", max_size=2)
+    load = mock.Mock(side_effect=lambda: object())
+
+    a = cache.get_or_load("a", load)
+    assert cache.get_or_load("a", load) is a
+    assert load.call_count == 1
+
+    b = cache.get_or_load("b", load)
+    cache.get_or_load("a", load)
+    cache.get_or_load("c", load)
+    assert load.call_count == 3
+
+    # The least recently used config is evicted.
+    assert cache.get_or_load("a", load) is a
+    assert cache.get_or_load("b", load) is not b
+    assert load.call_count == 4
@@ -1,5 +1,6 @@
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
@@ -7,11 +8,15 @@ from sentry.event_manager import EventManager
 from sentry.ingest.ingest_consumer import (
     process_attachment_chunk,
     process_event,
+    process_event_batch,
+    process_event_batch_staged,
     process_individual_attachment,
     process_userreport,
 )
 from sentry.models import EventAttachment, EventUser, File, UserReport
+from sentry.testutils.helpers import override_options
 from sentry.utils import json
+from sentry.utils.compat import mock
 
 
 def get_normalized_event(data, project):
@@ -60,6 +65,168 @@ def test_deduplication_works(default_project, task_runner, preprocess_event):
     }
 
 
+@pytest.mark.django_db
+def test_batch_deduplication_works(default_project, task_runner, preprocess_event):
+    payloads = [
+        get_normalized_event({"message": f"hello world {i}"}, default_project) for i in range(3)
+    ]
+    project_id = default_project.id
+    start_time = time.time() - 3600
+
+    def make_message(payload):
+        return {
+            "payload": json.dumps(payload),
+            "start_time": start_time,
+            "event_id": payload["event_id"],
+            "project_id": project_id,
+            "remote_addr": "127.0.0.1",
+        }
+
+    # The second event is contained in the first batch twice, and the first
+    # event is processed again in the second batch.
+    process_event_batch(
+        [make_message(payloads[0]), make_message(payloads[1]), make_message(payloads[1])],
+        projects={default_project.id: default_project},
+    )
+    process_event_batch(
+        [make_message(payloads[0]), make_message(payloads[2])],
+        projects={default_project.id: default_project},
+    )
+
+    assert [kwargs["cache_key"] for kwargs in preprocess_event] == [
+        f"e:{payload['event_id']}:{project_id}" for payload in payloads
+    ]
+    assert [kwargs["data"] for kwargs in preprocess_event] == payloads
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("staged", [False, True])
+def test_batch_deduplication_after_failure(default_project, task_runner, monkeypatch, staged):
+    payloads = [
+        get_normalized_event({"message": f"hello world {i}"}, default_project) for i in range(3)
+    ]
+    start_time = time.time() - 3600
+    messages = [
+        {
+            "payload": json.dumps(payload),
+            "start_time": start_time,
+            "event_id": payload["event_id"],
+            "project_id": default_project.id,
+            "remote_addr": "127.0.0.1",
+        }
+        for payload in payloads
+    ]
+
+    dispatched = []
+
+    def preprocess_event(**kwargs):
+        dispatched.append(kwargs["event_id"])
+        if len(dispatched) == 2:
+            raise ValueError("preprocess_event failed")
+
+    monkeypatch.setattr("sentry.ingest.ingest_consumer.preprocess_event", preprocess_event)
+
+    def process(messages):
+        if not staged:
+            return process_event_batch(messages, projects={default_project.id: default_project})
+
+        with ThreadPoolExecutor(2) as decode_executor, ThreadPoolExecutor(2) as storage_executor:
+            process_event_batch_staged(
+                messages,
+                projects={default_project.id: default_project},
+                decode_executor=decode_executor,
+                storage_executor=storage_executor,
+                chunk_size=1,
+            )
+
+    with pytest.raises(ValueError):
+        process(messages)
+    process(messages)
+
+    # The first event was marked as processed before the failure, so it is
+    # not dispatched again when the batch is retried.
+    event_ids = [payload["event_id"] for payload in payloads]
+    assert dispatched == [event_ids[0], event_ids[1], event_ids[1], event_ids[2]]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("chunk_size", [1, 2, 10])
+def test_staged_processing_preserves_order(
+    default_project, task_runner, preprocess_event, chunk_size
+):
+    payloads = [
+        get_normalized_event({"message": f"hello world {i}"}, default_project) for i in range(5)
+    ]
+    project_id = default_project.id
+    start_time = time.time() - 3600
+
+    messages = [
+        {
+            "payload": json.dumps(payload),
+            "start_time": start_time,
+            "event_id": payload["event_id"],
+            "project_id": project_id,
+            "remote_addr": "127.0.0.1",
+        }
+        for payload in payloads
+    ]
+
+    # Decoding in threads behaves the same, and avoids forking the test runner.
+    with ThreadPoolExecutor(2) as decode_executor, ThreadPoolExecutor(2) as storage_executor:
+        for _ in range(2):
+            process_event_batch_staged(
+                messages + messages[:1],
+                projects={default_project.id: default_project},
+                decode_executor=decode_executor,
+                storage_executor=storage_executor,
+                chunk_size=chunk_size,
+            )
+
+    assert [kwargs["cache_key"] for kwargs in preprocess_event] == [
+        f"e:{payload['event_id']}:{project_id}" for payload in payloads
+    ]
+    assert [kwargs["data"] for kwargs in preprocess_event] == payloads
+
+
+@pytest.mark.django_db
+def test_admission_control(default_project, task_runner, preprocess_event):
+    payloads = [
+        get_normalized_event({"message": f"hello world {i}"}, default_project) for i in range(3)
+    ]
+    messages = [
+        {
+            "payload": json.dumps(payload),
+            "start_time": time.time() - 3600,
+            "event_id": payload["event_id"],
+            "project_id": default_project.id,
+            "remote_addr": "127.0.0.1",
+        }
+        for payload in payloads
+    ]
+
+    admission = mock.Mock()
+    admission.admit.side_effect = [True, False, True]
+
+    process_event_batch(
+        messages, projects={default_project.id: default_project}, admission=admission
+    )
+
+    assert [kwargs["data"] for kwargs in preprocess_event] == [payloads[0], payloads[2]]
+    assert admission.record_dispatch.call_count == 2
+
+    # Killswitches take precedence over admission control.
+    for killswitch in (
+        "store.load-shed-pipeline-projects",
+        "store.load-shed-parsed-pipeline-projects",
+    ):
+        with override_options({killswitch: [{"project_id": str(default_project.id)}]}):
+            process_event_batch(
+                [messages[1]], projects={default_project.id: default_project}, admission=admission
+            )
+
+    assert admission.admit.call_count == 3
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize("missing_chunks", (True, False))
 def test_with_attachments(default_project, task_runner, missing_chunks, monkeypatch):
@@ -0,0 +1,94 @@
+import pytest
+
+from sentry.constants import DataCategory
+from sentry.ingest.admission import AdmissionController, get_fair_share
+from sentry.testutils.helpers import override_options
+from sentry.utils.compat import mock
+from sentry.utils.outcomes import Outcome
+
+
+def test_fair_share():
+    assert get_fair_share([0.5, 0.3, 0.2], 1.0) == float("inf")
+    assert get_fair_share([0.5, 0.3, 0.2], 0.8) == pytest.approx(0.3)
+    assert get_fair_share([0.5, 0.3, 0.2], 0.3) == pytest.approx(0.1)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_message(clock, size):
+    return {"event_id": "a" * 32, "start_time": clock.now, "payload": b"x" * size}
+
+
+@mock.patch("sentry.ingest.admission.track_outcome")
+def test_sheds_heaviest_project(mock_track_outcome):
+    clock = Clock()
+    queue_size = 0
+    controller = AdmissionController(
+        clock=clock, get_queue_sizes=lambda queues: [("events.save_event", queue_size)]
+    )
+
+    heavy = mock.Mock(id=1, organization_id=1)
+    light = mock.Mock(id=2, organization_id=2)
+
+    def run(seconds):
+        admitted = {heavy.id: 0, light.id: 0}
+        for _ in range(seconds * 10):
+            clock.now += 0.1
+            for project, size in [(heavy, 1000)] * 9 + [(light, 100)]:
+                data = {"type": "transaction" if project is heavy else "error"}
+                if controller.admit(make_message(clock, size), project, data):
+                    admitted[project.id] += 1
+                    controller.record_dispatch(project, 0.01)
+        return admitted
+
+    with override_options(
+        {
+            "store.admission-control-enabled": True,
+            "store.admission-control-queue-threshold": 100,
+        }
+    ):
+        # Nothing is shed without pressure.
+        assert run(30) == {heavy.id: 2700, light.id: 300}
+        assert not controller.budgets
+        assert not mock_track_outcome.called
+
+        # Twice the threshold halves the load, only by shedding events of the
+        # heaviest project.
+        queue_size = 200
+        run(5)
+        assert controller.pressure == 2.0
+        assert set(controller.budgets) == {heavy.id}
+
+        admitted = run(30)
+        assert admitted[light.id] == 300
+        assert 0.3 < admitted[heavy.id] / 2700 < 0.6
+
+        shed = 2700 - admitted[heavy.id]
+        assert mock_track_outcome.call_count >= shed
+        assert mock_track_outcome.call_args[1]["outcome"] == Outcome.RATE_LIMITED
+        assert mock_track_outcome.call_args[1]["project_id"] == heavy.id
+        assert mock_track_outcome.call_args[1]["category"] == DataCategory.TRANSACTION
+
+        # Budgets are lifted once the pressure is gone.
+        queue_size = 0
+        run(5)
+        assert not controller.budgets
+
+
+def test_disabled():
+    controller = AdmissionController(
+        get_queue_sizes=lambda queues: [("events.save_event", 10 ** 9)]
+    )
+    project = mock.Mock(id=1, organization_id=1)
+
+    for _ in range(100):
+        assert controller.admit(
+            {"start_time": 0, "payload": b"", "event_id": "a" * 32}, project, {}
+        )
+    assert not controller.loads
@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from sentry.constants import DATA_ROOT
+from sentry.ingest.decoding import decode_payloads
+from sentry.ingest.ingest_consumer import STAGE_CHUNK_SIZE
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils import json
+from sentry.utils.iterators import chunked
+
+SAMPLES_ROOT = os.path.join(DATA_ROOT, "samples")
+
+
+def load_payloads():
+    payloads = []
+    for filename in sorted(os.listdir(SAMPLES_ROOT)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(SAMPLES_ROOT, filename), "rb") as f:
+            try:
+                payloads.append(json.dumps(json.loads(f.read())).encode("utf-8"))
+            except ValueError:
+                continue
+    return payloads * (1000 // len(payloads))
+
+
+@pytest.fixture(scope="module")
+def payloads():
+    return load_payloads()
+
+
+@pytest.fixture(scope="module")
+def decode_executor():
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as executor:
+        yield executor
+
+
+def decode_inline(payloads):
+    return [json.loads(payload) for payload in payloads]
+
+
+def decode_staged(payloads, executor):
+    futures = [
+        executor.submit(decode_payloads, chunk) for chunk in chunked(payloads, STAGE_CHUNK_SIZE)
+    ]
+    return [data for future in futures for data in future.result()[0]]
+
+
+def test_decode_staged(payloads, decode_executor):
+    assert decode_staged(payloads, decode_executor) == decode_inline(payloads)
+
+
+@requires_pytest_benchmark
+def test_benchmark_decode_inline(payloads, benchmark):
+    benchmark(decode_inline, payloads)
+
+
+@requires_pytest_benchmark
+def test_benchmark_decode_staged(payloads, decode_executor, benchmark):
+    # Warm up the worker processes, which import sentry.ingest.decoding.
+    decode_staged(payloads, decode_executor)
+    benchmark(decode_staged, payloads, decode_executor)
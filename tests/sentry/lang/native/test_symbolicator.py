@@ -1,9 +1,15 @@
 import copy
+from email.parser import BytesParser
 
 import pytest
 
+from sentry.attachments.base import CachedAttachment
 from sentry.lang.native import symbolicator
-from sentry.lang.native.symbolicator import get_sources_for_project, redact_internal_sources
+from sentry.lang.native.symbolicator import (
+    MultipartBody,
+    get_sources_for_project,
+    redact_internal_sources,
+)
 from sentry.testutils.helpers import Feature
 from sentry.utils.compat import map
 
@@ -265,3 +271,28 @@ class TestAliasReversion:
         reverse_aliases = symbolicator.reverse_aliases_map(builtin_sources)
         expected = {"sentry:ios-source": "sentry:ios", "sentry:tvos-source": "sentry:ios"}
         assert reverse_aliases == expected
+
+
+def test_multipart_body():
+    minidump = CachedAttachment(type="event.minidump", data=b"MDMP\x00\r\n--\x01")
+    body = MultipartBody(
+        fields={"sources": "[]", "options": '{"dif_candidates":true}'},
+        files={"upload_file_minidump": minidump},
+    )
+
+    # The body can be iterated again to retry requests.
+    assert b"".join(body) == b"".join(body)
+
+    message = BytesParser().parsebytes(
+        b"Content-Type: " + body.content_type.encode() + b"\r\n\r\n" + b"".join(body)
+    )
+    parts = message.get_payload()
+    assert [part.get_param("name", header="content-disposition") for part in parts] == [
+        "sources",
+        "options",
+        "upload_file_minidump",
+    ]
+    assert parts[0].get_payload(decode=True) == b"[]"
+    assert parts[1].get_payload(decode=True) == b'{"dif_candidates":true}'
+    assert parts[2].get_filename() == "upload_file_minidump"
+    assert parts[2].get_payload(decode=True) == b"MDMP\x00\r\n--\x01"
@@ -2,11 +2,13 @@ import pickle
 from datetime import timedelta
 
 import pytest
+import zstandard
 from django.utils import timezone
 
-from sentry.nodestore.base import json_dumps
+from sentry.nodestore.base import NodeCache, json_dumps
 from sentry.nodestore.django.backend import DjangoNodeStorage
 from sentry.nodestore.django.models import Node
+from sentry.testutils.helpers import override_options
 from sentry.utils.compat import mock
 from sentry.utils.strings import compress
 
@@ -132,3 +134,111 @@ class TestDjangoNodeStorage:
             self.ns.get("node_4")
             self.ns.get("node_4")
             assert mock_get.call_count == 2
+
+    def test_lru_cache(self):
+        node_1 = ("a" * 32, {"foo": "a"})
+        node_2 = ("b" * 32, {"foo": "b"})
+        node_3 = ("c" * 32, {"foo": "c"})
+
+        for node_id, data in [node_1, node_2, node_3]:
+            Node.objects.create(id=node_id, data=compress(json_dumps(data).encode("utf8")))
+
+        with override_options({"nodedata.lru-cache-size": 1024}), mock.patch.object(
+            DjangoNodeStorage, "cache", None
+        ):
+            assert self.ns.get(node_1[0]) == node_1[1]
+            assert self.ns.lru_cache.size == len(b'{"foo":"a"}')
+
+            # Only the misses are fetched, in a single query
+            with mock.patch.object(
+                self.ns, "_get_bytes_multi", wraps=self.ns._get_bytes_multi
+            ) as get_bytes_multi:
+                assert self.ns.get_multi([node_1[0], node_2[0], node_3[0]]) == {
+                    node_1[0]: node_1[1],
+                    node_2[0]: node_2[1],
+                    node_3[0]: node_3[1],
+                }
+                get_bytes_multi.assert_called_once_with([node_2[0], node_3[0]])
+
+            with mock.patch.object(Node.objects, "filter") as mock_filter:
+                assert self.ns.get_multi([node_1[0], node_2[0], node_3[0]])
+                assert mock_filter.call_count == 0
+
+            # Returned payloads are copies
+            self.ns.get(node_1[0])["foo"] = "x"
+            assert self.ns.get(node_1[0]) == node_1[1]
+
+            self.ns.delete(node_1[0])
+            assert self.ns.get(node_1[0]) is None
+
+            new_value = {"event_id": "d" * 32}
+            self.ns.set(node_1[0], new_value)
+            with mock.patch.object(Node.objects, "get") as mock_get:
+                assert self.ns.get(node_1[0]) == new_value
+                assert mock_get.call_count == 0
+
+    def test_zstd_dict_compression(self, tmpdir):
+        samples = [json_dumps({"platform": "python", "id": i}).encode("utf8") for i in range(1000)]
+        path = tmpdir.join("python.dict")
+        path.write_binary(zstandard.train_dictionary(1024, samples).as_bytes())
+
+        old_node_id = "d2502ebbd7df41ceba8d3275595cac33"
+        node_id = "5394aa025b8e401ca6bc3ddee3130edc"
+        ns = DjangoNodeStorage(
+            compression="zstd-dict", compression_dictionaries={"python": str(path)}
+        )
+
+        with mock.patch.object(DjangoNodeStorage, "cache", None):
+            self.ns.set(old_node_id, {"platform": "python", "id": 1})
+            ns.set(node_id, {"platform": "python", "id": 2})
+            assert Node.objects.get(id=node_id).data.startswith("zd:")
+
+            # nodes written before and after enabling dictionaries can be read
+            assert ns.get_multi([old_node_id, node_id]) == {
+                old_node_id: {"platform": "python", "id": 1},
+                node_id: {"platform": "python", "id": 2},
+            }
+
+            # and the dictionaries are needed to read them
+            with pytest.raises(ValueError):
+                self.ns.get(node_id)
+
+
+def test_node_cache_evicts_by_size():
+    cache = NodeCache(max_size=10, ttl=60)
+    cache.set_many({"a": ({"foo": "a"}, 4), "b": ({"foo": "b"}, 4)})
+    assert cache.get_many(["a"]) == {"a": {"foo": "a"}}
+
+    # "b" is the least recently used item
+    cache.set_many({"c": ({"foo": "c"}, 4)})
+    assert cache.get_many(["a", "b", "c"]) == {"a": {"foo": "a"}, "c": {"foo": "c"}}
+    assert cache.size == 8
+
+    # items larger than the cache are not stored
+    cache.set_many({"d": ({"foo": "d"}, 11)})
+    assert cache.get_many(["d"]) == {}
+
+    cache.delete_many(["a", "c"])
+    assert cache.size == 0
+    assert cache.get_many(["a", "c"]) == {}
+
+
+def test_node_cache_estimates_size():
+    cache = NodeCache(max_size=100, ttl=60)
+    value = {"foo": ["a", {"bar": None}], "baz": 1}
+    cache.set_many({"a": (value, None)})
+    assert cache.size == pytest.approx(len(json_dumps(value)), rel=0.2)
+    assert cache.get_many(["a"]) == {"a": value}
+
+
+def test_node_cache_expires():
+    cache = NodeCache(max_size=10, ttl=60)
+    with mock.patch("time.monotonic", return_value=1000):
+        cache.set_many({"a": ({"foo": "a"}, 4)})
+
+    with mock.patch("time.monotonic", return_value=1059):
+        assert cache.get_many(["a"]) == {"a": {"foo": "a"}}
+
+    with mock.patch("time.monotonic", return_value=1060):
+        assert cache.get_many(["a"]) == {}
+    assert cache.size == 0
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from sentry.constants import DATA_ROOT
+from sentry.nodestore.base import json_dumps
+from sentry.nodestore.compression import select_platform, train_dictionary
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils import json
+from sentry.utils.codecs import ZlibCodec, ZstdCodec, ZstdDictCodec
+
+SAMPLES_ROOT = os.path.join(DATA_ROOT, "samples")
+
+
+def load_corpus():
+    corpus = []
+    for filename in sorted(os.listdir(SAMPLES_ROOT)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(SAMPLES_ROOT, filename), "rb") as f:
+            try:
+                data = json.loads(f.read())
+            except ValueError:
+                continue
+        # encoded like nodestore encodes nodes
+        corpus.append(json_dumps(data).encode("utf8"))
+    return corpus
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return load_corpus()
+
+
+@pytest.fixture
+def codec(request, corpus):
+    if request.param == "zlib":
+        return ZlibCodec()
+    elif request.param == "zstd":
+        return ZstdCodec()
+    # The corpus is too small to train a dictionary per platform.
+    return ZstdDictCodec(
+        {"default": train_dictionary(corpus, 16384)}, default="default", select=select_platform
+    )
+
+
+def encode(codec, corpus):
+    return [codec.encode(value) for value in corpus]
+
+
+def decode(codec, encoded):
+    for value in encoded:
+        codec.decode(value)
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("codec", ["zlib", "zstd", "zstd-dict"], indirect=True)
+def test_benchmark_encode(codec, corpus, benchmark):
+    encoded = benchmark(encode, codec, corpus)
+    benchmark.extra_info["raw_bytes"] = sum(len(value) for value in corpus)
+    benchmark.extra_info["stored_bytes"] = sum(len(value) for value in encoded)
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("codec", ["zlib", "zstd", "zstd-dict"], indirect=True)
+def test_benchmark_decode(codec, corpus, benchmark):
+    benchmark(decode, codec, encode(codec, corpus))
@@ -97,3 +97,22 @@ def test_set_subkeys(ns):
     ns.delete("node_1")
     assert ns.get("node_1") is None
     assert ns.get("node_1", subkey="other") is None
+
+
+def test_set_multi(ns):
+    ns.set("node_1", {"foo": "x"})
+
+    ns.set_multi({"node_1": {"foo": "a"}, "node_2": {"foo": "b"}})
+    assert ns.get_multi(["node_1", "node_2"]) == {"node_1": {"foo": "a"}, "node_2": {"foo": "b"}}
+
+    ns.set_subkeys_multi(
+        {
+            "node_1": {None: {"foo": "c"}, "other": {"foo": "d"}},
+            "node_3": {None: {"foo": "e"}},
+        }
+    )
+    assert ns.get("node_1") == {"foo": "c"}
+    assert ns.get("node_1", subkey="other") == {"foo": "d"}
+    assert ns.get("node_2") == {"foo": "b"}
+    assert ns.get("node_3") == {"foo": "e"}
+    assert ns.get("node_3", subkey="other") is None
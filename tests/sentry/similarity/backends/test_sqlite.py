@@ -0,0 +1,102 @@
+import time
+
+import msgpack
+import pytest
+from exam import fixture
+
+from sentry.similarity.backends.sqlite import SQLiteMinHashIndexBackend
+from sentry.similarity.signatures import MinHashSignatureBuilder
+from sentry.testutils import TestCase
+from sentry.testutils.skips import requires_pytest_benchmark
+
+from .base import MinHashIndexBackendTestMixin
+
+signature_builder = MinHashSignatureBuilder(32, 0xFFFF)
+
+
+class SQLiteMinHashIndexBackendTestCase(MinHashIndexBackendTestMixin, TestCase):
+    @fixture
+    def index(self):
+        return SQLiteMinHashIndexBackend(":memory:", "sim", signature_builder, 16, 60 * 60, 12, 10)
+
+    def test_export_import(self):
+        self.index.record("example", "1", [("index", "hello world")])
+
+        timestamp = int(time.time())
+        result = self.index.export("example", [("index", 1)], timestamp=timestamp)
+        assert len(result) == 1
+
+        # Copy the data from key 1 to key 2.
+        self.index.import_("example", [("index", 2, result[0])], timestamp=timestamp)
+
+        r1 = msgpack.unpackb(self.index.export("example", [("index", 1)], timestamp=timestamp)[0])
+        r2 = msgpack.unpackb(self.index.export("example", [("index", 2)], timestamp=timestamp)[0])
+        assert r1 == r2
+
+        # Copy the data again to key 2 (duplicating all of the data.)
+        self.index.import_("example", [("index", 2, result[0])], timestamp=timestamp)
+
+        r2 = msgpack.unpackb(self.index.export("example", [("index", 2)], timestamp=timestamp)[0])
+        assert [{bucket: count for bucket, (count, _) in band.items()} for band in r2[0]] == [
+            {bucket: count * 2 for bucket, (count, _) in band.items()} for band in r1[0]
+        ]
+
+        assert self.index.export("example", [("index", 3)], timestamp=timestamp) == [
+            msgpack.packb([])
+        ]
+
+    def test_retention(self):
+        timestamp = 60 * 60 * 1000
+        self.index.record("example", "1", [("index", "hello world")], timestamp=timestamp)
+        self.index.record("example", "2", [("index", "hello world")], timestamp=timestamp)
+
+        expired = timestamp + 60 * 60 * 13
+        assert (
+            self.index.classify("example", [("index", 0, "hello world")], timestamp=expired) == []
+        )
+
+        # Recording the key again does not add to the expired counts.
+        self.index.record("example", "1", [("index", "hello world")], timestamp=expired)
+        self.index.record("example", "2", [("index", "jello world")], timestamp=expired)
+        [data] = self.index.export("example", [("index", "1")], timestamp=expired)
+        assert {count for band in msgpack.unpackb(data)[0] for count, _ in band.values()} == {1}
+        results = self.index.classify("example", [("index", 0, "hello world")], timestamp=expired)
+        assert results[0] == ("1", [1.0])
+
+        self.index.expire(timestamp=expired)
+        assert list(self.index.scan("*", ["index"])) == [
+            ("index", [("example", "1"), ("example", "2")])
+        ]
+
+    def test_scan(self):
+        for key in range(5):
+            self.index.record("example", f"{key}", [("index", "hello world")])
+        self.index.record("other", "5", [("index", "hello world")])
+
+        assert list(self.index.scan("example", ["index"], batch=2)) == [
+            ("index", [("example", "0"), ("example", "1")]),
+            ("index", [("example", "2"), ("example", "3")]),
+            ("index", [("example", "4")]),
+        ]
+        assert [len(chunk) for _, chunk in self.index.scan("*", ["index"], batch=3)] == [3, 3, 0]
+
+        self.index.flush("example", ["index"], batch=2)
+        assert list(self.index.scan("*", ["index"])) == [("index", [("other", "5")])]
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("num_keys", [1000, 10000])
+def test_benchmark_classify(num_keys, tmpdir, benchmark):
+    index = SQLiteMinHashIndexBackend(
+        str(tmpdir.join("similarity.sqlite3")),
+        "sim",
+        MinHashSignatureBuilder(16, 0xFFFF),
+        8,
+        60 * 60 * 24 * 30,
+        3,
+        5000,
+    )
+    for key in range(num_keys):
+        index.record("example", f"{key}", [("index", f"error message {key % 100}")])
+
+    benchmark(index.classify, "example", [("index", 0, "error message 1")])
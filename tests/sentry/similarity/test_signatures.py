@@ -1,15 +1,21 @@
 from collections import Counter
 from unittest import TestCase
 
-from sentry.similarity.signatures import MinHashSignatureBuilder
-from sentry.utils.compat import map, zip
+import pytest
+
+from sentry.similarity import signatures
+from sentry.similarity.signatures import MinHashSignatureBuilder, UniversalMinHashSignatureBuilder
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils.compat import map, mock, zip
 
 
 class MinHashSignatureBuilderTestCase(TestCase):
+    signature_builder = MinHashSignatureBuilder
+
     def test_signatures(self):
         n = 32
         r = 0xFFFF
-        get_signature = MinHashSignatureBuilder(n, r)
+        get_signature = self.signature_builder(n, r)
         get_signature({"foo", "bar", "baz"}) == get_signature({"foo", "bar", "baz"})
 
         assert len(get_signature("hello world")) == n
@@ -29,3 +35,27 @@ class MinHashSignatureBuilderTestCase(TestCase):
         self.assertAlmostEqual(
             similarity, estimation, delta=0.1  # totally made up constant, seems reasonable
         )
+
+
+class UniversalMinHashSignatureBuilderTestCase(MinHashSignatureBuilderTestCase):
+    signature_builder = UniversalMinHashSignatureBuilder
+
+    def test_without_numpy(self):
+        features = [f"feature-{i}".encode() for i in range(100)]
+        expected = UniversalMinHashSignatureBuilder(16, 0xFFFF)(features)
+
+        with mock.patch.object(signatures, "numpy", None):
+            assert UniversalMinHashSignatureBuilder(16, 0xFFFF)(features) == expected
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize(
+    "signature_builder", [MinHashSignatureBuilder, UniversalMinHashSignatureBuilder]
+)
+@pytest.mark.parametrize("num_features", [10, 100, 1000])
+def test_benchmark_signatures(signature_builder, num_features, benchmark):
+    # The default index uses 16 columns; messages are indexed as 5 character
+    # shingles, so a few hundred features are common.
+    get_signature = signature_builder(16, 0xFFFF)
+    features = [f"shingle-{i}".encode() for i in range(num_features)]
+    benchmark(get_signature, features)
@@ -1,4 +1,15 @@
-from sentry.killswitches import _value_matches, normalize_value
+import pytest
+
+from sentry.killswitches import (
+    _compiled_killswitches,
+    _value_matches,
+    compile_value,
+    killswitch_matches_context,
+    normalize_value,
+)
+from sentry.testutils.helpers import override_options
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils.compat import mock
 
 
 def test_normalize_value():
@@ -67,3 +78,62 @@ def test_value_matches():
         [{"event_type": "transaction"}],
         {"project_id": 3, "event_type": "transaction"},
     )
+
+
+def test_compiled_value_matches():
+    compiled = compile_value(
+        "store.load-shed-pipeline-projects",
+        [
+            1,
+            {"project_id": 2, "event_id": None, "has_attachments": True},
+            {"project_id": None, "event_id": "a" * 32, "has_attachments": None},
+        ],
+    )
+
+    def matches(project_id, event_id, has_attachments):
+        return compiled.matches(
+            {"project_id": project_id, "event_id": event_id, "has_attachments": has_attachments}
+        )
+
+    assert matches(1, "b" * 32, False)
+    assert matches(2, "b" * 32, True)
+    assert not matches(2, "b" * 32, False)
+    assert matches(3, "a" * 32, False)
+    assert not matches(3, "b" * 32, False)
+    assert not matches(None, None, None)
+
+
+@mock.patch("sentry.killswitches.compile_value", wraps=compile_value)
+def test_compiled_killswitch_cache(mock_compile_value):
+    _compiled_killswitches.clear()
+    context = {"project_id": 2, "platform": "python"}
+
+    with override_options({"store.load-shed-group-creation-projects": [1, 2]}):
+        assert killswitch_matches_context("store.load-shed-group-creation-projects", context)
+        assert killswitch_matches_context("store.load-shed-group-creation-projects", context)
+        assert mock_compile_value.call_count == 1
+
+    # An equal value does not need to be compiled again.
+    with override_options({"store.load-shed-group-creation-projects": [1, 2]}):
+        assert killswitch_matches_context("store.load-shed-group-creation-projects", context)
+        assert mock_compile_value.call_count == 1
+
+    with override_options({"store.load-shed-group-creation-projects": [1]}):
+        assert not killswitch_matches_context("store.load-shed-group-creation-projects", context)
+        assert mock_compile_value.call_count == 2
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("size", [10, 1000, 10000])
+def test_benchmark_killswitch(size, benchmark):
+    # A large project blocklist, plus some conditions on other fields.
+    option_value = list(range(size)) + [
+        {"project_id": None, "event_id": "%032x" % i, "has_attachments": None} for i in range(10)
+    ]
+    context = {"project_id": size, "event_id": "f" * 32, "has_attachments": True}
+
+    _compiled_killswitches.clear()
+    with override_options({"store.load-shed-pipeline-projects": option_value}):
+        assert not benchmark(
+            killswitch_matches_context, "store.load-shed-pipeline-projects", context
+        )
@@ -4,7 +4,7 @@ from unittest import TestCase
 
 import pytz
 
-from sentry.tsdb.base import ONE_DAY, ONE_HOUR, ONE_MINUTE, BaseTSDB
+from sentry.tsdb.base import ONE_DAY, ONE_HOUR, ONE_MINUTE, BaseTSDB, TimeSeriesMatrix
 from sentry.utils.compat import mock
 from sentry.utils.dates import to_timestamp
 
@@ -130,3 +130,25 @@ class BaseTSDBTest(TestCase):
         assert self.tsdb.make_series(0, start) == [
             (to_timestamp(start + timedelta(hours=24) * i), 0) for i in range(8)
         ]
+
+
+class TimeSeriesMatrixTest(TestCase):
+    def test_from_range(self):
+        values = {1: [(10, 1), (20, 2)], 2: [(20, 3), (30, 4)]}
+        matrix = TimeSeriesMatrix.from_range(values, [0])
+        assert matrix.keys == [1, 2]
+        assert matrix.timestamps == [0, 10, 20, 30]
+        assert list(matrix.get_row(1)) == [0, 1, 2, 0]
+        assert list(matrix.get_row(2)) == [0, 0, 3, 4]
+        assert matrix.get_sums() == {1: 3, 2: 7}
+        assert matrix.get_column_sums() == [(0, 0), (10, 1), (20, 5), (30, 4)]
+        assert matrix.to_range() == {
+            1: [(0, 0), (10, 1), (20, 2), (30, 0)],
+            2: [(0, 0), (10, 0), (20, 3), (30, 4)],
+        }
+
+    def test_empty(self):
+        matrix = TimeSeriesMatrix([], [10, 20])
+        assert matrix.get_sums() == {}
+        assert matrix.get_column_sums() == [(10, 0), (20, 0)]
+        assert matrix.to_range() == {}
@@ -0,0 +1,387 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import mmh3
+import pytz
+
+from sentry.testutils import TestCase
+from sentry.tsdb.base import ONE_DAY, ONE_HOUR, ONE_MINUTE, TSDBModel
+from sentry.tsdb.embedded import CounterRing, DistinctCounter, EmbeddedTSDB, FrequencySketch
+from sentry.utils.dates import to_timestamp
+
+
+def test_counter_ring():
+    ring = CounterRing(4)
+    ring.incr(10, 1)
+    ring.incr(10, 2)
+    assert ring.get(10) == 3
+    assert ring.get(14) == 0
+
+    # overwrites the slot of 10, which is out of retention now
+    ring.incr(14, 5)
+    assert ring.get(10) == 0
+    assert ring.get(14) == 5
+
+    # writes older than the retention window are dropped
+    ring.incr(10, 1)
+    assert ring.get(10) == 0
+    assert ring.get(14) == 5
+
+    assert ring.pop(14) == 5
+    assert ring.get(14) == 0
+    assert list(ring.items()) == []
+
+
+def test_distinct_counter():
+    counter = DistinctCounter(10)
+    counter.add(range(100))
+    counter.add(range(50))
+    assert counter.registers is None
+    assert counter.count() == 100
+
+    counter.add(range(1 << 20, (1 << 20) + 10000))
+    assert counter.registers is not None
+    assert len(counter.registers) == 1024
+
+
+def test_distinct_counter_estimate():
+    def hashes(values):
+        return [mmh3.hash64(str(value).encode("utf-8"), signed=False)[0] for value in values]
+
+    a = DistinctCounter(10)
+    a.add(hashes(range(0, 10000)))
+    assert abs(a.count() - 10000) < 10000 * 0.1
+
+    b = DistinctCounter(10)
+    b.add(hashes(range(5000, 15000)))
+
+    a.merge(b)
+    assert abs(a.count() - 15000) < 15000 * 0.1
+
+
+def test_frequency_sketch():
+    sketch = FrequencySketch(EmbeddedTSDB.DEFAULT_SKETCH_PARAMETERS._replace(capacity=3))
+    sketch.incr("a", 5.0)
+    sketch.incr("b", 3.0)
+    sketch.incr("c", 1.0)
+    assert sketch.estimators is None
+    assert sketch.most_common() == [("a", 5.0), ("b", 3.0), ("c", 1.0)]
+
+    sketch.incr("d", 2.0)
+    assert sketch.estimators is not None
+    assert sketch.most_common() == [("a", 5.0), ("b", 3.0), ("d", 2.0)]
+    assert sketch.estimate("c") >= 1.0
+
+    sketch.incr("c", 4.0)
+    assert sketch.most_common(2) == [("a", 5.0), ("c", 5.0)]
+
+
+class EmbeddedTSDBTest(TestCase):
+    def setUp(self):
+        self.db = EmbeddedTSDB(
+            rollups=(
+                # time in seconds, samples to keep
+                (10, 30),  # 5 minutes at 10 seconds
+                (ONE_MINUTE, 120),  # 2 hours at 1 minute
+                (ONE_HOUR, 24),  # 1 days at 1 hour
+                (ONE_DAY, 30),  # 30 days at 1 day
+            )
+        )
+
+    def test_simple(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
+        dts = [now + timedelta(hours=i) for i in range(4)]
+
+        def timestamp(d):
+            t = int(to_timestamp(d))
+            return t - (t % 3600)
+
+        self.db.incr(TSDBModel.project, 1, dts[0])
+        self.db.incr(TSDBModel.project, 1, dts[1], count=2)
+        self.db.incr(TSDBModel.project, 1, dts[1], environment_id=1)
+        self.db.incr(TSDBModel.project, 1, dts[2])
+        self.db.incr_multi(
+            [(TSDBModel.project, 1), (TSDBModel.project, 2)], dts[3], count=3, environment_id=1
+        )
+        self.db.incr_multi(
+            [(TSDBModel.project, 1), (TSDBModel.project, 2)], dts[3], count=1, environment_id=2
+        )
+
+        results = self.db.get_range(TSDBModel.project, [1], dts[0], dts[-1])
+        assert results == {
+            1: [
+                (timestamp(dts[0]), 1),
+                (timestamp(dts[1]), 3),
+                (timestamp(dts[2]), 1),
+                (timestamp(dts[3]), 4),
+            ]
+        }
+
+        results = self.db.get_range(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_ids=[1])
+        assert results == {
+            1: [
+                (timestamp(dts[0]), 0),
+                (timestamp(dts[1]), 1),
+                (timestamp(dts[2]), 0),
+                (timestamp(dts[3]), 3),
+            ],
+            2: [
+                (timestamp(dts[0]), 0),
+                (timestamp(dts[1]), 0),
+                (timestamp(dts[2]), 0),
+                (timestamp(dts[3]), 3),
+            ],
+        }
+
+        results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1])
+        assert results == {1: 9, 2: 4}
+
+        results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_id=1)
+        assert results == {1: 4, 2: 3}
+
+        results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_id=0)
+        assert results == {1: 0, 2: 0}
+
+        self.db.merge(TSDBModel.project, 1, [2], now, environment_ids=[0, 1, 2])
+
+        results = self.db.get_range(TSDBModel.project, [1, 2], dts[0], dts[-1])
+        assert results == {
+            1: [
+                (timestamp(dts[0]), 1),
+                (timestamp(dts[1]), 3),
+                (timestamp(dts[2]), 1),
+                (timestamp(dts[3]), 8),
+            ],
+            2: [(timestamp(dts[i]), 0) for i in range(0, 4)],
+        }
+
+        results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_id=1)
+        assert results == {1: 7, 2: 0}
+
+        self.db.delete([TSDBModel.project], [1, 2], dts[0], dts[-1], environment_ids=[0, 1, 2])
+
+        results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1])
+        assert results == {1: 0, 2: 0}
+
+        results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_id=1)
+        assert results == {1: 0, 2: 0}
+
+    def test_retention(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+
+        self.db.incr(TSDBModel.project, 1, now - timedelta(minutes=10))
+        self.db.incr(TSDBModel.project, 1, now)
+
+        # the 10 second rollup only retains 5 minutes
+        results = self.db.get_sums(
+            TSDBModel.project, [1], now - timedelta(minutes=10), now, rollup=10
+        )
+        assert results == {1: 1}
+
+        results = self.db.get_sums(
+            TSDBModel.project, [1], now - timedelta(minutes=10), now, rollup=ONE_MINUTE
+        )
+        assert results == {1: 2}
+
+    def test_max_keys(self):
+        self.db.max_keys = 2
+        self.db.flush()
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+
+        self.db.incr(TSDBModel.project, 1, now)
+        self.db.incr(TSDBModel.project, 2, now)
+        self.db.incr(TSDBModel.project, 1, now)
+        self.db.incr(TSDBModel.project, 3, now)
+
+        assert len(self.db.counters) == 2
+        assert self.db.get_sums(TSDBModel.project, [1, 2, 3], now, now) == {1: 2, 2: 0, 3: 1}
+
+    def test_count_distinct(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
+        dts = [now + timedelta(hours=i) for i in range(4)]
+
+        model = TSDBModel.users_affected_by_group
+
+        def timestamp(d):
+            t = int(to_timestamp(d))
+            return t - (t % 3600)
+
+        self.db.record(model, 1, ("foo", "bar"), dts[0])
+        self.db.record(model, 1, ("baz",), dts[1], environment_id=1)
+        self.db.record_multi(((model, 1, ("foo", "bar")), (model, 2, ("bar",))), dts[2])
+        self.db.record(model, 1, ("baz",), dts[2], environment_id=1)
+        self.db.record(model, 2, ("foo",), dts[3])
+
+        assert self.db.get_distinct_counts_series(model, [1], dts[0], dts[-1], rollup=3600) == {
+            1: [
+                (timestamp(dts[0]), 2),
+                (timestamp(dts[1]), 1),
+                (timestamp(dts[2]), 3),
+                (timestamp(dts[3]), 0),
+            ]
+        }
+
+        results = self.db.get_distinct_counts_totals(model, [1, 2], dts[0], dts[-1], rollup=3600)
+        assert results == {1: 3, 2: 2}
+
+        results = self.db.get_distinct_counts_totals(
+            model, [1, 2], dts[0], dts[-1], rollup=3600, environment_id=1
+        )
+        assert results == {1: 1, 2: 0}
+
+        assert self.db.get_distinct_counts_union(model, [], dts[0], dts[-1], rollup=3600) == 0
+        assert self.db.get_distinct_counts_union(model, [1, 2], dts[0], dts[-1], rollup=3600) == 3
+
+        self.db.merge_distinct_counts(model, 1, [2], dts[0], environment_ids=[0, 1])
+
+        assert self.db.get_distinct_counts_series(model, [1], dts[0], dts[-1], rollup=3600) == {
+            1: [
+                (timestamp(dts[0]), 2),
+                (timestamp(dts[1]), 1),
+                (timestamp(dts[2]), 3),
+                (timestamp(dts[3]), 1),
+            ]
+        }
+
+        results = self.db.get_distinct_counts_totals(model, [1, 2], dts[0], dts[-1], rollup=3600)
+        assert results == {1: 3, 2: 0}
+
+        self.db.delete_distinct_counts([model], [1, 2], dts[0], dts[-1], environment_ids=[0, 1])
+
+        results = self.db.get_distinct_counts_totals(model, [1, 2], dts[0], dts[-1])
+        assert results == {1: 0, 2: 0}
+
+    def test_frequency_tables(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        model = TSDBModel.frequent_issues_by_project
+        self.db.models_with_environment_support = self.db.models_with_environment_support | {model}
+
+        rollup = 3600
+
+        self.db.record_frequency_multi(
+            ((model, {"organization:1": {"project:1": 1, "project:2": 2, "project:3": 3}}),), now
+        )
+        self.db.record_frequency_multi(
+            (
+                (
+                    model,
+                    {
+                        "organization:1": {"project:1": 1, "project:2": 1, "project:4": 1},
+                        "organization:2": {"project:5": 1},
+                    },
+                ),
+            ),
+            now - timedelta(hours=1),
+            environment_id=1,
+        )
+
+        assert self.db.get_most_frequent(
+            model,
+            ("organization:1", "organization:2"),
+            now - timedelta(hours=1),
+            now,
+            rollup=rollup,
+        ) == {
+            "organization:1": [
+                ("project:2", 3.0),
+                ("project:3", 3.0),
+                ("project:1", 2.0),
+                ("project:4", 1.0),
+            ],
+            "organization:2": [("project:5", 1.0)],
+        }
+
+        assert self.db.get_most_frequent(
+            model, ("organization:1",), now, limit=1, rollup=rollup
+        ) == {"organization:1": [("project:3", 3.0)]}
+
+        timestamp = int(to_timestamp(now) // rollup) * rollup
+
+        assert self.db.get_most_frequent_series(
+            model, ("organization:2",), now - timedelta(hours=1), now, rollup=rollup
+        ) == {"organization:2": [(timestamp - rollup, {"project:5": 1.0}), (timestamp, {})]}
+
+        assert (
+            self.db.get_frequency_totals(
+                model,
+                {"organization:1": ("project:1", "project:5")},
+                now - timedelta(hours=1),
+                now,
+                rollup=rollup,
+                environment_id=1,
+            )
+            == {"organization:1": {"project:1": 1.0, "project:5": 0.0}}
+        )
+
+        self.db.merge_frequencies(model, "organization:1", ["organization:2"], now)
+
+        assert (
+            self.db.get_frequency_totals(
+                model,
+                {"organization:1": ("project:5",), "organization:2": ("project:5",)},
+                now - timedelta(hours=1),
+                now,
+                rollup=rollup,
+            )
+            == {"organization:1": {"project:5": 1.0}, "organization:2": {"project:5": 0.0}}
+        )
+
+        self.db.delete_frequencies([model], ["organization:1"], now - timedelta(hours=1), now)
+
+        assert self.db.get_most_frequent(
+            model, ("organization:1",), now - timedelta(hours=1), now, rollup=rollup
+        ) == {"organization:1": []}
+
+    def test_snapshot(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        rollups = list(self.db.rollups.items())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tsdb.snapshot")
+
+            db = EmbeddedTSDB(rollups=rollups, snapshot_path=path)
+            db.incr(TSDBModel.project, 1, now, count=3)
+            db.record(TSDBModel.users_affected_by_group, 1, ("foo", "bar"), now)
+            db.record_frequency_multi(
+                ((TSDBModel.frequent_issues_by_project, {"organization:1": {"project:1": 2}}),), now
+            )
+            db.close()
+
+            restored = EmbeddedTSDB(rollups=rollups, snapshot_path=path)
+            assert restored.get_sums(TSDBModel.project, [1], now, now) == {1: 3}
+            assert restored.get_distinct_counts_totals(
+                TSDBModel.users_affected_by_group, [1], now, now
+            ) == {1: 2}
+            assert restored.get_most_frequent(
+                TSDBModel.frequent_issues_by_project, ["organization:1"], now, now
+            ) == {"organization:1": [("project:1", 2.0)]}
+            restored.close()
+
+            # snapshots of a different rollup configuration are ignored
+            other = EmbeddedTSDB(rollups=((ONE_HOUR, 24),), snapshot_path=path)
+            assert other.get_sums(TSDBModel.project, [1], now, now) == {1: 0}
+            other.close()
+
+    def test_snapshot_locked(self):
+        rollups = list(self.db.rollups.items())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tsdb.snapshot")
+
+            now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+            db = EmbeddedTSDB(rollups=rollups, snapshot_path=path)
+            db.incr(TSDBModel.project, 1, now, count=3)
+
+            # Other backends using the same path run without a snapshot.
+            other = EmbeddedTSDB(rollups=rollups, snapshot_path=path)
+            assert other.snapshot_lock is None
+            other.incr(TSDBModel.project, 1, now, count=5)
+            other.close()
+            assert not os.path.exists(path)
+
+            db.close()
+            restored = EmbeddedTSDB(rollups=rollups, snapshot_path=path)
+            assert restored.snapshot_lock is not None
+            assert restored.get_sums(TSDBModel.project, [1], now, now) == {1: 3}
+            restored.close()
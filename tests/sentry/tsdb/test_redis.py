@@ -129,6 +129,14 @@ class RedisTSDBTest(TestCase):
         results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1])
         assert results == {1: 9, 2: 4}
 
+        results = self.db.get_timeseries_sums(TSDBModel.project, [1, 2], dts[0], dts[-1])
+        assert results == [
+            (timestamp(dts[0]), 1),
+            (timestamp(dts[1]), 3),
+            (timestamp(dts[2]), 1),
+            (timestamp(dts[3]), 8),
+        ]
+
         results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_id=1)
         assert results == {1: 4, 2: 3}
 
@@ -179,6 +187,33 @@ class RedisTSDBTest(TestCase):
         results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1], environment_id=1)
         assert results == {1: 0, 2: 0}
 
+    def test_simple_scripted(self):
+        self.db.enable_scripted_writes = True
+        self.test_simple()
+
+    def test_scripted_writes_set_expiry_once(self):
+        self.db.enable_scripted_writes = True
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+
+        self.db.incr_multi([(TSDBModel.project, 1), (TSDBModel.group, 2)], now, count=2)
+
+        for rollup, max_values in self.db.rollups.items():
+            hash_key, hash_field = self.db.make_counter_key(TSDBModel.project, rollup, now, 1, None)
+            client = self.db.cluster.get_local_client_for_key(hash_key)
+            assert client.hget(hash_key, hash_field) == b"2"
+            expiry = self.db.calculate_expiry(rollup, max_values, now)
+            assert 0 < client.ttl(hash_key) <= expiry - to_timestamp(now)
+
+            # an expiration time that was set before is left alone
+            client.expire(hash_key, 10)
+
+        self.db.incr(TSDBModel.project, 1, now)
+        for rollup in self.db.rollups:
+            hash_key, hash_field = self.db.make_counter_key(TSDBModel.project, rollup, now, 1, None)
+            client = self.db.cluster.get_local_client_for_key(hash_key)
+            assert client.hget(hash_key, hash_field) == b"3"
+            assert client.ttl(hash_key) <= 10
+
     def test_count_distinct(self):
         now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
         dts = [now + timedelta(hours=i) for i in range(4)]
@@ -587,6 +622,27 @@ class RedisTSDBTest(TestCase):
             model, ("organization:1", "organization:2"), now, environment_id=1
         ) == {"organization:1": [], "organization:2": []}
 
+    def test_frequency_tables_scripted(self):
+        self.db.enable_scripted_writes = True
+        self.test_frequency_tables()
+
+    def test_frequency_tables_scripted_expiry(self):
+        self.db.enable_scripted_writes = True
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        model = TSDBModel.frequent_issues_by_project
+
+        self.db.record_frequency_multi([(model, {"organization:1": {"project:1": 1}})], now)
+
+        for rollup, max_values in self.db.rollups.items():
+            index, estimates = self.db.make_frequency_table_keys(
+                model, rollup, to_timestamp(now), "organization:1", None
+            )
+            client = self.db.cluster.get_local_client_for_key("organization:1")
+            expiry = self.db.calculate_expiry(rollup, max_values, now)
+            assert 0 < client.ttl(index) <= expiry - to_timestamp(now)
+            # the estimates are only created once the index is full
+            assert client.ttl(estimates) == -2
+
     def test_frequency_table_import_export_no_estimators(self):
         client = self.db.cluster.get_local_client_for_key("key")
 
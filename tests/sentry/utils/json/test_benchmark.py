@@ -0,0 +1,129 @@
+import datetime
+import decimal
+import os
+import uuid
+from collections import namedtuple
+
+import pytest
+from django.conf import settings
+from django.utils.translation import ugettext_lazy as _
+
+from sentry.constants import DATA_ROOT
+from sentry.testutils.skips import requires_pytest_benchmark
+from sentry.utils import json
+from sentry.utils.compat import mock
+
+SAMPLES_ROOT = os.path.join(DATA_ROOT, "samples")
+
+BACKENDS = ["simplejson", "rapidjson"]
+
+
+def backend_available(name):
+    return name != "rapidjson" or json.rapidjson is not None
+
+
+def load_corpus():
+    corpus = []
+    for filename in sorted(os.listdir(SAMPLES_ROOT)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(SAMPLES_ROOT, filename)) as f:
+            try:
+                data = json.loads(f.read())
+            except ValueError:
+                continue
+        corpus.append(json.dumps(data))
+    return corpus
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return load_corpus()
+
+
+@pytest.fixture
+def backend(request):
+    if not backend_available(request.param):
+        pytest.skip(f"{request.param} is not installed")
+
+    json.set_backend(request.param)
+    yield request.param
+    json.set_backend(settings.SENTRY_JSON_BACKEND)
+
+
+Point = namedtuple("Point", ["x", "y"])
+
+# Values that every backend encodes itself, and their encoding.
+ENCODED_VALUES = [
+    (uuid.UUID("6e2f3b1e-9a8b-4cc4-9f61-0e4b8c1c4f8a"), '"6e2f3b1e9a8b4cc49f610e4b8c1c4f8a"'),
+    (datetime.datetime(2011, 1, 1, 1, 1, 1), '"2011-01-01T01:01:01.000000Z"'),
+    (datetime.date(2011, 1, 1), '"2011-01-01"'),
+    (decimal.Decimal("1.10"), "1.10"),
+    ({"foo"}, '["foo"]'),
+    ((1, 2), "[1,2]"),
+    (Point(1, 2), '{"x":1,"y":2}'),
+    (2 ** 70, "1180591620717411303424"),
+    (_("word"), '"word"'),
+]
+
+# Values that the rapidjson backend leaves to the default backend.
+FALLBACK_VALUES = [
+    ({1: "one"}, '{"1":"one"}'),
+    ([float("nan"), float("inf")], "[null,null]"),
+]
+
+
+@pytest.fixture
+def default_encode():
+    with mock.patch.object(
+        json._default_encoder, "encode", wraps=json._default_encoder.encode
+    ) as encode:
+        yield encode
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_backend_compatibility(backend, corpus):
+    for value in corpus:
+        assert json.dumps(json.loads(value)) == value
+
+    with pytest.raises(TypeError):
+        json.dumps(object())
+
+    with pytest.raises(json.JSONDecodeError):
+        json.loads("{")
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+@pytest.mark.parametrize("value,expected", ENCODED_VALUES)
+def test_backend_encoding(backend, default_encode, value, expected):
+    assert json.dumps(value) == expected
+    assert default_encode.called == (backend == "simplejson")
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+@pytest.mark.parametrize("value,expected", FALLBACK_VALUES)
+def test_backend_fallback(backend, default_encode, value, expected):
+    assert json.dumps(value) == expected
+    assert default_encode.called
+
+
+def decode(corpus):
+    for value in corpus:
+        json.loads(value)
+
+
+def encode(data):
+    for value in data:
+        json.dumps(value)
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_benchmark_loads(backend, corpus, benchmark):
+    benchmark(decode, corpus)
+
+
+@requires_pytest_benchmark
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_benchmark_dumps(backend, corpus, benchmark):
+    benchmark(encode, [json.loads(value) for value in corpus])
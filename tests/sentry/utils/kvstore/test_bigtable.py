@@ -50,8 +50,13 @@ def store_factory(request, credentials: Credentials):
         (None, None, b"{"),
         ("zlib", BigtableKVStorage.Flags.COMPRESSED_ZLIB, (b"\x78\x01", b"\x78\x9c", b"\x78\xda")),
         ("zstd", BigtableKVStorage.Flags.COMPRESSED_ZSTD, b"\x28\xb5\x2f\xfd"),
+        (
+            "zstd-dict",
+            BigtableKVStorage.Flags.COMPRESSED_ZSTD_DICT,
+            b"\x00\x00\x00\x00\x28\xb5\x2f\xfd",
+        ),
     ],
-    ids=["zlib", "ident", "zstd"],
+    ids=["zlib", "ident", "zstd", "zstd-dict"],
 )
 def test_compression_raw_values(
     compression: Optional[str],
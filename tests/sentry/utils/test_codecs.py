@@ -1,6 +1,9 @@
+import struct
+
 import pytest
+import zstandard
 
-from sentry.utils.codecs import BytesCodec, JSONCodec, ZlibCodec, ZstdCodec
+from sentry.utils.codecs import BytesCodec, JSONCodec, ZlibCodec, ZstdCodec, ZstdDictCodec
 
 
 @pytest.mark.parametrize(
@@ -22,3 +25,41 @@ def test_codec_chaining() -> None:
 
     assert codec.encode([1, 2, 3]) == b"[1,2,3]"
     assert codec.decode(b"[1,2,3]") == [1, 2, 3]
+
+
+def test_zstd_dict_codec() -> None:
+    samples = [
+        b'{"platform":"python","sdk":{"name":"sentry.python","version":"%d"}}' % i
+        for i in range(1000)
+    ]
+    dictionary = zstandard.train_dictionary(1024, samples).as_bytes()
+    dict_id = zstandard.ZstdCompressionDict(dictionary).dict_id()
+
+    codec = ZstdDictCodec({"default": dictionary}, default="default")
+    value = b'{"platform":"python","sdk":{"name":"sentry.python","version":"1.0.0"}}'
+    encoded = codec.encode(value)
+    assert encoded[:4] == struct.pack("<I", dict_id)
+    assert len(encoded) < len(ZstdCodec().encode(value))
+    assert codec.decode(encoded) == value
+
+    # values compressed without a dictionary can always be read
+    plain = ZstdDictCodec()
+    assert plain.encode(b"hello") == b"\x00\x00\x00\x00(\xb5/\xfd \x05)\x00\x00hello"
+    assert codec.decode(plain.encode(b"hello")) == b"hello"
+
+    with pytest.raises(ValueError):
+        plain.decode(encoded)
+
+    with pytest.raises(ValueError):
+        ZstdDictCodec({"python": dictionary}, default="default")
+
+
+def test_zstd_dict_codec_select() -> None:
+    samples = [b'{"platform":"python","version":"%d"}' % i for i in range(1000)]
+    dictionary = zstandard.train_dictionary(1024, samples).as_bytes()
+
+    codec = ZstdDictCodec(
+        {"python": dictionary}, select=lambda value: "python" if b"python" in value else None
+    )
+    assert codec.encode(b'{"platform":"python"}')[:4] != b"\x00\x00\x00\x00"
+    assert codec.encode(b'{"platform":"java"}')[:4] == b"\x00\x00\x00\x00"
@@ -7,7 +7,7 @@ from sentry.eventstream.kafka import KafkaEventStream
 from sentry.eventstream.snuba import SnubaEventStream
 from sentry.testutils import SnubaTestCase, TestCase
 from sentry.utils import json, snuba
-from sentry.utils.compat.mock import Mock, patch
+from sentry.utils.compat.mock import MagicMock, Mock, patch
 from sentry.utils.samples import load_data
 
 
@@ -85,6 +85,42 @@ class SnubaEventStreamTest(TestCase, SnubaTestCase):
             == 1
         )
 
+    def test_batching(self):
+        eventstream = KafkaEventStream(batching=True)
+        eventstream.producer = MagicMock()
+
+        event = self.__build_event(datetime.utcnow())
+        eventstream.insert(
+            event=event,
+            group=event.group,
+            is_new=True,
+            is_regression=False,
+            is_new_group_environment=True,
+            primary_hash="acbd18db4cc2f85cedef654fccc4a4d8",
+            received_timestamp=event.data["received"],
+        )
+
+        # Messages are only delivered when the batch is flushed.
+        assert not eventstream.producer.poll.called
+        assert not eventstream.producer.flush.called
+
+        produce_args, produce_kwargs = list(eventstream.producer.produce.call_args)
+        version, type_, payload1, payload2 = json.loads(produce_kwargs["value"])
+        assert version == 2
+        assert type_ == "insert"
+        assert payload1["event_id"] == event.event_id
+        assert payload2["is_new"] is True
+
+        eventstream.producer.__len__.return_value = 1
+        eventstream.flush()
+        eventstream.producer.flush.assert_called_once_with()
+
+        # Other messages are still polled for and delivered right away.
+        eventstream.producer.reset_mock()
+        eventstream.exclude_groups(self.project.id, [event.group_id])
+        eventstream.producer.poll.assert_called_once_with(0.0)
+        eventstream.producer.flush.assert_called_once_with()
+
     @patch("sentry.eventstream.insert")
     def test_issueless(self, mock_eventstream_insert):
         now = datetime.utcnow()
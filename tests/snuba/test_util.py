@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from sentry.models import GroupHash
@@ -61,3 +62,11 @@ class SnubaUtilTest(TestCase, SnubaTestCase):
                 assert snuba.OVERRIDE_OPTIONS == {"foo": 2, "consistent": False}
             assert snuba.OVERRIDE_OPTIONS == {"foo": 1, "consistent": False}
         assert snuba.OVERRIDE_OPTIONS == {"consistent": False}
+
+    def test_override_options_thread_local(self):
+        with snuba.options_override({"consistent": True}):
+            with ThreadPoolExecutor(1) as executor:
+                assert executor.submit(dict, snuba.OVERRIDE_OPTIONS).result() == {
+                    "consistent": False
+                }
+            assert snuba.OVERRIDE_OPTIONS == {"consistent": True}